@@ -11,10 +11,12 @@ from .bilibili_api import (
     parse_bilibili_url,
     extract_ep_id
 )
+from .async_bilibili_api import AsyncBilibiliAPI
 from .crypto import sign_and_generate_url, bvid_to_avid, avid_to_bvid
 
 __all__ = [
     'BilibiliAPI', 
+    'AsyncBilibiliAPI',
     'sanitize_filename', 
     'extract_title_from_dirname', 
     'get_dir_name',
@@ -0,0 +1,459 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from .bilibili_api import (
+    USER_AGENT,
+    ORIGIN,
+    SUB_COMMENT_PAGE_SIZES,
+    PAGE_SIZE_FALLBACK_CODES,
+    accepted_page_size,
+    build_episode_result,
+    build_season_result,
+    collect_sub_comment_page,
+    extract_ep_id,
+    extract_season_id,
+    is_last_sub_comment_page,
+)
+from .crypto import sign_and_generate_url
+from .rate_limiter import RateLimiter, get_rate_limiter, error_code, is_throttle_code
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBilibiliAPI:
+    """基于asyncio的B站API接口封装
+
+    与 BilibiliAPI 的 fetch_* 方法保持相同的返回格式，所有请求共用一个连接池，
+    并与同步接口共享同一个限速器，同时在途的请求数由信号量限制。
+    需要在同一个事件循环中使用，用完后调用 aclose() 或使用 async with。
+    """
+
+    def __init__(
+        self,
+        cookie: str = "",
+        max_in_flight: Optional[int] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        """初始化异步B站API
+
+        Args:
+            cookie: 登录Cookie
+            max_in_flight: 同时在途的最大请求数，默认使用配置中的 workers
+            limiter: 请求限速器，默认使用进程内共享的限速器
+        """
+        from config import Config
+
+        config = Config()
+
+        if max_in_flight is None:
+            max_in_flight = config.get("workers", 3)
+
+        self.cookie = cookie
+        self.retry_delay = config.get("request_retry_delay", 5.0)
+        self.limiter = limiter or get_rate_limiter()
+        self._in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        # 子评论分页大小，探测一次后缓存
+        self.sub_comment_page_size: Optional[int] = None
+        self._page_size_lock = asyncio.Lock()
+
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Origin": ORIGIN,
+            "Referer": ORIGIN,
+            "Accept": "application/json, text/plain, */*",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "Sec-Fetch-Site": "same-site",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Dest": "empty",
+        }
+        if cookie:
+            headers["Cookie"] = cookie
+
+        # 统一的连接池，所有协程复用keep-alive连接
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=10.0,
+            limits=httpx.Limits(
+                max_connections=max_in_flight,
+                max_keepalive_connections=max_in_flight,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        return False
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        await self.client.aclose()
+
+    async def _sign(self, url: str) -> str:
+        """WBI签名（获取密钥可能发起同步请求，放到线程中执行）"""
+        return await asyncio.to_thread(sign_and_generate_url, url, self.cookie)
+
+    async def _get(self, url: str, endpoint: str, **kwargs) -> httpx.Response:
+        """获取限速许可后发送GET请求"""
+        async with self._in_flight:
+            await self.limiter.acquire_async(endpoint)
+            return await self.client.get(url, **kwargs)
+
+    def _read_json(self, response: httpx.Response) -> Dict[str, Any]:
+        """检查响应状态并解析JSON，同时把结果反馈给限速器的自适应控制"""
+        if not response.is_success:
+            self.limiter.report(response.status_code)
+            response.raise_for_status()
+        data = response.json()
+        self.limiter.report(response.status_code, data.get("code"))
+        return data
+
+    def get_retry_delay(self) -> float:
+        """获取失败重试前的等待时间，连续触发风控时自动加长"""
+        return self.limiter.retry_delay(self.retry_delay)
+
+    async def fetch_bangumi_episode_info(self, ep_id: str) -> Dict[str, Any]:
+        """获取番剧剧集信息"""
+        url = "https://api.bilibili.com/pgc/view/web/season"
+
+        try:
+            response = await self._get(
+                url,
+                "view",
+                params={"ep_id": ep_id},
+                headers={"Referer": f"https://www.bilibili.com/bangumi/play/ep{ep_id}"},
+            )
+            logger.info(f"获取番剧剧集信息的状态码: {response.status_code}")
+            data = self._read_json(response)
+
+            if data.get("code") != 0:
+                logger.error(f"获取番剧剧集信息失败: {data}")
+                return {
+                    "code": -1,
+                    "message": data.get("message", "未知错误"),
+                    "data": {},
+                }
+
+            return build_episode_result(data, ep_id)
+
+        except Exception as e:
+            logger.error(f"获取番剧剧集信息出错: {e}")
+            return {"code": -1, "message": str(e), "data": {}}
+
+    async def fetch_bangumi_season_info(self, season_id: str) -> Dict[str, Any]:
+        """获取番剧季度信息"""
+        url = "https://api.bilibili.com/pgc/view/web/season"
+
+        try:
+            response = await self._get(
+                url,
+                "view",
+                params={"season_id": season_id},
+                headers={
+                    "Referer": f"https://www.bilibili.com/bangumi/play/ss{season_id}"
+                },
+            )
+            logger.info(f"获取番剧季度信息的状态码: {response.status_code}")
+            data = self._read_json(response)
+
+            if data.get("code") != 0:
+                logger.error(f"获取番剧季度信息失败: {data}")
+                return {
+                    "code": -1,
+                    "message": data.get("message", "未知错误"),
+                    "data": {},
+                }
+
+            return build_season_result(data, season_id)
+
+        except Exception as e:
+            logger.error(f"获取番剧季度信息出错: {e}")
+            return {"code": -1, "message": str(e), "data": {}}
+
+    async def fetch_video_info(self, bvid: str) -> Dict[str, Any]:
+        """获取单个视频的详细信息"""
+        url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
+
+        try:
+            response = await self._get(
+                url,
+                "view",
+                headers={"Referer": f"https://www.bilibili.com/video/{bvid}"},
+            )
+            logger.info(f"获取视频信息的状态码: {response.status_code}")
+            data = self._read_json(response)
+
+            if data.get("code") != 0:
+                logger.error(f"获取视频信息失败: {data}")
+                return {
+                    "code": -1,
+                    "message": data.get("message", "未知错误"),
+                    "data": {},
+                }
+
+            return data
+
+        except Exception as e:
+            logger.error(f"获取视频信息出错: {e}")
+            return {"code": -1, "message": str(e), "data": {}}
+
+    async def fetch_content_info(
+        self, identifier: str, content_type: str = None
+    ) -> Dict[str, Any]:
+        """统一的内容信息获取接口，参数和返回格式与 BilibiliAPI.fetch_content_info 相同"""
+        if content_type is None:
+            if identifier.startswith("BV"):
+                content_type = "video"
+            elif identifier.startswith("EP"):
+                content_type = "bangumi"
+            elif identifier.startswith("SS"):
+                content_type = "season"
+            else:
+                return {"code": -1, "message": "无法识别的标识符格式", "data": {}}
+
+        if content_type == "video":
+            return await self.fetch_video_info(identifier)
+        elif content_type == "bangumi":
+            return await self.fetch_bangumi_episode_info(extract_ep_id(identifier))
+        elif content_type == "season":
+            return await self.fetch_bangumi_season_info(extract_season_id(identifier))
+        else:
+            return {"code": -1, "message": "不支持的内容类型", "data": {}}
+
+    async def fetch_comment_count(self, oid: str) -> int:
+        """获取评论总数"""
+        url = f"https://api.bilibili.com/x/v2/reply/count?type=1&oid={oid}"
+
+        try:
+            response = await self._get(url, "reply")
+            logger.info(f"获取评论总数的状态码: {response.status_code}")
+            data = self._read_json(response)
+
+            if data.get("code") != 0:
+                logger.error(f"获取评论总数失败，API返回: {data}")
+                return 0
+
+            count = data.get("data", {}).get("count", 0)
+            logger.info(f"成功获取评论总数: {count}")
+            return count
+
+        except Exception as e:
+            logger.error(f"获取评论总数出错: {e}")
+            return 0
+
+    async def fetch_comments(
+        self, oid: str, next_page: int, order: int, offset_str: str = ""
+    ) -> Dict[str, Any]:
+        """获取评论列表，旧接口失败时回退到WBI接口"""
+        params = {"oid": oid, "type": "1", "pn": str(next_page), "sort": str(order)}
+        url = "https://api.bilibili.com/x/v2/reply?" + "&".join(
+            [f"{k}={v}" for k, v in params.items()]
+        )
+
+        logger.info(f"获取评论列表: {url}")
+
+        try:
+            response = await self._get(url, "reply")
+            logger.info(f"获取评论列表的状态码: {response.status_code}")
+
+            if response.status_code == 200:
+                return self._read_json(response)
+
+            self.limiter.report(response.status_code)
+            logger.error(
+                f"评论接口请求失败: {response.status_code} - {response.text[:200]}"
+            )
+
+        except Exception as e:
+            logger.error(f"获取评论列表出错: {e}")
+
+        # 如果旧接口失败，尝试新接口
+        try:
+            await asyncio.sleep(self.get_retry_delay())
+
+            if offset_str == "":
+                fmt_offset_str = '{"offset":""}'
+            else:
+                fmt_offset_str = f'{{"offset":{json.dumps(offset_str)}}}'
+
+            wbi_params = {
+                "oid": oid,
+                "type": "1",
+                "mode": "3",
+                "plat": "1",
+                "web_location": "1315875",
+                "pagination_str": fmt_offset_str,
+            }
+            wbi_url = "https://api.bilibili.com/x/v2/reply/wbi/main?" + "&".join(
+                [f"{k}={v}" for k, v in wbi_params.items()]
+            )
+
+            logger.info(f"尝试使用WBI接口获取评论: {wbi_url}")
+
+            signed_url = await self._sign(wbi_url)
+            response = await self._get(signed_url, "wbi/main")
+            return self._read_json(response)
+
+        except Exception as e:
+            logger.error(f"WBI接口获取评论列表出错: {e}")
+            return {"code": error_code(e), "message": str(e), "data": {"replies": []}}
+
+    async def fetch_sub_comments(
+        self,
+        oid: str,
+        rpid: int,
+        next_page: int,
+        referer: str = None,
+        page_size: int = 20,
+    ) -> Dict[str, Any]:
+        """获取子评论"""
+        params = {
+            "oid": oid,
+            "type": "1",
+            "root": str(rpid),
+            "ps": str(page_size),
+            "pn": str(next_page),
+        }
+        url = "https://api.bilibili.com/x/v2/reply/reply?" + "&".join(
+            [f"{k}={v}" for k, v in params.items()]
+        )
+
+        try:
+            signed_url = await self._sign(url)
+            headers = {"Referer": referer} if referer else None
+            response = await self._get(signed_url, "reply/reply", headers=headers)
+            return self._read_json(response)
+
+        except Exception as e:
+            logger.error(f"获取子评论出错: {e}")
+            return {"code": error_code(e), "message": str(e), "data": {"replies": []}}
+
+    async def _probe_sub_comments(
+        self, oid: str, rpid: int, referer: str = None
+    ) -> Tuple[Dict[str, Any], int, int]:
+        """请求第一页子评论并探测分页大小，与 BilibiliAPI._probe_sub_comments 行为一致"""
+        page_size = self.sub_comment_page_size
+        if page_size is None:
+            async with self._page_size_lock:
+                page_size = self.sub_comment_page_size
+                if page_size is None:
+                    return await self._probe_page_size(oid, rpid, referer)
+
+        sub_cmt_info = await self.fetch_sub_comments(oid, rpid, 1, referer, page_size)
+        return sub_cmt_info, page_size, 1
+
+    async def _probe_page_size(
+        self, oid: str, rpid: int, referer: str = None
+    ) -> Tuple[Dict[str, Any], int, int]:
+        """逐个尝试分页大小请求第一页，成功时缓存分页大小（调用方需持有 _page_size_lock）"""
+        requests_made = 0
+        for page_size in SUB_COMMENT_PAGE_SIZES:
+            sub_cmt_info = await self.fetch_sub_comments(
+                oid, rpid, 1, referer, page_size
+            )
+            requests_made += 1
+            code = sub_cmt_info.get("code")
+
+            if code == 0:
+                page_size = accepted_page_size(page_size, sub_cmt_info)
+                self.sub_comment_page_size = page_size
+                logger.info(f"子评论分页大小: {page_size}")
+                return sub_cmt_info, page_size, requests_made
+
+            if code not in PAGE_SIZE_FALLBACK_CODES:
+                break
+
+            logger.info(f"子评论分页大小 {page_size} 不可用({code})，尝试更小的分页")
+
+        return sub_cmt_info, page_size, requests_made
+
+    async def iter_sub_comments(
+        self,
+        oid: str,
+        rpid: int,
+        referer: str = None,
+        max_retries: int = 3,
+        stats: Optional[Dict[str, int]] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """逐页获取某条根评论下的子评论，与 BilibiliAPI.iter_sub_comments 行为一致"""
+        if stats is None:
+            stats = {}
+        stats.setdefault("requests", 0)
+        stats.setdefault("pages", 0)
+
+        page = 1
+        retries = 0
+        fetched = 0
+
+        while True:
+            if page == 1:
+                sub_cmt_info, page_size, requests_made = await self._probe_sub_comments(
+                    oid, rpid, referer
+                )
+            else:
+                sub_cmt_info = await self.fetch_sub_comments(
+                    oid, rpid, page, referer, page_size
+                )
+                requests_made = 1
+            stats["requests"] += requests_made
+
+            # 触发风控时退避后重试当前页
+            if is_throttle_code(sub_cmt_info.get("code")) and retries < max_retries:
+                retries += 1
+                await asyncio.sleep(self.get_retry_delay())
+                continue
+
+            if sub_cmt_info.get("code") != 0:
+                logger.error(
+                    f"获取评论 {rpid} 的子评论失败: {sub_cmt_info.get('message', '未知错误')}"
+                )
+                return
+
+            data = sub_cmt_info.get("data") or {}
+            page_replies = collect_sub_comment_page(data)
+            if not page_replies:
+                return
+
+            stats["pages"] += 1
+            yield page_replies
+
+            fetched += len(data.get("replies") or [])
+            if is_last_sub_comment_page(data, page_size, fetched):
+                return
+
+            page += 1
+            retries = 0
+
+    async def fetch_all_sub_comments(
+        self,
+        oid: str,
+        rpid: int,
+        referer: str = None,
+        stats: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """获取某条根评论下的全部子评论"""
+        all_replies = []
+        async for page_replies in self.iter_sub_comments(
+            oid, rpid, referer, stats=stats
+        ):
+            all_replies.extend(page_replies)
+        return all_replies
+
+    async def fetch_sub_comment_threads(
+        self, oid: str, rpids: List[int]
+    ) -> List[List[Dict[str, Any]]]:
+        """并发获取多条根评论的子评论
+
+        各评论串的分页请求同时在途，由共享限速器统一限速。
+
+        Returns:
+            与 rpids 顺序一致的子评论列表
+        """
+        return await asyncio.gather(
+            *(self.fetch_all_sub_comments(oid, rpid) for rpid in rpids)
+        )
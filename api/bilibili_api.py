@@ -1,18 +1,25 @@
 import json
 import time
 import logging
-import random
 import re
-from typing import Dict, Any, Tuple, Optional
+import threading
+from typing import Dict, Any, Iterator, List, Tuple, Optional
 import requests
 
 from .crypto import sign_and_generate_url, bvid_to_avid, avid_to_bvid
+from .rate_limiter import RateLimiter, get_rate_limiter, error_code, is_throttle_code
 
 # 基础请求头
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0"
 ORIGIN = "https://www.bilibili.com"
 HOST = "https://www.bilibili.com"
 
+# 子评论分页大小的候选值，从大到小探测，最后一个为接口一定支持的默认值
+SUB_COMMENT_PAGE_SIZES = (100, 50, 20)
+# 探测分页大小时，遇到这些返回码换用更小的分页（-400 参数错误）
+# 网络错误等临时失败（-1）不换分页也不缓存，下一个评论串重新探测
+PAGE_SIZE_FALLBACK_CODES = {-400}
+
 logger = logging.getLogger(__name__)
 
 
@@ -140,12 +147,173 @@ def extract_ep_id(identifier: str) -> str:
     return identifier
 
 
+def build_episode_result(data: Dict[str, Any], ep_id: str) -> Dict[str, Any]:
+    """从番剧季度接口的返回数据中构造剧集信息
+
+    Args:
+        data: pgc/view/web/season 接口返回的原始数据
+        ep_id: 剧集ID（数字）
+
+    Returns:
+        类似视频信息的返回格式，找不到对应剧集时code为-1
+    """
+    # 从返回的episodes中找到对应的episode
+    episodes = data.get("result", {}).get("episodes", [])
+    current_episode = None
+
+    for ep in episodes:
+        if str(ep.get("id")) == str(ep_id):
+            current_episode = ep
+            break
+
+    if not current_episode:
+        logger.error(f"未找到EP{ep_id}的信息")
+        return {"code": -1, "message": "未找到对应剧集", "data": {}}
+
+    # 构造类似视频信息的返回格式
+    return {
+        "code": 0,
+        "data": {
+            "aid": current_episode.get("aid"),
+            "bvid": current_episode.get("bvid", ""),
+            "title": current_episode.get("long_title")
+            or current_episode.get("share_copy", ""),
+            "desc": current_episode.get("desc", ""),
+            "owner": {
+                "mid": data.get("result", {}).get("up_info", {}).get("mid", 0),
+                "name": data.get("result", {}).get("up_info", {}).get("uname", ""),
+            },
+            "stat": current_episode.get("stat", {}),
+            "ep_id": ep_id,
+            "season_id": data.get("result", {}).get("season_id"),
+            "series_title": data.get("result", {}).get("title", ""),
+        },
+    }
+
+
+def build_season_result(data: Dict[str, Any], season_id: str) -> Dict[str, Any]:
+    """从番剧季度接口的返回数据中构造季度信息（以第一集作为代表）
+
+    Args:
+        data: pgc/view/web/season 接口返回的原始数据
+        season_id: 季度ID（数字）
+
+    Returns:
+        类似视频信息的返回格式，没有剧集时code为-1
+    """
+    # 从返回的episodes中获取第一集作为代表
+    episodes = data.get("result", {}).get("episodes", [])
+    if not episodes:
+        logger.error(f"SS{season_id}没有找到剧集信息")
+        return {"code": -1, "message": "未找到剧集", "data": {}}
+
+    # 使用第一集的信息
+    first_episode = episodes[0]
+
+    # 构造类似视频信息的返回格式
+    return {
+        "code": 0,
+        "data": {
+            "aid": first_episode.get("aid"),
+            "bvid": first_episode.get("bvid", ""),
+            "title": data.get("result", {}).get("title", ""),  # 使用季度标题
+            "desc": data.get("result", {}).get("evaluate", ""),
+            "owner": {
+                "mid": data.get("result", {}).get("up_info", {}).get("mid", 0),
+                "name": data.get("result", {}).get("up_info", {}).get("uname", ""),
+            },
+            "stat": first_episode.get("stat", {}),
+            "season_id": season_id,
+            "ep_id": first_episode.get("id"),
+            "series_title": data.get("result", {}).get("title", ""),
+            "total_episodes": len(episodes),
+        },
+    }
+
+
+def collect_sub_comment_page(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从子评论接口的一页返回数据中收集全部评论
+
+    包括本页子评论、子评论下内嵌的回复以及置顶评论，重复的评论由调用方按rpid去重。
+
+    Args:
+        data: reply/reply 接口返回数据中的 data 字段
+
+    Returns:
+        本页的评论列表，没有子评论时为空列表
+    """
+    replies = data.get("replies") or []
+    if not replies:
+        return []
+
+    page_replies = list(replies)
+
+    # 获取子评论的回复
+    for reply in replies:
+        reply_replies = reply.get("replies")
+        if reply_replies:
+            page_replies.extend(reply_replies)
+
+    # 获取置顶评论
+    top_replies = data.get("top_replies") or []
+    for reply in top_replies:
+        page_replies.append(reply)
+        reply_replies = reply.get("replies")
+        if reply_replies:
+            page_replies.extend(reply_replies)
+
+    return page_replies
+
+
+def accepted_page_size(requested: int, sub_cmt_info: Dict[str, Any]) -> int:
+    """获取接口实际采用的分页大小
+
+    接口可能把过大的 ps 截断为上限并在 data.page.size 中返回，此时以返回值为准；
+    没有返回 size 但本页数量少于请求数且还有更多评论时，说明被截断为本页数量。
+    """
+    data = sub_cmt_info.get("data") or {}
+    page_info = data.get("page") or {}
+    size = page_info.get("size")
+    if isinstance(size, int) and 0 < size < requested:
+        return size
+
+    count = page_info.get("count")
+    returned = len(data.get("replies") or [])
+    if isinstance(count, int) and 0 < returned < min(requested, count):
+        return returned
+    return requested
+
+
+def is_last_sub_comment_page(
+    data: Dict[str, Any], page_size: int, fetched: int
+) -> bool:
+    """判断是否已是最后一页，省去结尾的空页请求
+
+    有 data.page.count 时以已获取数量是否达到总数为准，否则以本页是否不满一页为准。
+
+    Args:
+        data: reply/reply 接口返回数据中的 data 字段
+        page_size: 本次请求的分页大小
+        fetched: 已获取的子评论数（不含内嵌回复和置顶评论）
+    """
+    count = (data.get("page") or {}).get("count")
+    if isinstance(count, int):
+        return fetched >= count
+    return len(data.get("replies") or []) < page_size
+
+
 class BilibiliAPI:
     """B站API接口封装"""
 
-    def __init__(self, cookie: str = ""):
-        """初始化B站API"""
+    def __init__(self, cookie: str = "", limiter: Optional[RateLimiter] = None):
+        """初始化B站API
+
+        Args:
+            cookie: 登录Cookie
+            limiter: 请求限速器，默认使用进程内共享的限速器
+        """
         self.cookie = cookie
+        self.limiter = limiter or get_rate_limiter()
         # 统一的请求会话
         self.session = requests.Session()
         self.session.headers.update(
@@ -165,33 +333,55 @@ class BilibiliAPI:
         if cookie:
             self.session.headers["Cookie"] = cookie
 
-    def sleep_between_requests(self, request_type="normal"):
+        # 子评论分页大小与登录状态有关，每个实例探测一次后缓存
+        self.sub_comment_page_size: Optional[int] = None
+        self._page_size_lock = threading.Lock()
+
+    def sleep_between_requests(self, request_type="normal", endpoint="reply"):
         """
         在请求之间添加延迟，减轻API负担，避免频繁请求导致的封禁
 
+        普通请求从共享限速器的对应接口令牌桶中获取许可，只在超出持续速率时等待；
+        重试请求固定等待配置的重试时间。
+
         Args:
             request_type: 请求类型：
                 - "normal": 普通请求
                 - "retry": 重试请求
+            endpoint: 接口类型，对应限速器中的令牌桶
 
         Returns:
             实际延迟的时间（秒）
         """
-        from config import Config
-
-        config = Config()
-
         if request_type == "normal":
-            min_delay = config.get("request_delay_min", 1.0)
-            max_delay = config.get("request_delay_max", 2.0)
-            delay = min_delay + random.random() * (max_delay - min_delay)
-        else:  # retry
-            delay = config.get("request_retry_delay", 5.0)
+            return self.limiter.acquire(endpoint)
 
+        delay = self.get_retry_delay()
         logger.debug(f"请求延迟: {delay:.2f}秒 ({request_type})")
         time.sleep(delay)
         return delay
 
+    def _read_json(self, response: requests.Response) -> Dict[str, Any]:
+        """检查响应状态并解析JSON，同时把结果反馈给限速器的自适应控制"""
+        if not response.ok:
+            self.limiter.report(response.status_code)
+            response.raise_for_status()
+        data = response.json()
+        self.limiter.report(response.status_code, data.get("code"))
+        return data
+
+    def get_retry_delay(self) -> float:
+        """获取失败重试前的等待时间，连续触发风控时自动加长"""
+        from config import Config
+
+        base_delay = Config().get("request_retry_delay", 5.0)
+        return self.limiter.retry_delay(base_delay)
+
+    @property
+    def effective_rate(self) -> float:
+        """当前实际生效的请求速率（次/秒）"""
+        return self.limiter.effective_rate
+
     def fetch_bangumi_episode_info(self, ep_id: str) -> Dict[str, Any]:
         """获取番剧剧集信息
 
@@ -201,7 +391,7 @@ class BilibiliAPI:
         Returns:
             包含剧集信息的字典，包括aid等
         """
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="view")
 
         url = f"https://api.bilibili.com/pgc/view/web/season"
         params = {"ep_id": ep_id}
@@ -214,8 +404,7 @@ class BilibiliAPI:
             response = self.session.get(url, params=params, headers=headers, timeout=10)
             logger.info(f"获取番剧剧集信息的状态码: {response.status_code}")
 
-            response.raise_for_status()
-            data = response.json()
+            data = self._read_json(response)
 
             if data.get("code") != 0:
                 logger.error(f"获取番剧剧集信息失败: {data}")
@@ -225,40 +414,9 @@ class BilibiliAPI:
                     "data": {},
                 }
 
-            # 从返回的episodes中找到对应的episode
-            episodes = data.get("result", {}).get("episodes", [])
-            current_episode = None
-
-            for ep in episodes:
-                if str(ep.get("id")) == str(ep_id):
-                    current_episode = ep
-                    break
-
-            if not current_episode:
-                logger.error(f"未找到EP{ep_id}的信息")
-                return {"code": -1, "message": "未找到对应剧集", "data": {}}
-
-            # 构造类似视频信息的返回格式
-            result = {
-                "code": 0,
-                "data": {
-                    "aid": current_episode.get("aid"),
-                    "bvid": current_episode.get("bvid", ""),
-                    "title": current_episode.get("long_title")
-                    or current_episode.get("share_copy", ""),
-                    "desc": current_episode.get("desc", ""),
-                    "owner": {
-                        "mid": data.get("result", {}).get("up_info", {}).get("mid", 0),
-                        "name": data.get("result", {})
-                        .get("up_info", {})
-                        .get("uname", ""),
-                    },
-                    "stat": current_episode.get("stat", {}),
-                    "ep_id": ep_id,
-                    "season_id": data.get("result", {}).get("season_id"),
-                    "series_title": data.get("result", {}).get("title", ""),
-                },
-            }
+            result = build_episode_result(data, ep_id)
+            if result.get("code") != 0:
+                return result
 
             logger.info(f"成功获取番剧EP{ep_id}信息: {result['data']['title']}")
             return result
@@ -276,7 +434,7 @@ class BilibiliAPI:
         Returns:
             包含季度信息的字典，包括第一集的aid等
         """
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="view")
 
         url = f"https://api.bilibili.com/pgc/view/web/season"
         params = {"season_id": season_id}
@@ -289,8 +447,7 @@ class BilibiliAPI:
             response = self.session.get(url, params=params, headers=headers, timeout=10)
             logger.info(f"获取番剧季度信息的状态码: {response.status_code}")
 
-            response.raise_for_status()
-            data = response.json()
+            data = self._read_json(response)
 
             if data.get("code") != 0:
                 logger.error(f"获取番剧季度信息失败: {data}")
@@ -300,39 +457,12 @@ class BilibiliAPI:
                     "data": {},
                 }
 
-            # 从返回的episodes中获取第一集作为代表
-            episodes = data.get("result", {}).get("episodes", [])
-            if not episodes:
-                logger.error(f"SS{season_id}没有找到剧集信息")
-                return {"code": -1, "message": "未找到剧集", "data": {}}
-
-            # 使用第一集的信息
-            first_episode = episodes[0]
-
-            # 构造类似视频信息的返回格式
-            result = {
-                "code": 0,
-                "data": {
-                    "aid": first_episode.get("aid"),
-                    "bvid": first_episode.get("bvid", ""),
-                    "title": data.get("result", {}).get("title", ""),  # 使用季度标题
-                    "desc": data.get("result", {}).get("evaluate", ""),
-                    "owner": {
-                        "mid": data.get("result", {}).get("up_info", {}).get("mid", 0),
-                        "name": data.get("result", {})
-                        .get("up_info", {})
-                        .get("uname", ""),
-                    },
-                    "stat": first_episode.get("stat", {}),
-                    "season_id": season_id,
-                    "ep_id": first_episode.get("id"),
-                    "series_title": data.get("result", {}).get("title", ""),
-                    "total_episodes": len(episodes),
-                },
-            }
+            result = build_season_result(data, season_id)
+            if result.get("code") != 0:
+                return result
 
             logger.info(
-                f"成功获取番剧SS{season_id}信息: {result['data']['title']} (共{len(episodes)}集)"
+                f"成功获取番剧SS{season_id}信息: {result['data']['title']} (共{result['data']['total_episodes']}集)"
             )
             return result
 
@@ -377,7 +507,7 @@ class BilibiliAPI:
 
         try:
             # 请求前添加延迟
-            self.sleep_between_requests()
+            self.sleep_between_requests(endpoint="reply")
 
             logger.info(f"请求评论总数 URL: {url}")
             logger.info(f"当前Cookie长度: {len(self.cookie) if self.cookie else 0}")
@@ -389,6 +519,8 @@ class BilibiliAPI:
             content_encoding = response.headers.get("Content-Encoding", "none").lower()
             logger.info(f"响应头Content-Encoding: {content_encoding}")
 
+            if not response.ok:
+                self.limiter.report(response.status_code)
             response.raise_for_status()
 
             # 检查内容是否已经是有效JSON
@@ -428,6 +560,7 @@ class BilibiliAPI:
             data = json.loads(text_content)
 
             logger.info(f"API响应解析成功，code: {data.get('code', 'unknown')}")
+            self.limiter.report(response.status_code, data.get("code"))
 
             if data.get("code") != 0:
                 logger.error(f"获取评论总数失败，API返回: {data}")
@@ -447,7 +580,7 @@ class BilibiliAPI:
     def fetch_video_info(self, bvid: str) -> Dict[str, Any]:
         """获取单个视频的详细信息，包括标题"""
         # 请求前添加延迟
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="view")
 
         # 构建URL
         url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
@@ -462,8 +595,7 @@ class BilibiliAPI:
             response = self.session.get(url, headers=headers, timeout=10)
             logger.info(f"获取视频信息的状态码: {response.status_code}")
 
-            response.raise_for_status()
-            data = response.json()
+            data = self._read_json(response)
 
             if data.get("code") != 0:
                 logger.error(f"获取视频信息失败: {data}")
@@ -484,7 +616,7 @@ class BilibiliAPI:
     ) -> Dict[str, Any]:
         """获取评论列表"""
         # 请求前添加延迟
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="reply")
 
         # 构建请求参数
         if offset_str == "":
@@ -505,10 +637,11 @@ class BilibiliAPI:
             logger.info(f"获取评论列表的状态码: {response.status_code}")
 
             if response.status_code == 200:
-                data = response.json()
+                data = self._read_json(response)
                 logger.debug(f"评论接口请求成功: {data.get('code')}")
                 return data
             else:
+                self.limiter.report(response.status_code)
                 logger.error(
                     f"评论接口请求失败: {response.status_code} - {response.text[:200]}"
                 )
@@ -536,26 +669,33 @@ class BilibiliAPI:
 
             logger.info(f"尝试使用WBI接口获取评论: {wbi_url}")
 
+            self.sleep_between_requests(endpoint="wbi/main")
             signed_url = sign_and_generate_url(wbi_url, self.cookie)
             response = self.session.get(signed_url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._read_json(response)
 
         except Exception as e:
             logger.error(f"WBI接口获取评论列表出错: {e}")
-            return {"code": -1, "message": str(e), "data": {"replies": []}}
-
-    def fetch_sub_comments(self, oid: str, rpid: int, next_page: int) -> Dict[str, Any]:
+            return {"code": error_code(e), "message": str(e), "data": {"replies": []}}
+
+    def fetch_sub_comments(
+        self,
+        oid: str,
+        rpid: int,
+        next_page: int,
+        referer: str = None,
+        page_size: int = 20,
+    ) -> Dict[str, Any]:
         """获取子评论"""
         # 请求前添加延迟
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="reply/reply")
 
         # 构建URL
         params = {
             "oid": oid,
             "type": "1",
             "root": str(rpid),
-            "ps": "20",
+            "ps": str(page_size),
             "pn": str(next_page),
         }
         url = "https://api.bilibili.com/x/v2/reply/reply?" + "&".join(
@@ -563,23 +703,142 @@ class BilibiliAPI:
         )
 
         try:
+            headers = {"Referer": referer} if referer else None
             signed_url = sign_and_generate_url(url, self.cookie)
-            response = self.session.get(signed_url, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            response = self.session.get(signed_url, headers=headers, timeout=10)
+            return self._read_json(response)
 
         except Exception as e:
             logger.error(f"获取子评论出错: {e}")
+            code = error_code(e)
 
-            # 失败重试前添加延迟
-            self.sleep_between_requests("retry")
+            # 失败重试前添加延迟，被限流时由 iter_sub_comments 退避后重试
+            if not is_throttle_code(code):
+                self.sleep_between_requests("retry")
+
+            return {"code": code, "message": str(e), "data": {"replies": []}}
+
+    def _probe_sub_comments(
+        self, oid: str, rpid: int, referer: str = None
+    ) -> Tuple[Dict[str, Any], int, int]:
+        """请求第一页子评论，同时探测接口接受的最大分页大小
 
-            return {"code": -1, "message": str(e), "data": {"replies": []}}
+        从大到小尝试 SUB_COMMENT_PAGE_SIZES，遇到参数错误时换用更小的分页，
+        成功后缓存到实例上，之后的评论串直接使用。已有缓存时不加锁，各线程并发请求；
+        还没有缓存时同一时间只有一个线程探测，其他线程等待探测结果。
+
+        Returns:
+            (第一页的返回数据, 使用的分页大小, 发出的请求数)
+        """
+        page_size = self.sub_comment_page_size
+        if page_size is None:
+            with self._page_size_lock:
+                page_size = self.sub_comment_page_size
+                if page_size is None:
+                    return self._probe_page_size(oid, rpid, referer)
+
+        return self.fetch_sub_comments(oid, rpid, 1, referer, page_size), page_size, 1
+
+    def _probe_page_size(
+        self, oid: str, rpid: int, referer: str = None
+    ) -> Tuple[Dict[str, Any], int, int]:
+        """逐个尝试分页大小请求第一页，成功时缓存分页大小（调用方需持有 _page_size_lock）"""
+        requests_made = 0
+        for page_size in SUB_COMMENT_PAGE_SIZES:
+            sub_cmt_info = self.fetch_sub_comments(oid, rpid, 1, referer, page_size)
+            requests_made += 1
+            code = sub_cmt_info.get("code")
+
+            if code == 0:
+                page_size = accepted_page_size(page_size, sub_cmt_info)
+                self.sub_comment_page_size = page_size
+                logger.info(f"子评论分页大小: {page_size}")
+                return sub_cmt_info, page_size, requests_made
+
+            if code not in PAGE_SIZE_FALLBACK_CODES:
+                break
+
+            logger.info(f"子评论分页大小 {page_size} 不可用({code})，尝试更小的分页")
+
+        return sub_cmt_info, page_size, requests_made
+
+    def iter_sub_comments(
+        self,
+        oid: str,
+        rpid: int,
+        referer: str = None,
+        max_retries: int = 3,
+        stats: Optional[Dict[str, int]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """逐页获取某条根评论下的子评论
+
+        生成器，每次请求一页并返回该页的评论列表（见 collect_sub_comment_page），
+        调用方停止迭代即不再发出后续请求。所有分页复用同一个keep-alive会话。
+        分页大小在第一次请求时探测（见 _probe_sub_comments），根据 data.page.count
+        判断最后一页。触发风控时退避后重试当前页，其他错误结束迭代。
+
+        Args:
+            oid: 视频/番剧的oid
+            rpid: 根评论ID
+            referer: 请求的Referer，默认使用会话的Referer
+            max_retries: 单页触发风控时的最大重试次数
+            stats: 可选的统计字典，迭代过程中更新 requests（请求数）和 pages（页数）
+
+        Yields:
+            每一页的评论列表
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault("requests", 0)
+        stats.setdefault("pages", 0)
+
+        page = 1
+        retries = 0
+        fetched = 0
+
+        while True:
+            if page == 1:
+                sub_cmt_info, page_size, requests_made = self._probe_sub_comments(
+                    oid, rpid, referer
+                )
+            else:
+                sub_cmt_info = self.fetch_sub_comments(
+                    oid, rpid, page, referer, page_size
+                )
+                requests_made = 1
+            stats["requests"] += requests_made
+
+            # 触发风控时退避后重试当前页
+            if is_throttle_code(sub_cmt_info.get("code")) and retries < max_retries:
+                retries += 1
+                self.sleep_between_requests("retry")
+                continue
+
+            if sub_cmt_info.get("code") != 0:
+                logger.error(
+                    f"获取评论 {rpid} 的子评论失败: {sub_cmt_info.get('message', '未知错误')}"
+                )
+                return
+
+            data = sub_cmt_info.get("data") or {}
+            page_replies = collect_sub_comment_page(data)
+            if not page_replies:
+                return
+
+            stats["pages"] += 1
+            yield page_replies
+
+            fetched += len(data.get("replies") or [])
+            if is_last_sub_comment_page(data, page_size, fetched):
+                return
+
+            page += 1
+            retries = 0
 
     def fetch_video_list(self, mid: int, page: int, order: str) -> Dict[str, Any]:
         """获取UP主视频列表"""
         # 请求前添加延迟
-        self.sleep_between_requests()
+        self.sleep_between_requests(endpoint="arc/search")
 
         # 构建URL
         params = {
@@ -605,9 +864,7 @@ class BilibiliAPI:
             response = self.session.get(signed_url, headers=headers, timeout=10)
 
             logger.info(f"获取视频列表的状态码: {response.status_code}")
-            response.raise_for_status()
-
-            data = response.json()
+            data = self._read_json(response)
             if data.get("code") != 0:
                 logger.error(f"获取UP主视频列表失败: {data.get('message', '未知错误')}")
 
@@ -615,4 +872,8 @@ class BilibiliAPI:
 
         except Exception as e:
             logger.error(f"获取UP主视频列表出错: {e}")
-            return {"code": -1, "message": str(e), "data": {"list": {"vlist": []}}}
+            return {
+                "code": error_code(e),
+                "message": str(e),
+                "data": {"list": {"vlist": []}},
+            }
@@ -0,0 +1,367 @@
+import asyncio
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 按接口划分的令牌桶
+ENDPOINTS = ("reply", "reply/reply", "wbi/main", "arc/search", "view")
+
+# B站风控相关的返回码：-412 请求被拦截，-352 风控校验失败，-799 请求过于频繁，-509 请求过于频繁
+THROTTLE_CODES = {-412, -352, -799, -509}
+# 表示被限流的HTTP状态码，及请求异常时换算成的B站风控返回码
+THROTTLE_HTTP_CODES = {412: -412, 429: -509}
+THROTTLE_HTTP_STATUS = set(THROTTLE_HTTP_CODES)
+
+
+def classify_response(http_status: Optional[int] = None, code: Optional[int] = None) -> str:
+    """根据HTTP状态码和B站返回码对响应分类
+
+    Returns:
+        "throttled": 触发风控/限流
+        "ok": 请求成功
+        "error": 其他错误
+    """
+    if http_status in THROTTLE_HTTP_STATUS or code in THROTTLE_CODES:
+        return "throttled"
+    if http_status is not None and not 200 <= http_status < 300:
+        return "error"
+    if code is None or code == 0:
+        return "ok"
+    return "error"
+
+
+def is_throttle_code(code: Optional[int]) -> bool:
+    """判断B站返回码是否表示触发风控"""
+    return code in THROTTLE_CODES
+
+
+def error_code(error: Exception) -> int:
+    """请求异常对应的返回码
+
+    HTTP 412/429 被限流时返回对应的风控返回码，调用方可以用 is_throttle_code 判断后退避重试；
+    其他异常（网络错误、其他HTTP错误等）返回 -1。
+    """
+    response = getattr(error, "response", None)
+    return THROTTLE_HTTP_CODES.get(getattr(response, "status_code", None), -1)
+
+
+class AdaptiveRateController:
+    """根据风控反馈调节请求速率（加性增、乘性减）
+
+    触发风控时速率按 decrease_factor 成倍下降，连续成功 increase_after 次后速率增加
+    increase_step，直到 max_rate。冷却时间内的多次风控只降速一次，避免并发请求同时失败时
+    速率被连续砍半。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        decrease_factor: float = 0.5,
+        increase_step: float = 0.05,
+        increase_after: int = 10,
+        cooldown: float = 5.0,
+    ):
+        self._lock = threading.Lock()
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.effective_rate = min(max(rate, self.min_rate), self.max_rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.increase_after = increase_after
+        self.cooldown = cooldown
+        self.success_streak = 0
+        self.throttle_streak = 0
+        self.throttle_count = 0
+        self._last_decrease = 0.0
+
+    def on_success(self) -> Optional[float]:
+        """记录一次成功请求，速率发生变化时返回新速率"""
+        with self._lock:
+            self.throttle_streak = 0
+            self.success_streak += 1
+            if (
+                self.success_streak >= self.increase_after
+                and self.effective_rate < self.max_rate
+            ):
+                self.success_streak = 0
+                self.effective_rate = min(
+                    self.max_rate, self.effective_rate + self.increase_step
+                )
+                return self.effective_rate
+            return None
+
+    def on_throttle(self) -> Optional[float]:
+        """记录一次风控响应，速率发生变化时返回新速率"""
+        with self._lock:
+            self.success_streak = 0
+            self.throttle_streak += 1
+            self.throttle_count += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return None
+            self._last_decrease = now
+            self.effective_rate = max(
+                self.min_rate, self.effective_rate * self.decrease_factor
+            )
+            return self.effective_rate
+
+    def retry_delay(self, base_delay: float, max_delay: float = 120.0) -> float:
+        """计算重试等待时间：未触发风控时为基础等待时间，连续风控时按指数增长"""
+        with self._lock:
+            streak = self.throttle_streak
+        if streak <= 0:
+            return base_delay
+        return min(max_delay, base_delay * (2 ** min(streak - 1, 6)))
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    以 rate 的速率持续发放令牌，最多积攒 burst 个。获取令牌采用预约方式：
+    先在锁内扣除令牌并算出需要等待的时间，再在锁外等待，因此同一个桶可以同时被
+    线程和协程使用。令牌按时间补充，上一次请求的网络耗时会计入间隔，而不是叠加在间隔之上。
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        """初始化令牌桶
+
+        Args:
+            rate: 持续速率（每秒令牌数）
+            burst: 桶容量，即允许的突发请求数
+        """
+        self._lock = threading.Lock()
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """按经过的时间补充令牌（调用方需持有锁）"""
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """预约令牌
+
+        Returns:
+            获得令牌前需要等待的时间（秒）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞获取令牌，返回实际等待的时间（秒）"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """在协程中获取令牌，等待期间不阻塞事件循环"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        """调整速率和容量，已积攒的令牌按新容量截断"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(rate, 0.001)
+            if burst is not None:
+                self.burst = max(burst, 1.0)
+            self._tokens = min(self._tokens, self.burst)
+
+
+class RateLimiter:
+    """按接口划分令牌桶的请求限速器
+
+    同一进程内的所有 BilibiliAPI / AsyncBilibiliAPI 实例共享同一个限速器（见 get_rate_limiter），
+    多个线程或协程同时请求时，整体速率仍受配置约束。
+    启用自适应时，接口层通过 report() 反馈每次响应，限速器据此调整所有令牌桶的实际速率。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        adaptive: bool = False,
+        max_rate: Optional[float] = None,
+    ):
+        """初始化限速器
+
+        Args:
+            rate: 每个接口的持续请求速率（次/秒），启用自适应时作为初始速率
+            burst: 每个接口允许的突发请求数
+            adaptive: 是否根据风控反馈自动调节速率
+            max_rate: 自适应调节的速率上限，默认等于 rate
+        """
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.controller: Optional[AdaptiveRateController] = None
+        if adaptive:
+            self.controller = self._create_controller(rate, max_rate)
+        self.buckets: Dict[str, TokenBucket] = {
+            endpoint: TokenBucket(rate, burst) for endpoint in ENDPOINTS
+        }
+
+    @staticmethod
+    def _create_controller(rate: float, max_rate: Optional[float]):
+        """创建自适应控制器，速率下限为初始速率的十分之一"""
+        return AdaptiveRateController(
+            rate=rate,
+            min_rate=rate / 10,
+            max_rate=max(max_rate or rate, rate),
+        )
+
+    @property
+    def effective_rate(self) -> float:
+        """当前实际生效的请求速率（次/秒）"""
+        if self.controller:
+            return self.controller.effective_rate
+        return self.rate
+
+    def _apply_rate(self, rate: float) -> None:
+        """把速率应用到所有令牌桶"""
+        with self._lock:
+            for bucket in self.buckets.values():
+                bucket.set_rate(rate)
+
+    def report(self, http_status: Optional[int] = None, code: Optional[int] = None) -> str:
+        """反馈一次响应结果，用于自适应调节速率
+
+        Args:
+            http_status: HTTP状态码
+            code: B站接口返回的code
+
+        Returns:
+            响应分类，见 classify_response
+        """
+        kind = classify_response(http_status, code)
+        if not self.controller:
+            return kind
+
+        if kind == "throttled":
+            new_rate = self.controller.on_throttle()
+            if new_rate is not None:
+                logger.warning(
+                    f"触发风控(HTTP {http_status}, code {code})，请求速率降至 {new_rate:.2f} 次/秒"
+                )
+                self._apply_rate(new_rate)
+        elif kind == "ok":
+            new_rate = self.controller.on_success()
+            if new_rate is not None:
+                logger.info(f"请求持续成功，请求速率升至 {new_rate:.2f} 次/秒")
+                self._apply_rate(new_rate)
+        return kind
+
+    def retry_delay(self, base_delay: float) -> float:
+        """获取重试等待时间，连续触发风控时自动加长"""
+        if self.controller:
+            return self.controller.retry_delay(base_delay)
+        return base_delay
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        """获取接口对应的令牌桶，未知接口按需创建"""
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(endpoint)
+                if bucket is None:
+                    bucket = TokenBucket(self.effective_rate, self.burst)
+                    self.buckets[endpoint] = bucket
+        return bucket
+
+    def acquire(self, endpoint: str = "reply") -> float:
+        """阻塞获取请求许可，返回实际等待的时间（秒）"""
+        wait = self.bucket(endpoint).acquire()
+        if wait > 0:
+            logger.debug(f"请求限速等待: {wait:.2f}秒 ({endpoint})")
+        return wait
+
+    async def acquire_async(self, endpoint: str = "reply") -> float:
+        """在协程中获取请求许可，返回实际等待的时间（秒）"""
+        wait = await self.bucket(endpoint).acquire_async()
+        if wait > 0:
+            logger.debug(f"请求限速等待: {wait:.2f}秒 ({endpoint})")
+        return wait
+
+    def configure(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        adaptive: Optional[bool] = None,
+        max_rate: Optional[float] = None,
+    ):
+        """调整所有接口的速率和突发数，自适应控制从新的初始速率重新开始"""
+        with self._lock:
+            if rate is not None:
+                self.rate = rate
+            if burst is not None:
+                self.burst = burst
+            if adaptive is None:
+                adaptive = self.controller is not None
+            if adaptive:
+                if max_rate is None and self.controller:
+                    max_rate = self.controller.max_rate
+                self.controller = self._create_controller(self.rate, max_rate)
+            else:
+                self.controller = None
+            for bucket in self.buckets.values():
+                bucket.set_rate(self.rate, self.burst)
+        logger.info(f"请求限速已设置: {self.rate:.2f} 次/秒, 突发 {self.burst} 次")
+
+    def load_config(self) -> None:
+        """从配置重新加载速率、突发数和自适应设置"""
+        rate, burst, adaptive, max_rate = rate_from_config()
+        self.configure(rate, burst, adaptive, max_rate)
+
+
+def rate_from_config():
+    """从配置计算持续速率和突发数
+
+    持续速率取请求延迟平均值的倒数，与原先每次请求前随机延迟的平均间隔一致。
+
+    Returns:
+        (rate, burst, adaptive, max_rate)
+    """
+    from config import Config
+
+    config = Config()
+    min_delay = config.get("request_delay_min", 1.0)
+    max_delay = config.get("request_delay_max", 2.0)
+    mean_delay = max((min_delay + max_delay) / 2, 0.01)
+    burst = config.get("request_burst", 2)
+    adaptive = config.get("adaptive_rate", True)
+    # 未设置上限（0）时，自适应调节只在降速后恢复，不会超过请求延迟对应的速率
+    max_rate = config.get("request_rate_max", 0.0)
+    return 1.0 / mean_delay, burst, adaptive, max_rate
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限速器"""
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                rate, burst, adaptive, max_rate = rate_from_config()
+                _limiter = RateLimiter(rate, burst, adaptive, max_rate)
+    return _limiter
@@ -0,0 +1,400 @@
+"""
+命令行入口
+无需图形界面即可批量获取评论、生成地图和词云、下载图片，适合在服务器上运行
+
+用法示例：
+    bicodown crawl video BV1xx411c7mD BV1yy411c7mE --rate 0.5
+    bicodown crawl video -i bvids.txt --output /data/bili
+    cat bvids.txt | bicodown crawl video -
+    bicodown crawl up 123456 --end-page 5 --videos 4 --priority recency
+    bicodown map BV1xx411c7mD
+    bicodown wordcloud /data/bili/BV1xx411c7mD_标题/BV1xx411c7mD.csv
+    bicodown images BV1xx411c7mD
+
+进度以JSON行的形式输出到标准输出，日志输出到标准错误。
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from config import Config
+from api.bilibili_api import BilibiliAPI, parse_bilibili_url
+from api.rate_limiter import get_rate_limiter
+from store.image_queue import get_image_queue
+from crawler import (
+    CrawlEvent,
+    CrawlOptions,
+    CrawlScheduler,
+    PRIORITIES,
+    collect_up_videos,
+)
+
+logger = logging.getLogger("cli")
+
+# 爬取日志事件级别到logging级别的映射
+EVENT_LOG_LEVELS = {"warning": logging.WARNING, "error": logging.ERROR}
+
+
+def emit(data: dict) -> None:
+    """输出一行JSON进度"""
+    sys.stdout.write(json.dumps(data, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def emit_event(event: CrawlEvent) -> None:
+    """输出爬取进度事件，日志事件只写入日志"""
+    if event.kind == "log":
+        level = EVENT_LOG_LEVELS.get(event.level, logging.INFO)
+        logger.log(level, f"[{event.identifier}] {event.message}")
+    else:
+        emit(event.to_dict())
+
+
+def read_targets(values: List[str], input_file: Optional[str]) -> List[str]:
+    """汇总命令行参数、文件和标准输入中的目标
+
+    参数为 "-" 时从标准输入读取，文件和标准输入中每行一个目标，空行和 # 开头的行会被忽略。
+    """
+    lines: List[str] = []
+
+    def add_lines(stream: Iterable[str]) -> None:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                lines.append(line)
+
+    for value in values:
+        if value == "-":
+            add_lines(sys.stdin)
+        else:
+            lines.append(value)
+
+    if input_file:
+        with open(input_file, "r", encoding="utf-8") as f:
+            add_lines(f)
+
+    # 去重并保持原有顺序
+    return list(dict.fromkeys(lines))
+
+
+def find_csv(target: str, output: str) -> Optional[Path]:
+    """根据CSV路径、评论目录或标识符找到评论CSV文件"""
+    path = Path(target)
+    if path.is_file():
+        return path
+
+    if path.is_dir():
+        identifier = path.name.split("_", 1)[0]
+        csv_path = path / f"{identifier}.csv"
+        return csv_path if csv_path.exists() else None
+
+    try:
+        _, identifier = parse_bilibili_url(target)
+    except ValueError:
+        identifier = target
+
+    for item in sorted(Path(output).glob(f"{identifier}_*")):
+        csv_path = item / f"{identifier}.csv"
+        if csv_path.exists():
+            return csv_path
+    return None
+
+
+def setup_logging(verbose: bool) -> None:
+    """日志输出到标准错误，避免与JSON进度混在一起"""
+    level = logging.DEBUG if verbose else Config().get("log_level", "INFO")
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        stream=sys.stderr,
+    )
+
+
+def apply_common_options(args) -> None:
+    """应用本次运行的限速设置，不写入配置文件"""
+    if args.rate is not None:
+        # 自适应调节不超过 --rate，只有配置了 request_rate_max 时才以它为上限
+        max_rate = Config().get("request_rate_max", 0.0) or args.rate
+        get_rate_limiter().configure(rate=args.rate, max_rate=max_rate)
+
+
+def crawl_options(args) -> CrawlOptions:
+    """根据命令行参数创建爬取选项"""
+    return CrawlOptions(
+        output=args.output,
+        order=args.order,
+        mapping=False if args.no_map else None,
+        overwrite=getattr(args, "overwrite", False),
+        workers=args.concurrency,
+        resume=not args.no_resume,
+        incremental=args.incremental,
+    )
+
+
+def run_scheduler(targets, args, api: BilibiliAPI) -> int:
+    """并发爬取多个视频，返回失败的视频数"""
+    scheduler = CrawlScheduler(
+        targets,
+        crawl_options(args),
+        api=api,
+        concurrency=args.videos,
+        priority=args.priority,
+    )
+    scheduler.subscribe(emit_event)
+    try:
+        results = scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        raise
+    return sum(1 for result in results if not result.success)
+
+
+def cmd_crawl_video(args) -> int:
+    """批量获取视频/番剧评论"""
+    targets = read_targets(args.targets, args.input)
+    if not targets:
+        logger.error("没有需要获取的视频")
+        return 2
+
+    identifiers = []
+    failed = 0
+
+    for target in targets:
+        try:
+            _, identifier = parse_bilibili_url(target)
+        except ValueError as e:
+            logger.error(str(e))
+            emit({"kind": "done", "identifier": target, "success": False})
+            failed += 1
+            continue
+        identifiers.append(identifier)
+
+    if identifiers:
+        api = BilibiliAPI(Config().get("cookie", ""))
+        failed += run_scheduler(identifiers, args, api)
+
+    return 1 if failed else 0
+
+
+def cmd_crawl_up(args) -> int:
+    """获取UP主视频的评论"""
+    targets = read_targets(args.targets, args.input)
+    if not targets:
+        logger.error("没有需要获取的UP主")
+        return 2
+
+    api = BilibiliAPI(Config().get("cookie", ""))
+    failed = 0
+
+    for target in targets:
+        if not target.isdigit():
+            logger.error(f"UP主ID必须是数字: {target}")
+            failed += 1
+            continue
+
+        mid = int(target)
+        logger.info(f"开始获取UP主 {mid} 的视频列表")
+        videos = collect_up_videos(
+            api,
+            mid,
+            args.start_page,
+            args.end_page,
+            args.video_order,
+            log=lambda message, level="info": logger.info(message),
+        )
+        emit({"kind": "videos", "mid": mid, "count": len(videos)})
+
+        if videos:
+            failed += run_scheduler(videos, args, api)
+
+    return 1 if failed else 0
+
+
+def run_csv_command(args, command: str, action) -> int:
+    """对每个CSV执行地图、词云或图片下载"""
+    output = args.output or Config().get("output", "")
+    targets = read_targets(args.targets, args.input)
+    failed = 0
+
+    for target in targets:
+        csv_path = find_csv(target, output)
+        if csv_path is None:
+            logger.error(f"找不到 {target} 对应的CSV文件")
+            emit({"kind": "done", "command": command, "target": target, "success": False})
+            failed += 1
+            continue
+
+        try:
+            success = action(csv_path)
+        except Exception as e:
+            logger.exception(f"处理 {csv_path} 出错: {e}")
+            success = False
+
+        emit(
+            {
+                "kind": "done",
+                "command": command,
+                "target": target,
+                "csv": str(csv_path),
+                "success": bool(success),
+            }
+        )
+        if not success:
+            failed += 1
+
+    return 1 if failed else 0
+
+
+def cmd_map(args) -> int:
+    """从CSV生成评论地区分布地图"""
+    from store.csv_analyzer import generate_map_from_csv
+
+    return run_csv_command(
+        args, "map", lambda csv_path: generate_map_from_csv(str(csv_path), str(csv_path.parent))
+    )
+
+
+def cmd_wordcloud(args) -> int:
+    """从CSV生成词云"""
+    from store.wordcloud_exporter import generate_wordcloud_from_csv
+
+    return run_csv_command(
+        args,
+        "wordcloud",
+        lambda csv_path: generate_wordcloud_from_csv(str(csv_path), str(csv_path.parent)),
+    )
+
+
+def cmd_images(args) -> int:
+    """下载CSV中的评论图片"""
+    from store.image_downloader import download_images_from_csv
+
+    def action(csv_path: Path) -> bool:
+        result = download_images_from_csv(str(csv_path))
+        emit({"kind": "images", "csv": str(csv_path), **result})
+        return True
+
+    return run_csv_command(args, "images", action)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """创建命令行参数解析器"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="输出根目录，默认使用配置中的输出目录")
+    common.add_argument(
+        "--rate",
+        type=float,
+        help="每个接口的请求速率（次/秒），只对本次运行有效；"
+        "自适应调节不会超过该速率，除非配置了 request_rate_max",
+    )
+    common.add_argument(
+        "--concurrency", type=int, help="子评论并发线程数，默认使用配置中的 workers"
+    )
+    common.add_argument("-v", "--verbose", action="store_true", help="输出调试日志")
+
+    targets = argparse.ArgumentParser(add_help=False)
+    targets.add_argument("targets", nargs="*", help="目标列表，- 表示从标准输入读取")
+    targets.add_argument("-i", "--input", help="从文件读取目标，每行一个")
+
+    crawl_common = argparse.ArgumentParser(add_help=False)
+    crawl_common.add_argument(
+        "--order",
+        type=int,
+        choices=[0, 1, 2],
+        help="评论排序方式，0：按时间，1：按点赞数，2：按回复数",
+    )
+    crawl_common.add_argument("--no-map", action="store_true", help="不生成地区分布地图")
+    crawl_common.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量更新：只获取已有CSV之后的新评论，固定按时间排序",
+    )
+    crawl_common.add_argument(
+        "--no-resume", action="store_true", help="忽略未完成任务的检查点，从第一页开始获取"
+    )
+    crawl_common.add_argument(
+        "--videos", type=int, help="同时爬取的视频数，默认使用配置中的 video_concurrency"
+    )
+    crawl_common.add_argument(
+        "--priority",
+        choices=list(PRIORITIES),
+        help="视频爬取优先顺序，默认使用配置中的 video_priority",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="bicodown", description="B站评论批量获取与分析工具"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl = subparsers.add_parser("crawl", help="获取评论")
+    crawl_sub = crawl.add_subparsers(dest="crawl_command", required=True)
+
+    video = crawl_sub.add_parser(
+        "video",
+        parents=[common, targets, crawl_common],
+        help="获取视频/番剧评论，目标为BV号、EP号、SS号或链接",
+    )
+    video.add_argument("--overwrite", action="store_true", help="覆盖已有的CSV")
+    video.set_defaults(func=cmd_crawl_video)
+
+    up = crawl_sub.add_parser(
+        "up", parents=[common, targets, crawl_common], help="获取UP主视频评论，目标为UP主ID"
+    )
+    up.add_argument("--start-page", type=int, default=1, help="视频列表起始页")
+    up.add_argument("--end-page", type=int, default=3, help="视频列表结束页")
+    up.add_argument(
+        "--video-order",
+        choices=["pubdate", "click", "stow"],
+        default=Config().get("vorder", "pubdate"),
+        help="视频排序方式",
+    )
+    up.set_defaults(func=cmd_crawl_up)
+
+    for name, func, help_text in (
+        ("map", cmd_map, "从CSV生成评论地区分布地图"),
+        ("wordcloud", cmd_wordcloud, "从CSV生成词云"),
+        ("images", cmd_images, "下载CSV中的评论图片"),
+    ):
+        sub = subparsers.add_parser(
+            name,
+            parents=[common, targets],
+            help=f"{help_text}，目标为CSV路径、评论目录或标识符",
+        )
+        sub.set_defaults(func=func)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口函数"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+    apply_common_options(args)
+
+    try:
+        code = args.func(args)
+    except KeyboardInterrupt:
+        logger.warning("用户中断")
+        get_image_queue().close(wait=False)
+        return 130
+
+    # 进程退出前等待后台图片下载完成
+    image_queue = get_image_queue()
+    if image_queue.pending:
+        logger.info(f"等待 {image_queue.pending} 张图片下载完成...")
+    image_queue.close(wait=True)
+    if image_queue.stats["queued"]:
+        logger.info(image_queue.describe())
+        logger.info(f"图片服务器: {image_queue.downloader.describe_hosts()}")
+    image_queue.downloader.close()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,14 +13,24 @@ DEFAULT_CONFIG = {
     "output": str(BASE_DIR / "output"),
     "mapping": True,
     "workers": 3,
+    "video_concurrency": 2,  # UP主批量下载时同时爬取的视频数
+    "video_priority": "comments",  # 视频爬取优先顺序，comments：按评论数，recency：按发布时间，order：按列表顺序
     "corder": 1,  # 评论排序方式，0：按时间，1：按点赞数，2：按回复数
     "vorder": "pubdate",  # 视频排序方式，最新发布：pubdate最多播放：click最多收藏：stow
     "request_delay_min": 1.0,  # 最小请求延迟（秒）
     "request_delay_max": 2.0,  # 最大请求延迟（秒）
+    "request_burst": 2,  # 每个接口允许的突发请求数，持续速率由请求延迟的平均值决定
+    "adaptive_rate": True,  # 是否根据风控反馈自动调节请求速率
+    "request_rate_max": 0.0,  # 自适应调节时的最大请求速率（次/秒），0 表示不超过请求延迟对应的速率
     "request_retry_delay": 5.0,  # 请求失败重试等待时间（秒）
     "max_retries": 2,  # 统一的最大重试次数
     "consecutive_empty_limit": 1,  # 连续空页面的限制数，超过此数认为评论已获取完毕
     "download_images": False,  # 是否在下载评论时自动下载图片
+    "image_workers": 3,  # 后台图片下载线程数
+    "image_bandwidth": 0,  # 图片下载总带宽上限（KB/s），0 表示不限
+    "image_profile": "original",  # 图片下载格式，original：原图，webp/avif：由图片服务器转码，体积小很多
+    "image_width": 0,  # 转码时缩放到的宽度（像素），0 表示保持原宽度
+    "image_cache": True,  # 是否使用图片缓存，同一张图片只下载、保存一次，各视频目录中为硬链接
     "log_level": "INFO",  # 日志级别：DEBUG, INFO, WARNING, ERROR, CRITICAL
     "max_log_files": 10,  # 保留的最大日志文件数量
 }
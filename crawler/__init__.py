@@ -0,0 +1,24 @@
+"""
+评论爬取模块
+提供与界面无关的爬取引擎，可在GUI、命令行或工作进程中使用
+"""
+
+from .events import CrawlEvent, CrawlResult, format_eta
+from .comment_crawler import CommentCrawler, CrawlOptions, add_comment_stat
+from .pipeline import Pipeline, StageStats
+from .scheduler import CrawlScheduler, PRIORITIES
+from .up_videos import collect_up_videos
+
+__all__ = [
+    'CommentCrawler',
+    'CrawlOptions',
+    'CrawlScheduler',
+    'Pipeline',
+    'StageStats',
+    'PRIORITIES',
+    'CrawlEvent',
+    'CrawlResult',
+    'format_eta',
+    'add_comment_stat',
+    'collect_up_videos'
+]
@@ -0,0 +1,893 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import Config
+from api.bilibili_api import BilibiliAPI, extract_title_from_dirname, get_dir_name
+from models.comment import Comment, Stat
+from models.video import Video
+from store.csv_analyzer import (
+    analyze_csv_for_map,
+    normalize_location,
+    read_comment_index,
+)
+from store.csv_exporter import CsvSink
+from store.image_queue import get_image_queue
+from store.geo_exporter import write_geojson
+from store.job_store import CrawlJob, JobStore, get_job_store
+from store.rpid_set import RpidSet, append_rpids, rpid_path
+from .events import CrawlEvent, CrawlResult, estimate_eta, format_eta
+from .pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# 流水线阶段之间最多积压的页数
+PIPELINE_QUEUE_SIZE = 4
+
+# 内容类型显示名称映射
+CONTENT_TYPE_NAMES = {"video": "视频", "bangumi": "番剧剧集", "season": "番剧季度"}
+
+
+def detect_content_type(identifier: str) -> str:
+    """根据标识符前缀判断内容类型"""
+    if identifier.startswith("EP"):
+        return "bangumi"
+    if identifier.startswith("SS"):
+        return "season"
+    return "video"
+
+
+def add_comment_stat(stat_map: Dict[str, Stat], comment: Comment) -> None:
+    """把一条评论计入地区统计"""
+    location = comment.location
+    if not location or location == "":
+        location = "未知"
+
+    # 规范化地区名称，与CSV分析保持一致
+    normalized_location = normalize_location(location)
+
+    stat = stat_map.get(normalized_location)
+    if stat is None:
+        stat = Stat(name=normalized_location)
+        stat_map[normalized_location] = stat
+
+    stat.add_comment(comment.like, comment.current_level, comment.mid, comment.sex)
+
+
+@dataclass
+class CrawlOptions:
+    """评论爬取选项，未指定的项使用配置中的值"""
+
+    output: Optional[str] = None  # 输出根目录
+    order: Optional[int] = None  # 评论排序方式，0：按时间，1：按点赞数，2：按回复数
+    mapping: Optional[bool] = None  # 是否统计地区并生成地图
+    overwrite: bool = False  # 是否覆盖已有的CSV
+    workers: Optional[int] = None  # 子评论并发线程数
+    max_retries: Optional[int] = None  # 主评论页的最大重试次数
+    consecutive_empty_limit: Optional[int] = None  # 连续空页面的限制数
+    resume: bool = True  # 是否从未完成任务的检查点继续
+    incremental: bool = False  # 是否只获取上次之后的新评论，按时间排序获取
+    wait_images: bool = False  # 爬取结束时是否等待后台图片下载完成
+
+    def resolve(self) -> "CrawlOptions":
+        """用配置补全未指定的选项，返回新的选项对象"""
+        config = Config()
+        # 增量更新依赖按时间排序，覆盖时没有可以增量的数据
+        incremental = self.incremental and not self.overwrite
+        if incremental:
+            order = 0
+        else:
+            order = self.order if self.order is not None else config.get("corder", 1)
+        return CrawlOptions(
+            output=self.output if self.output else config.get("output", ""),
+            order=order,
+            mapping=(
+                self.mapping
+                if self.mapping is not None
+                else config.get("mapping", True)
+            ),
+            overwrite=self.overwrite,
+            workers=max(
+                1,
+                self.workers if self.workers is not None else config.get("workers", 3),
+            ),
+            max_retries=(
+                self.max_retries
+                if self.max_retries is not None
+                else config.get("max_retries", 3)
+            ),
+            consecutive_empty_limit=(
+                self.consecutive_empty_limit
+                if self.consecutive_empty_limit is not None
+                else config.get("consecutive_empty_limit", 2)
+            ),
+            resume=self.resume,
+            incremental=incremental,
+            wait_images=self.wait_images,
+        )
+
+
+class CommentCrawler:
+    """评论爬取引擎
+
+    负责一个视频/番剧的完整爬取流程：获取内容信息、逐页获取主评论、并发获取子评论、
+    写入CSV、统计地区并生成地图。与界面无关，进度通过事件（见 CrawlEvent）通知订阅者，
+    可以在GUI、命令行或工作进程中使用。
+
+    用法：
+        crawler = CommentCrawler("BV1xx411c7mD", CrawlOptions(order=0))
+        crawler.subscribe(print)
+        result = crawler.run()
+
+    或者以迭代器方式消费事件（爬取在后台线程中进行）：
+        for event in crawler.events():
+            ...
+    """
+
+    def __init__(
+        self,
+        identifier: str,
+        options: Optional[CrawlOptions] = None,
+        api: Optional[BilibiliAPI] = None,
+        content_type: Optional[str] = None,
+        video: Optional[Video] = None,
+        job_store: Optional[JobStore] = None,
+    ):
+        """初始化爬取引擎
+
+        Args:
+            identifier: 内容标识符（BV号、EP号或SS号）
+            options: 爬取选项，默认全部使用配置
+            api: B站API实例，默认按配置中的Cookie创建
+            content_type: 内容类型，默认根据标识符判断
+            video: 已知的视频信息（如UP主视频列表中的视频），提供时不再请求内容信息
+            job_store: 保存爬取检查点的任务存储，默认使用进程内共享的实例
+        """
+        self.identifier = identifier
+        self.options = (options or CrawlOptions()).resolve()
+        self.api = api or BilibiliAPI(Config().get("cookie", ""))
+        self.content_type = content_type or detect_content_type(identifier)
+        self.video = video
+        self.job_store = job_store or get_job_store()
+
+        self._subscribers: List[Callable[[CrawlEvent], Any]] = []
+        self._stop_event = threading.Event()
+
+    @property
+    def type_name(self) -> str:
+        """内容类型的显示名称"""
+        return CONTENT_TYPE_NAMES.get(self.content_type, "内容")
+
+    @property
+    def stopped(self) -> bool:
+        """是否已请求停止"""
+        return self._stop_event.is_set()
+
+    def subscribe(self, callback: Callable[[CrawlEvent], Any]) -> None:
+        """订阅爬取事件，回调在爬取线程中调用"""
+        self._subscribers.append(callback)
+
+    def stop(self) -> None:
+        """请求停止爬取，当前请求完成后退出"""
+        self._stop_event.set()
+
+    def _emit(self, kind: str, **kwargs) -> None:
+        """向所有订阅者发送事件"""
+        event = CrawlEvent(kind=kind, identifier=self.identifier, **kwargs)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"处理爬取事件出错: {e}")
+
+    def log(self, message: str, level: str = "info") -> None:
+        """发送日志事件"""
+        self._emit("log", message=message, level=level)
+
+    def events(self) -> Iterator[CrawlEvent]:
+        """在后台线程中运行爬取，并逐个返回事件，最后一个事件为 "done"
+
+        提前结束迭代会停止爬取。
+        """
+        event_queue: "queue.Queue[CrawlEvent]" = queue.Queue()
+        self.subscribe(event_queue.put)
+
+        worker = threading.Thread(target=self.run, daemon=True)
+        worker.start()
+
+        try:
+            while True:
+                event = event_queue.get()
+                yield event
+                if event.kind == "done":
+                    break
+        finally:
+            self.stop()
+            worker.join()
+
+    def run(self) -> CrawlResult:
+        """执行爬取，阻塞直到完成或被停止"""
+        result = CrawlResult(identifier=self.identifier)
+
+        # 子评论线程池，所有线程共享同一个限速器，整体请求速率不变
+        sub_comment_pool = ThreadPoolExecutor(
+            max_workers=self.options.workers,
+            thread_name_prefix="sub-comments",
+        )
+        try:
+            prepared = self._prepare()
+            if prepared is None:
+                return result
+
+            oid, result.title, output_dir = prepared
+            result.output_dir = str(output_dir)
+
+            # 获取评论总数
+            result.total = self.api.fetch_comment_count(oid)
+            if result.total == 0:
+                self.log(
+                    f"{self.type_name} {self.identifier} ({result.title}) 未找到评论或获取评论数失败"
+                )
+                return result
+
+            self.log(
+                f"{self.type_name} {self.identifier} ({result.title}) 共有 {result.total} 条评论"
+            )
+
+            self._crawl_pages(sub_comment_pool, oid, result)
+            result.stopped = self.stopped
+
+            # 生成地图
+            if self.options.mapping and result.stat_map:
+                self._write_map(result)
+
+            if result.images:
+                self._wait_images()
+
+            result.success = True
+
+        except Exception as e:
+            self.log(f"下载{self.type_name} {self.identifier} 评论过程中出错: {e}", "error")
+            logger.exception(f"下载{self.type_name} {self.identifier} 评论出错")
+
+        finally:
+            sub_comment_pool.shutdown(wait=False, cancel_futures=True)
+            self._emit("done", result=result)
+
+        return result
+
+    def _wait_images(self) -> None:
+        """按选项等待后台图片下载完成，否则让下载在后台继续"""
+        image_queue = get_image_queue()
+        if not self.options.wait_images:
+            if image_queue.pending:
+                self.log(f"图片在后台继续下载，剩余 {image_queue.pending} 张")
+            return
+
+        self.log(f"等待 {image_queue.pending} 张图片下载完成...")
+        while not self.stopped and not image_queue.join(timeout=1.0):
+            pass
+        self.log(image_queue.describe())
+
+    def _prepare(self):
+        """获取内容信息并创建输出目录
+
+        Returns:
+            (oid, 标题, 输出目录)，获取内容信息失败时返回None
+        """
+        info = None
+        info_filename = "content_info.json"
+
+        if self.video is not None:
+            # 视频信息已知，只在缺少标题时请求接口
+            aid = self.video.aid
+            api_title = self.video.title or ""
+            info_filename = "video_info.json"
+        else:
+            self.log(f"开始获取{self.type_name} {self.identifier} 的评论", "header")
+
+            info = self.api.fetch_content_info(self.identifier, self.content_type)
+            if info.get("code") != 0:
+                error_msg = info.get("message", "未知错误")
+                self.log(f"获取{self.type_name}信息失败: {error_msg}", "error")
+                return None
+
+            data = info.get("data", {})
+            aid = data.get("aid")
+            api_title = data.get("title", "未知内容")
+            self.log(f"获取到{self.type_name}信息: {api_title}")
+
+        if not aid:
+            self.log("无法获取有效的AID", "error")
+            return None
+
+        self.log(f"AID: {aid}")
+
+        # 检查是否已经存在包含标题的目录，已有目录的标题优先
+        base_output_dir = Path(self.options.output)
+        title = ""
+        for item in base_output_dir.glob(f"{self.identifier}_*"):
+            if item.is_dir():
+                extracted_title = extract_title_from_dirname(item.name)
+                if extracted_title:
+                    title = extracted_title
+                    self.log(f"找到已有目录，使用现有标题: {title}")
+                    break
+
+        if not title and api_title:
+            title = api_title
+            self.log(f"使用API获取的标题: {title}")
+
+        # 视频列表中没有标题时请求视频信息
+        if not title and self.video is not None:
+            self.log(f"正在获取视频 {self.identifier} 的信息...")
+            info = self.api.fetch_video_info(self.identifier)
+            if info.get("code") == 0:
+                title = info.get("data", {}).get("title", "")
+                self.log(f"从API获取到视频标题: {title}")
+            else:
+                info = None
+                self.log("获取视频标题失败，使用默认标题")
+
+        title = title or "未知视频"
+
+        # 创建输出目录 - 使用标识符+标题的格式
+        output_dir = base_output_dir / get_dir_name(self.identifier, title)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # 保存内容信息到JSON文件
+        info_path = output_dir / info_filename
+        if not info_path.exists() or (self.options.overwrite and info is not None):
+            if info is None:
+                # 使用视频列表中的信息
+                info = {
+                    "bvid": self.identifier,
+                    "aid": aid,
+                    "title": title,
+                    "author": self.video.author,
+                    "comment_count": self.video.comment,
+                }
+            try:
+                with open(info_path, "w", encoding="utf-8") as f:
+                    json.dump(info, f, ensure_ascii=False, indent=2)
+                self.log(f"已保存{self.type_name}信息到: {info_path}")
+            except Exception as e:
+                self.log(f"保存{self.type_name}信息失败: {e}")
+
+        return str(aid), title, output_dir
+
+    def _fetch_page(self, oid: str, round_num: int, offset_str: str, state: Dict):
+        """请求一页主评论并处理重试
+
+        Returns:
+            成功时返回接口数据，失败或空页面时返回None
+        """
+        max_retries = self.options.max_retries
+        retry_count = 0
+
+        while retry_count < max_retries and not self.stopped:
+            cmt_info = self.api.fetch_comments(
+                oid, round_num, self.options.order, offset_str
+            )
+
+            # 检查API请求是否成功
+            if cmt_info.get("code") != 0:
+                error_msg = cmt_info.get("message", "未知错误")
+                retry_count += 1
+                if retry_count < max_retries:
+                    retry_delay = self.api.get_retry_delay()
+                    self.log(
+                        f"请求评论失败: {error_msg}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
+                        "warning",
+                    )
+                    time.sleep(retry_delay)
+                    continue
+                self.log(
+                    f"请求评论失败: {error_msg}，已达到最大重试次数 {max_retries}，跳过此页",
+                    "error",
+                )
+                return None
+
+            replies = cmt_info.get("data", {}).get("replies", [])
+
+            # 处理空页面情况
+            if not replies:
+                state["empty_pages"] += 1
+                retry_count += 1
+                if retry_count < max_retries:
+                    retry_delay = self.api.get_retry_delay()
+                    self.log(
+                        f"第 {round_num} 页未获取到评论，连续空页面数: {state['empty_pages']}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
+                        "warning",
+                    )
+                    time.sleep(retry_delay)
+                    continue
+                self.log(
+                    f"第 {round_num} 页连续 {state['empty_pages']} 次未获取到评论，已达到最大重试次数",
+                    "warning",
+                )
+                return None
+
+            # 获取到了评论，重置连续空页面计数
+            state["empty_pages"] = 0
+            return cmt_info
+
+        return None
+
+    def _restore_job(self, result: CrawlResult):
+        """查找可以继续的未完成任务，并恢复CSV、去重状态和地区统计
+
+        CSV截断到检查点时的大小，去掉崩溃前写入但未记录检查点的部分，
+        已记录的评论ID和地区统计从截断后的CSV重建。
+
+        Returns:
+            (任务, 已记录的评论ID集合)，没有可继续的任务时返回None
+        """
+        if not self.options.resume or self.options.overwrite:
+            return None
+
+        job = self.job_store.get(self.identifier)
+        if (
+            job is None
+            or not job.resumable
+            or job.output_dir != result.output_dir
+            or job.sort_order != self.options.order
+        ):
+            return None
+
+        # 选择增量更新时不继续之前未完成的完整获取，否则会截断CSV并覆盖用户的选择
+        if self.options.incremental and not job.incremental:
+            self.log("忽略上次未完成的完整获取，开始增量更新")
+            return None
+
+        csv_path = Path(result.output_dir) / f"{self.identifier}.csv"
+        if not csv_path.exists() or csv_path.stat().st_size < job.csv_size:
+            self.log("CSV文件与检查点不一致，重新开始获取", "warning")
+            return None
+
+        with open(csv_path, "r+b") as f:
+            f.truncate(job.csv_size)
+
+        rpids, _, _ = read_comment_index(str(csv_path))
+        rpids.save(rpid_path(csv_path))
+        if self.options.mapping:
+            result.stat_map = analyze_csv_for_map(str(csv_path))
+
+        return job, rpids
+
+    def _load_rpids(self, csv_path: Path) -> RpidSet:
+        """读取已有CSV的评论ID，避免追加写入时重复
+
+        优先使用CSV旁边的 .rpids 文件，文件过期或不存在时从CSV重建。覆盖模式返回空集合。
+        """
+        rpid_file = rpid_path(csv_path)
+        if self.options.overwrite or not csv_path.exists():
+            rpids = RpidSet()
+        else:
+            rpids = RpidSet.load_for_csv(csv_path)
+            if rpids is None:
+                rpids, _, _ = read_comment_index(str(csv_path))
+            if rpids:
+                self.log(f"已有 {len(rpids)} 条评论，将跳过重复的评论")
+        rpids.save(rpid_file)
+        return rpids
+
+    def _start_incremental(self, result: CrawlResult):
+        """读取已有CSV，开始增量更新
+
+        Returns:
+            (任务, 已记录的评论ID集合, 根评论ID -> 子评论数)，没有已有数据时返回None
+        """
+        csv_path = Path(result.output_dir) / f"{self.identifier}.csv"
+        if not csv_path.exists():
+            self.log("没有已有的评论数据，将完整获取")
+            return None
+
+        rpids, since_ctime, thread_counts = read_comment_index(str(csv_path))
+        if not rpids:
+            self.log("没有已有的评论数据，将完整获取")
+            return None
+
+        if self.options.mapping:
+            result.stat_map = analyze_csv_for_map(str(csv_path))
+
+        # 任务存储中记录的是接口返回的子评论数，比CSV中的行数更准确
+        thread_counts.update(self.job_store.sub_threads(self.identifier))
+
+        job = self.job_store.start(
+            self.identifier,
+            result.output_dir,
+            self.options.order,
+            incremental=True,
+            since_ctime=since_ctime,
+            keep_threads=True,
+        )
+        since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(since_ctime))
+        self.log(
+            f"增量更新{self.type_name} {self.identifier}：已有 {len(rpids)} 条评论，最新根评论时间 {since}"
+        )
+        rpids.save(rpid_path(csv_path))
+        return job, rpids, thread_counts
+
+    def _crawl_pages(
+        self, sub_comment_pool: ThreadPoolExecutor, oid: str, result: CrawlResult
+    ) -> None:
+        """逐页获取主评论和子评论，写入CSV并统计地区
+
+        每写入一页后保存检查点，程序中断后再次运行会从检查点的下一页继续。
+        增量更新时按时间从新到旧获取，遇到只包含已有根评论的页面后，评论数已经对齐时停止，
+        否则继续翻阅较早的根评论，只重新获取子评论数增加的评论串（见 _iter_pages）。
+        """
+        identifier = self.identifier
+        output_dir = result.output_dir
+        csv_path = Path(output_dir) / f"{identifier}.csv"
+
+        round_num = 0
+        offset_str = ""
+
+        # 已获取完的子评论串，根评论ID -> 子评论数
+        known_threads = {}
+
+        restored = self._restore_job(result)
+        incremental = (
+            self._start_incremental(result)
+            if restored is None and self.options.incremental
+            else None
+        )
+        if restored is not None:
+            job, rpids = restored
+            round_num = job.round_num
+            offset_str = job.offset_str
+            result.downloaded = job.downloaded
+            known_threads = self.job_store.sub_threads(identifier)
+            self.log(
+                f"从第 {round_num + 1} 页继续获取{self.type_name} {identifier}，已有 {result.downloaded} 条评论"
+            )
+        elif incremental is not None:
+            job, rpids, known_threads = incremental
+            result.downloaded = len(rpids)
+        else:
+            job = self.job_store.start(identifier, output_dir, self.options.order)
+            rpids = self._load_rpids(csv_path)
+            result.downloaded = len(rpids)
+
+        job.total = result.total
+        started = time.monotonic()
+        downloaded_before = result.downloaded
+
+        # 上次检查点之后写入的评论ID和完整获取的子评论串
+        pending = {"rpids": [], "threads": [], "dirty": False}
+
+        def parse(page: Dict[str, Any]) -> Dict[str, Any]:
+            """转换为Comment对象，去重并统计地区"""
+            comments = []
+            for reply in page["reply_collection"]:
+                if not rpids.add(reply.get("rpid")):
+                    continue
+
+                comment = Comment.from_api_response(reply)
+                comment.bvid = identifier  # 使用统一的标识符
+
+                comments.append(comment)
+
+                # 统计地区信息
+                if self.options.mapping:
+                    add_comment_stat(result.stat_map, comment)
+
+            page["comments"] = comments
+            return page
+
+        def checkpoint() -> None:
+            """把CSV同步到磁盘，再记录评论ID和检查点"""
+            if not pending["dirty"]:
+                return
+            job.csv_size = sink.checkpoint()
+            # 评论ID在CSV同步之后追加，保证 .rpids 文件不会比CSV新却缺少评论
+            append_rpids(rpid_path(csv_path), pending["rpids"])
+            self.job_store.checkpoint(job, pending["threads"])
+            pending.update(rpids=[], threads=[], dirty=False)
+
+        def write(page: Dict[str, Any]) -> None:
+            """写入CSV，按刷新间隔保存检查点并报告进度"""
+            comments = page["comments"]
+
+            # 停止下载时本页的子评论可能不完整，先保存之前页面的检查点，恢复时截断本页
+            if not page["complete"]:
+                checkpoint()
+
+            # 没有用户名的评论不会写入CSV，按实际写入的条数计数
+            result.downloaded += sink.write(comments)
+
+            if page["complete"]:
+                threads = [
+                    (reply.get("rpid"), reply.get("rcount", 0))
+                    for reply in page["replies"]
+                    if reply.get("rcount", 0) > 0
+                ]
+                known_threads.update(threads)
+                pending["rpids"].extend(comment.rpid for comment in comments)
+                pending["threads"].extend(threads)
+                pending["dirty"] = True
+                job.round_num = page["round_num"]
+                job.offset_str = page["offset_str"]
+                job.downloaded = result.downloaded
+                if sink.flush_due:
+                    checkpoint()
+
+            eta = estimate_eta(
+                result.downloaded - downloaded_before,
+                result.total - downloaded_before,
+                time.monotonic() - started,
+            )
+            self.log(
+                f"{self.type_name} {identifier} 已获取 {result.downloaded}/{result.total} 条评论，预计剩余 {format_eta(eta)}"
+            )
+            self._emit(
+                "progress",
+                downloaded=result.downloaded,
+                total=result.total,
+                progress=min(100, result.downloaded / result.total * 100),
+                eta=eta,
+            )
+
+        # 获取、解析、写入三个阶段并行，下一页的网络等待与本页的解析和写盘重叠
+        pipeline = Pipeline(
+            self._iter_pages(
+                sub_comment_pool,
+                oid,
+                result,
+                job,
+                rpids,
+                known_threads,
+                round_num,
+                offset_str,
+            ),
+            [("解析", parse), ("写入", write)],
+            maxsize=PIPELINE_QUEUE_SIZE,
+        )
+        # CSV在整个爬取过程中保持打开，覆盖模式只在打开时清空一次
+        with CsvSink(
+            identifier, output_dir, result.title, self.options.overwrite
+        ) as sink:
+            try:
+                pipeline.run()
+            finally:
+                result.stage_stats = [stats.to_dict() for stats in pipeline.stats]
+                self._log_pipeline_stats(pipeline)
+                result.images = sink.images
+            checkpoint()
+
+        if job.incremental and not self.stopped:
+            self.log(
+                f"{self.type_name} {identifier} 增量更新完成，新增 {result.downloaded - downloaded_before} 条评论"
+            )
+
+        # 用户停止时保留检查点，下次运行继续
+        if not self.stopped:
+            self.job_store.finish(job)
+
+    def _iter_pages(
+        self,
+        sub_comment_pool: ThreadPoolExecutor,
+        oid: str,
+        result: CrawlResult,
+        job: CrawlJob,
+        rpids: RpidSet,
+        known_threads: Dict[int, int],
+        round_num: int,
+        offset_str: str,
+    ) -> Iterator[Dict[str, Any]]:
+        """流水线的获取阶段：逐页获取主评论及其子评论
+
+        翻页依赖上一页返回的游标，所以主评论页按顺序获取，子评论串仍由线程池并发获取。
+
+        增量更新时先获取新的根评论，直到某页的根评论都已获取过。此时如果已有评论数加上
+        本次新增的评论数达到评论总数，说明没有遗漏，直接停止；否则较早的根评论下有新回复，
+        继续向后翻页，已有的根评论由解析阶段去重，只重新获取子评论数增加的评论串。
+        """
+        identifier = self.identifier
+        consecutive_empty_limit = self.options.consecutive_empty_limit
+
+        # 用于跟踪连续获取到的空页面数量
+        state = {"empty_pages": 0}
+
+        # 增量更新：本次获取到的新评论ID，以及是否已进入检查较早评论串的阶段
+        downloaded_start = result.downloaded
+        new_rpids = set()
+        refreshing = False
+
+        while not self.stopped:
+            # 如果已下载的评论数大于等于总评论数，且连续空页面数达到限制，则停止获取
+            if (
+                result.downloaded >= result.total
+                and state["empty_pages"] >= consecutive_empty_limit
+            ):
+                self.log(
+                    f"{self.type_name} {identifier} ({result.title}) 的评论获取完成"
+                )
+                break
+
+            self.log(f"正在获取{self.type_name} {identifier} 第 {round_num + 1} 页评论")
+            round_num += 1
+
+            cmt_info = self._fetch_page(oid, round_num, offset_str, state)
+
+            # 如果用户停止了下载或达到了连续空页面的限制，则跳出主循环
+            if self.stopped or (
+                cmt_info is None and state["empty_pages"] >= consecutive_empty_limit
+            ):
+                if self.stopped:
+                    self.log(f"用户停止了{self.type_name} {identifier} 的下载")
+                else:
+                    self.log(
+                        f"连续 {state['empty_pages']} 页未获取到评论，停止获取"
+                    )
+                break
+
+            # 如果请求失败且已重试达到上限，继续下一轮循环（尝试下一页）
+            if cmt_info is None:
+                continue
+
+            data = cmt_info.get("data", {})
+            replies = data.get("replies", [])
+            offset_str = (
+                data.get("cursor", {}).get("pagination_reply", {}).get("next_offset", "")
+            )
+
+            # 增量更新：本页的根评论都已获取过（或早于上次的最新评论）时，新的根评论已获取完
+            reached_known = (
+                job.incremental
+                and not refreshing
+                and all(
+                    reply.get("rpid") in rpids
+                    or reply.get("ctime", 0) <= job.since_ctime
+                    for reply in replies
+                )
+            )
+
+            reply_collection = list(replies)
+
+            # 获取子评论，需要额外请求的评论串交给线程池并发获取
+            reply_collection.extend(
+                self._fetch_sub_comment_threads(
+                    sub_comment_pool, oid, replies, known_threads
+                )
+            )
+
+            # 处理置顶评论
+            top_replies = data.get("top_replies") or []
+            for reply in top_replies:
+                reply_collection.append(reply)
+                reply_replies = reply.get("replies", [])
+                if reply_replies:
+                    reply_collection.extend(reply_replies)
+
+            # 统计本次新增的评论，解析阶段只会加入这些评论
+            if job.incremental and not refreshing:
+                for reply in reply_collection:
+                    rpid = reply.get("rpid")
+                    if rpid not in new_rpids and rpid not in rpids:
+                        new_rpids.add(rpid)
+
+            yield {
+                "round_num": round_num,
+                "offset_str": offset_str,
+                "replies": replies,
+                "reply_collection": reply_collection,
+                # 停止下载时子评论可能没有获取完
+                "complete": not self.stopped,
+            }
+
+            if reached_known:
+                if downloaded_start + len(new_rpids) >= result.total:
+                    break
+                refreshing = True
+                new_rpids.clear()
+                self.log(
+                    f"{self.type_name} {identifier} 的新根评论已获取完，"
+                    f"继续检查较早根评论的子评论是否有新回复"
+                )
+
+    def _log_pipeline_stats(self, pipeline: Pipeline) -> None:
+        """输出各阶段的吞吐统计，指出瓶颈阶段"""
+        bottleneck = pipeline.bottleneck
+        if bottleneck is None:
+            return
+        for stats in pipeline.stats:
+            self.log(f"  {stats.describe()}")
+        self.log(f"流水线瓶颈阶段: {bottleneck.name}")
+
+    def _fetch_sub_comment_threads(
+        self,
+        pool: ThreadPoolExecutor,
+        oid: str,
+        replies: List[Dict[str, Any]],
+        known_threads: Optional[Dict[int, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """获取一页根评论下的全部子评论
+
+        内联子评论已完整的直接使用，其余评论串提交到线程池并发分页获取，
+        结果按根评论原有顺序合并。known_threads 中子评论数未变化的评论串已写入CSV，直接跳过。
+        """
+        known_threads = known_threads or {}
+        threads = []
+        for reply in replies:
+            rcount = reply.get("rcount", 0)
+            if rcount == 0 or known_threads.get(reply.get("rpid")) == rcount:
+                continue
+
+            reply_replies = reply.get("replies", [])
+            if reply_replies and len(reply_replies) == rcount:
+                threads.append(reply_replies)
+            else:
+                # 需要额外获取子评论
+                threads.append(
+                    pool.submit(self._fetch_sub_comments, oid, reply.get("rpid"))
+                )
+
+        sub_replies = []
+        for thread in threads:
+            if isinstance(thread, Future):
+                thread = thread.result()
+            sub_replies.extend(thread)
+        return sub_replies
+
+    def _fetch_sub_comments(self, oid: str, rpid: int) -> List[Dict[str, Any]]:
+        """获取一条根评论下的子评论"""
+        all_replies = []
+        if self.stopped:
+            return all_replies
+
+        page_path = "video" if self.content_type == "video" else "bangumi/play"
+        referer = f"https://www.bilibili.com/{page_path}/{self.identifier}"
+
+        stats = {}
+        try:
+            pages = self.api.iter_sub_comments(oid, rpid, referer, stats=stats)
+            for page, page_replies in enumerate(pages, start=1):
+                self.log(f"获取评论 {rpid} 的子评论，第 {page} 页")
+                all_replies.extend(page_replies)
+
+                # 停止下载时不再请求后续页
+                if self.stopped:
+                    break
+
+            self.log(
+                f"评论 {rpid} 的子评论获取完成: {len(all_replies)} 条，{stats['pages']} 页，请求 {stats['requests']} 次"
+            )
+
+        except Exception as e:
+            self.log(f"子评论处理过程中出错: {e}", "error")
+
+        return all_replies
+
+    def _write_map(self, result: CrawlResult) -> None:
+        """根据地区统计生成地图"""
+        self.log(f"统计到 {len(result.stat_map)} 个地区的数据")
+        for location, stat in result.stat_map.items():
+            self.log(f"  {location}: {stat.location} 条评论")
+
+        self.log(f"正在生成{self.type_name} {self.identifier} 的评论地区分布地图...")
+        result.unmatched_regions = write_geojson(
+            result.stat_map, self.identifier, result.output_dir, result.title
+        )
+        self.log("地图生成完成")
+
+        # 显示未匹配地区
+        if result.unmatched_regions:
+            unmatched_names = ", ".join(result.unmatched_regions.keys())
+            self.log(
+                f"有 {len(result.unmatched_regions)} 个地区未能匹配到地图: {unmatched_names}"
+            )
+
+            # 单独打印每个未匹配地区的信息
+            for region, info in result.unmatched_regions.items():
+                self.log(
+                    f"  未匹配地区: {region} - {info['comments']}条评论, {info['users']}位用户"
+                )
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class CrawlResult:
+    """一次评论爬取的结果"""
+
+    identifier: str  # 内容标识符
+    title: str = ""  # 内容标题
+    output_dir: str = ""  # 输出目录
+    total: int = 0  # 接口返回的评论总数
+    downloaded: int = 0  # 实际获取的评论数
+    images: int = 0  # 加入后台下载队列的图片数
+    stat_map: Dict[str, Any] = field(default_factory=dict)  # 地区统计
+    unmatched_regions: Dict[str, Any] = field(default_factory=dict)  # 未匹配地图的地区
+    stopped: bool = False  # 是否被用户停止
+    success: bool = False  # 是否正常完成（被停止也算完成）
+    stage_stats: List[Dict[str, Any]] = field(default_factory=list)  # 流水线各阶段的吞吐统计
+
+
+@dataclass
+class CrawlEvent:
+    """爬取过程中发出的事件
+
+    kind 取值：
+        - "log": 日志消息，见 message 和 level
+        - "progress": 进度更新，见 downloaded、total、progress 和 eta
+        - "done": 爬取结束，见 result
+        - "overall": 多视频调度的总进度，见 downloaded、total、progress、eta、
+          videos_done 和 videos_total
+    """
+
+    kind: str
+    identifier: str = ""
+    message: str = ""
+    level: str = "info"  # 日志级别：info, success, warning, error, header
+    downloaded: int = 0
+    total: int = 0
+    progress: float = 0.0  # 百分比，0-100
+    eta: Optional[float] = None  # 预计剩余时间（秒），无法估计时为None
+    videos_done: int = 0  # 已完成的视频数
+    videos_total: int = 0  # 视频总数
+    result: Optional[CrawlResult] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        data = {"kind": self.kind, "identifier": self.identifier}
+        if self.kind == "log":
+            data.update(message=self.message, level=self.level)
+        elif self.kind in ("progress", "overall"):
+            data.update(
+                downloaded=self.downloaded,
+                total=self.total,
+                progress=round(self.progress, 2),
+                eta=round(self.eta) if self.eta is not None else None,
+            )
+            if self.kind == "overall":
+                data.update(
+                    videos_done=self.videos_done, videos_total=self.videos_total
+                )
+        elif self.kind == "done" and self.result is not None:
+            data.update(
+                title=self.result.title,
+                output_dir=self.result.output_dir,
+                total=self.result.total,
+                downloaded=self.result.downloaded,
+                images=self.result.images,
+                stopped=self.result.stopped,
+                success=self.result.success,
+                stages=self.result.stage_stats,
+            )
+        return data
+
+
+def estimate_eta(done: int, total: int, elapsed: float) -> Optional[float]:
+    """按已完成数量的平均速度估计剩余时间（秒）"""
+    if total <= done:
+        return 0.0
+    if done <= 0 or elapsed <= 0:
+        return None
+    return elapsed / done * (total - done)
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """把剩余秒数格式化为便于阅读的文本"""
+    if seconds is None:
+        return "未知"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
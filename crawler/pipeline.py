@@ -0,0 +1,228 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_END = object()
+
+# 阻塞等待时检查是否出错的间隔（秒）
+_POLL_INTERVAL = 0.2
+
+
+@dataclass
+class StageStats:
+    """流水线中一个阶段的吞吐统计"""
+
+    name: str
+    items: int = 0  # 处理的数量
+    busy: float = 0.0  # 处理所用的时间（秒）
+    wait_input: float = 0.0  # 等待上游的时间（秒）
+    wait_output: float = 0.0  # 下游队列已满而等待的时间（秒）
+    elapsed: float = 0.0  # 阶段运行的总时间（秒）
+
+    @property
+    def throughput(self) -> float:
+        """实际吞吐量（个/秒）"""
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def capacity(self) -> float:
+        """不等待时的处理能力（个/秒）"""
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """忙碌时间占比，最高的阶段就是瓶颈"""
+        return self.busy / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "name": self.name,
+            "items": self.items,
+            "busy": round(self.busy, 3),
+            "wait_input": round(self.wait_input, 3),
+            "wait_output": round(self.wait_output, 3),
+            "throughput": round(self.throughput, 3),
+            "capacity": round(self.capacity, 3),
+            "utilization": round(self.utilization, 3),
+        }
+
+    def describe(self) -> str:
+        """便于阅读的统计文本"""
+        return (
+            f"{self.name}: {self.items} 个，{self.throughput:.2f} 个/秒，"
+            f"忙碌 {self.utilization * 100:.0f}%，等待上游 {self.wait_input:.1f} 秒，"
+            f"等待下游 {self.wait_output:.1f} 秒"
+        )
+
+
+class Pipeline:
+    """多阶段流水线
+
+    数据源和每个处理阶段各占一个线程，阶段之间用有界队列连接：下游处理不过来时上游在
+    put 时阻塞（背压），内存中最多积压 maxsize 个数据。每个阶段的函数接收上一阶段的输出，
+    返回 None 时丢弃该数据。任一阶段出错时整个流水线停止，run() 重新抛出该异常。
+
+    用法：
+        pipeline = Pipeline(pages(), [("解析", parse), ("写入", write)], maxsize=4)
+        pipeline.run()
+        for stats in pipeline.stats:
+            print(stats.describe())
+    """
+
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: Sequence[Tuple[str, Callable[[Any], Any]]],
+        maxsize: int = 4,
+        source_name: str = "获取",
+    ):
+        """初始化流水线
+
+        Args:
+            source: 数据源，在单独的线程中迭代
+            stages: (阶段名称, 处理函数) 列表，按顺序执行
+            maxsize: 阶段之间队列的最大长度
+            source_name: 数据源阶段的名称
+        """
+        self.source = source
+        self.stages = list(stages)
+        self.stats: List[StageStats] = [StageStats(source_name)] + [
+            StageStats(name) for name, _ in self.stages
+        ]
+        self._queues = [queue.Queue(maxsize=max(1, maxsize)) for _ in self.stages]
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def bottleneck(self) -> Optional[StageStats]:
+        """忙碌时间占比最高的阶段"""
+        if not any(stats.items for stats in self.stats):
+            return None
+        return max(self.stats, key=lambda stats: stats.utilization)
+
+    def run(self) -> None:
+        """运行流水线，阻塞直到所有数据处理完毕"""
+        threads = [
+            threading.Thread(
+                target=self._run_source, name="pipeline-source", daemon=True
+            )
+        ]
+        for index, (name, _) in enumerate(self.stages):
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(index,),
+                    name=f"pipeline-{index + 1}",
+                    daemon=True,
+                )
+            )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _fail(self, error: BaseException) -> None:
+        """记录第一个异常并通知其它阶段停止"""
+        if self._error is None:
+            self._error = error
+        self._failed.set()
+
+    def _put(self, index: int, item: Any, stats: StageStats) -> bool:
+        """把数据放入第 index 个队列，流水线出错时返回False"""
+        target = self._queues[index]
+        start = time.monotonic()
+        try:
+            while not self._failed.is_set():
+                try:
+                    target.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.wait_output += time.monotonic() - start
+
+    def _get(self, index: int, stats: StageStats) -> Any:
+        """从第 index 个队列取数据，流水线出错时返回结束标记"""
+        source = self._queues[index]
+        start = time.monotonic()
+        try:
+            while not self._failed.is_set():
+                try:
+                    return source.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            return _END
+        finally:
+            stats.wait_input += time.monotonic() - start
+
+    def _run_source(self) -> None:
+        """迭代数据源，送入第一个阶段"""
+        stats = self.stats[0]
+        started = time.monotonic()
+        iterator = iter(self.source)
+        try:
+            while not self._failed.is_set():
+                start = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy += time.monotonic() - start
+
+                stats.items += 1
+                if not self.stages:
+                    continue
+                if not self._put(0, item, stats):
+                    break
+        except BaseException as e:
+            logger.error(f"流水线阶段 {stats.name} 出错: {e}")
+            self._fail(e)
+        finally:
+            # 提前结束时关闭生成器，让数据源执行清理
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            stats.elapsed = time.monotonic() - started
+            if self.stages:
+                self._put(0, _END, stats)
+
+    def _run_stage(self, index: int) -> None:
+        """处理第 index 个阶段"""
+        _, func = self.stages[index]
+        stats = self.stats[index + 1]
+        has_next = index + 1 < len(self.stages)
+        started = time.monotonic()
+        try:
+            while True:
+                item = self._get(index, stats)
+                if item is _END:
+                    break
+
+                start = time.monotonic()
+                output = func(item)
+                stats.busy += time.monotonic() - start
+                stats.items += 1
+
+                if output is not None and has_next:
+                    if not self._put(index + 1, output, stats):
+                        break
+        except BaseException as e:
+            logger.error(f"流水线阶段 {stats.name} 出错: {e}")
+            self._fail(e)
+        finally:
+            stats.elapsed = time.monotonic() - started
+            if has_next:
+                self._put(index + 1, _END, stats)
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from config import Config
+from api.bilibili_api import BilibiliAPI
+from models.video import Video
+from .comment_crawler import CommentCrawler, CrawlOptions
+from .events import CrawlEvent, CrawlResult, estimate_eta, format_eta
+
+logger = logging.getLogger(__name__)
+
+# 视频优先顺序：按评论数从多到少、按发布时间从新到旧、保持列表顺序
+PRIORITIES = {"comments": "按评论数", "recency": "按发布时间", "order": "按列表顺序"}
+
+CrawlTarget = Union[Video, str]
+
+
+def sort_targets(targets: Sequence[CrawlTarget], priority: str) -> List[CrawlTarget]:
+    """按优先顺序排列待爬取的视频，只有标识符的目标排在已知信息的视频之后"""
+    if priority == "comments":
+        key = lambda target: getattr(target, "comment", 0) or 0
+    elif priority == "recency":
+        key = lambda target: getattr(target, "created", 0) or 0
+    else:
+        return list(targets)
+    # sorted 是稳定排序，同优先级保持原有顺序
+    return sorted(targets, key=key, reverse=True)
+
+
+class CrawlScheduler:
+    """多视频并发爬取调度器
+
+    同时运行 concurrency 个 CommentCrawler，所有爬取共用同一个API实例和进程内共享的限速器，
+    因此并发视频数只影响等待的重叠程度，不会提高整体请求速率。
+    各视频的事件原样转发给订阅者，另外发送 "overall" 事件报告总进度和预计剩余时间：
+    未开始的视频按视频列表中的评论数估计，开始后以接口返回的评论总数为准。
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[CrawlTarget],
+        options: Optional[CrawlOptions] = None,
+        api: Optional[BilibiliAPI] = None,
+        concurrency: Optional[int] = None,
+        priority: Optional[str] = None,
+    ):
+        """初始化调度器
+
+        Args:
+            targets: 待爬取的视频（Video 对象或内容标识符）
+            options: 每个视频的爬取选项
+            api: B站API实例，默认按配置中的Cookie创建
+            concurrency: 同时爬取的视频数，默认使用配置中的 video_concurrency
+            priority: 优先顺序，见 PRIORITIES，默认使用配置中的 video_priority
+        """
+        config = Config()
+
+        if concurrency is None:
+            concurrency = config.get("video_concurrency", 2)
+        if priority is None:
+            priority = config.get("video_priority", "comments")
+
+        self.options = options or CrawlOptions()
+        self.api = api or BilibiliAPI(config.get("cookie", ""))
+        self.concurrency = max(1, concurrency)
+        self.priority = priority if priority in PRIORITIES else "order"
+        self.targets = sort_targets(targets, self.priority)
+
+        self._subscribers: List[Callable[[CrawlEvent], Any]] = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._active: Dict[str, CommentCrawler] = {}
+        self._progress: Dict[str, List[int]] = {
+            self._identifier(target): [0, getattr(target, "comment", 0) or 0]
+            for target in self.targets
+        }
+        self._videos_done = 0
+        self._started = 0.0
+
+    @staticmethod
+    def _identifier(target: CrawlTarget) -> str:
+        """目标的内容标识符"""
+        return target.bvid if isinstance(target, Video) else target
+
+    @property
+    def stopped(self) -> bool:
+        """是否已请求停止"""
+        return self._stop_event.is_set()
+
+    def subscribe(self, callback: Callable[[CrawlEvent], Any]) -> None:
+        """订阅爬取事件，回调可能在多个爬取线程中同时调用"""
+        self._subscribers.append(callback)
+
+    def stop(self) -> None:
+        """停止所有正在进行的爬取，尚未开始的视频不再爬取"""
+        self._stop_event.set()
+        with self._lock:
+            active = list(self._active.values())
+        for crawler in active:
+            crawler.stop()
+
+    def _dispatch(self, event: CrawlEvent) -> None:
+        """向所有订阅者发送事件"""
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"处理爬取事件出错: {e}")
+
+    def log(self, message: str, level: str = "info") -> None:
+        """发送日志事件"""
+        self._dispatch(CrawlEvent(kind="log", message=message, level=level))
+
+    def run(self) -> List[CrawlResult]:
+        """爬取所有视频，阻塞直到完成或被停止
+
+        Returns:
+            按优先顺序排列的爬取结果
+        """
+        total_videos = len(self.targets)
+        self.log(
+            f"共 {total_videos} 个视频，同时爬取 {self.concurrency} 个，{PRIORITIES[self.priority]}优先",
+            "header",
+        )
+        self._started = time.monotonic()
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="video-crawl"
+        ) as pool:
+            futures = [pool.submit(self._crawl_one, target) for target in self.targets]
+            results = [future.result() for future in futures]
+
+        return results
+
+    def _crawl_one(self, target: CrawlTarget) -> CrawlResult:
+        """爬取单个视频"""
+        identifier = self._identifier(target)
+        if self.stopped:
+            return CrawlResult(identifier=identifier, stopped=True)
+
+        video = target if isinstance(target, Video) else None
+        crawler = CommentCrawler(identifier, self.options, api=self.api, video=video)
+        crawler.subscribe(self._on_event)
+
+        with self._lock:
+            self._active[identifier] = crawler
+
+        if video is not None:
+            self.log(f"开始获取视频 {identifier}: {video.title}", "header")
+
+        try:
+            return crawler.run()
+        finally:
+            with self._lock:
+                self._active.pop(identifier, None)
+
+    def _on_event(self, event: CrawlEvent) -> None:
+        """转发单个视频的事件，并更新总进度"""
+        with self._lock:
+            progress = self._progress.setdefault(event.identifier, [0, 0])
+            if event.kind == "progress":
+                progress[0], progress[1] = event.downloaded, event.total
+            elif event.kind == "done":
+                # 已完成的视频不再计入剩余量
+                downloaded = event.result.downloaded if event.result else progress[0]
+                progress[0] = progress[1] = downloaded
+                self._videos_done += 1
+            overall = self._overall_event()
+
+        self._dispatch(event)
+
+        if event.kind in ("progress", "done"):
+            self._dispatch(overall)
+        if event.kind == "done":
+            self.log(
+                f"已完成 {overall.videos_done}/{overall.videos_total} 个视频，总进度 {overall.progress:.1f}%，预计剩余 {format_eta(overall.eta)}"
+            )
+
+    def _overall_event(self) -> CrawlEvent:
+        """计算总进度（调用方需持有锁）"""
+        downloaded = sum(done for done, _ in self._progress.values())
+        total = sum(max(done, expected) for done, expected in self._progress.values())
+        videos_total = len(self.targets)
+
+        if total > 0:
+            progress = downloaded / total * 100
+        else:
+            progress = self._videos_done / max(videos_total, 1) * 100
+
+        return CrawlEvent(
+            kind="overall",
+            downloaded=downloaded,
+            total=total,
+            progress=min(100, progress),
+            eta=estimate_eta(downloaded, total, time.monotonic() - self._started),
+            videos_done=self._videos_done,
+            videos_total=videos_total,
+        )
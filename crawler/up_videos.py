@@ -0,0 +1,113 @@
+import logging
+import time
+from typing import Callable, List, Optional
+
+from api.bilibili_api import BilibiliAPI
+from api.rate_limiter import is_throttle_code
+from models.video import Video
+
+logger = logging.getLogger(__name__)
+
+
+def collect_up_videos(
+    api: BilibiliAPI,
+    mid: int,
+    start_page: int,
+    end_page: int,
+    order: str = "pubdate",
+    max_retries: int = 3,
+    log: Optional[Callable[[str, str], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> List[Video]:
+    """获取UP主指定页范围内的视频列表
+
+    Args:
+        api: B站API实例
+        mid: UP主ID
+        start_page: 起始页（从1开始）
+        end_page: 结束页（包含）
+        order: 视频排序方式，pubdate/click/stow
+        max_retries: 每页的最大重试次数
+        log: 日志回调，参数为 (消息, 级别)
+        should_stop: 返回True时停止获取
+
+    Returns:
+        视频列表，获取失败的页会被跳过
+    """
+    if log is None:
+        log = lambda message, level="info": logger.info(message)
+    if should_stop is None:
+        should_stop = lambda: False
+
+    video_collection = []
+    current_page = start_page - 1
+
+    while current_page < end_page and not should_stop():
+        current_page += 1
+        log(f"正在获取第 {current_page} 页视频列表", "info")
+
+        retry_current = 0
+        success = False
+
+        while retry_current < max_retries and not success:
+            try:
+                video_info = api.fetch_video_list(mid, current_page, order)
+
+                if video_info.get("code") != 0:
+                    error_msg = video_info.get("message", "未知错误")
+                    log(f"获取视频列表失败: {error_msg}", "error")
+
+                    # 如果接口提示稍后重试或触发风控，则等待并重试
+                    if "请稍后再试" in error_msg or is_throttle_code(
+                        video_info.get("code")
+                    ):
+                        retry_current += 1
+                        if retry_current < max_retries:
+                            retry_wait = api.get_retry_delay()
+                            log(
+                                f"将在 {retry_wait} 秒后重试 ({retry_current}/{max_retries})...",
+                                "warning",
+                            )
+                            time.sleep(retry_wait)
+                            continue
+                    break
+
+                vlist = video_info.get("data", {}).get("list", {}).get("vlist", [])
+
+                if not vlist:
+                    log(
+                        f"第 {current_page} 页未获取到视频，可能已到达最后一页",
+                        "warning",
+                    )
+                    break
+
+                # 添加到视频集合
+                for video_item in vlist:
+                    video_collection.append(Video.from_api_response(video_item))
+
+                log(f"第 {current_page} 页获取到 {len(vlist)} 个视频", "success")
+                success = True
+
+            except Exception as e:
+                retry_current += 1
+                if retry_current < max_retries:
+                    retry_wait = api.get_retry_delay()
+                    log(f"获取视频列表出错: {e}", "error")
+                    log(
+                        f"将在 {retry_wait} 秒后重试 ({retry_current}/{max_retries})...",
+                        "warning",
+                    )
+                    time.sleep(retry_wait)
+                else:
+                    log(f"获取视频列表失败，已达最大重试次数: {e}", "error")
+                    break
+
+        if should_stop():
+            log("用户停止了下载", "info")
+            break
+
+        # 该页获取失败时跳过此页继续后续页面
+        if not success and current_page < end_page:
+            log(f"第 {current_page} 页获取失败，跳过此页继续后续页面", "warning")
+
+    return video_collection
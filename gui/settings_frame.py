@@ -3,6 +3,7 @@ from tkinter import ttk, scrolledtext, filedialog, messagebox
 import logging
 
 from config import Config, DEFAULT_CONFIG
+from api.rate_limiter import get_rate_limiter
 from gui.tooltip import create_tooltip
 from gui.qrcode_login import QRCodeLoginDialog
 
@@ -127,6 +128,83 @@ class SettingsFrame(ttk.Frame):
             "图片链接始终会保存在CSV文件中"
         )
 
+        # 后台图片下载的并发数和带宽
+        image_frame = ttk.Frame(settings_frame)
+        image_frame.grid(row=9, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(image_frame, text="图片下载线程数:").pack(side=tk.LEFT)
+        self.image_workers_var = tk.IntVar(value=self.config.get("image_workers", 3))
+        ttk.Spinbox(
+            image_frame,
+            from_=1,
+            to=16,
+            increment=1,
+            textvariable=self.image_workers_var,
+            width=6,
+        ).pack(side=tk.LEFT, padx=(5, 20))
+
+        ttk.Label(image_frame, text="图片带宽上限(KB/s):").pack(side=tk.LEFT)
+        self.image_bandwidth_var = tk.IntVar(
+            value=self.config.get("image_bandwidth", 0)
+        )
+        image_bandwidth_spinbox = ttk.Spinbox(
+            image_frame,
+            from_=0,
+            to=100000,
+            increment=100,
+            textvariable=self.image_bandwidth_var,
+            width=8,
+        )
+        image_bandwidth_spinbox.pack(side=tk.LEFT, padx=5)
+        create_tooltip(
+            image_bandwidth_spinbox,
+            "图片在后台下载，不影响评论获取速度\n"
+            "0 表示不限制带宽，修改后重启程序生效",
+        )
+
+        self.image_cache_var = tk.BooleanVar(value=self.config.get("image_cache", True))
+        image_cache_checkbox = ttk.Checkbutton(
+            image_frame, text="图片去重缓存", variable=self.image_cache_var
+        )
+        image_cache_checkbox.pack(side=tk.LEFT, padx=(20, 5))
+        create_tooltip(
+            image_cache_checkbox,
+            "同一张图片（如表情包）只下载、保存一次\n"
+            "各视频的 images 目录中为指向缓存的硬链接，不额外占用磁盘\n"
+            "修改后重启程序生效",
+        )
+
+        # 图片下载格式
+        profile_frame = ttk.Frame(settings_frame)
+        profile_frame.grid(row=10, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(profile_frame, text="图片下载格式:").pack(side=tk.LEFT)
+        self.image_profile_var = tk.StringVar(
+            value=self.config.get("image_profile", "original")
+        )
+        for text, value in (("原图", "original"), ("WebP", "webp"), ("AVIF", "avif")):
+            ttk.Radiobutton(
+                profile_frame, text=text, variable=self.image_profile_var, value=value
+            ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(profile_frame, text="宽度:").pack(side=tk.LEFT, padx=(15, 0))
+        self.image_width_var = tk.IntVar(value=self.config.get("image_width", 0))
+        image_width_spinbox = ttk.Spinbox(
+            profile_frame,
+            from_=0,
+            to=4096,
+            increment=100,
+            textvariable=self.image_width_var,
+            width=6,
+        )
+        image_width_spinbox.pack(side=tk.LEFT, padx=5)
+        create_tooltip(
+            image_width_spinbox,
+            "WebP/AVIF 由B站图片服务器转码后下载，体积通常只有原图的几分之一\n"
+            "宽度为 0 时保持原宽度，如 300 表示缩放到 300 像素宽\n"
+            "CSV中始终保存原图链接",
+        )
+
         # 添加请求延迟设置区域
         delay_frame = ttk.LabelFrame(self, text="请求延迟和重试设置")
         delay_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -207,6 +285,26 @@ class SettingsFrame(ttk.Frame):
             width=8,
         ).grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
 
+        ttk.Label(delay_frame, text="突发请求数:").grid(
+            row=2, column=2, padx=(20, 5), pady=5, sticky=tk.W
+        )
+        self.request_burst_var = tk.IntVar(value=self.config.get("request_burst", 2))
+        request_burst_spinbox = ttk.Spinbox(
+            delay_frame,
+            from_=1,
+            to=10,
+            increment=1,
+            textvariable=self.request_burst_var,
+            width=8,
+        )
+        request_burst_spinbox.grid(row=2, column=3, padx=5, pady=5, sticky=tk.W)
+        create_tooltip(
+            request_burst_spinbox,
+            "持续请求速率由最小/最大请求延迟的平均值决定\n"
+            "请求本身的网络耗时会计入间隔，不再额外叠加等待\n"
+            "突发请求数为空闲后允许连续发出的请求数量",
+        )
+
         # 说明文字
         ttk.Label(
             delay_frame, text="说明: 请求延迟越大对账号风险越低，但会下载更慢，批量下载谨慎使用"
@@ -302,6 +400,11 @@ class SettingsFrame(ttk.Frame):
         self.config.set("vorder", self.vorder_var.get())
         self.config.set("mapping", self.mapping_var.get())
         self.config.set("download_images", self.download_images_var.get())
+        self.config.set("image_workers", self.image_workers_var.get())
+        self.config.set("image_bandwidth", self.image_bandwidth_var.get())
+        self.config.set("image_cache", self.image_cache_var.get())
+        self.config.set("image_profile", self.image_profile_var.get())
+        self.config.set("image_width", self.image_width_var.get())
 
         # 保存请求延迟设置
         self.config.set("request_delay_min", min_delay)
@@ -311,6 +414,10 @@ class SettingsFrame(ttk.Frame):
         self.config.set(
             "consecutive_empty_limit", self.consecutive_empty_limit_var.get()
         )
+        self.config.set("request_burst", self.request_burst_var.get())
+
+        # 让共享限速器立即使用新的速率
+        get_rate_limiter().load_config()
 
         messagebox.showinfo("成功", "设置已保存")
         logger.info("配置已保存")
@@ -331,6 +438,11 @@ class SettingsFrame(ttk.Frame):
             self.vorder_var.set(DEFAULT_CONFIG["vorder"])
             self.mapping_var.set(DEFAULT_CONFIG["mapping"])
             self.download_images_var.set(DEFAULT_CONFIG["download_images"]) 
+            self.image_workers_var.set(DEFAULT_CONFIG["image_workers"])
+            self.image_bandwidth_var.set(DEFAULT_CONFIG["image_bandwidth"])
+            self.image_cache_var.set(DEFAULT_CONFIG["image_cache"])
+            self.image_profile_var.set(DEFAULT_CONFIG["image_profile"])
+            self.image_width_var.set(DEFAULT_CONFIG["image_width"])
             self.min_delay_var.set(DEFAULT_CONFIG["request_delay_min"])
             self.max_delay_var.set(DEFAULT_CONFIG["request_delay_max"])
             self.retry_delay_var.set(DEFAULT_CONFIG["request_retry_delay"])
@@ -338,6 +450,9 @@ class SettingsFrame(ttk.Frame):
             self.consecutive_empty_limit_var.set(
                 DEFAULT_CONFIG["consecutive_empty_limit"]
             )
+            self.request_burst_var.set(DEFAULT_CONFIG["request_burst"])
+
+            get_rate_limiter().load_config()
 
             messagebox.showinfo("成功", "设置已恢复默认")
             logger.info("配置已恢复默认")
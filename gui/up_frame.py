@@ -1,22 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
+import queue
 import threading
 import logging
-import time
-from pathlib import Path
-import json
 
 from config import Config
-from api.bilibili_api import BilibiliAPI, extract_title_from_dirname, get_dir_name
-from models.comment import Comment, Stat
-from store.csv_analyzer import normalize_location
-from models.video import Video
-from store.csv_exporter import save_to_csv
-from store.geo_exporter import write_geojson
+from api.bilibili_api import BilibiliAPI
+from crawler import (
+    CrawlEvent,
+    CrawlOptions,
+    CrawlScheduler,
+    PRIORITIES,
+    collect_up_videos,
+)
 from gui.tooltip import create_tooltip
 
 logger = logging.getLogger(__name__)
 
+# 主线程处理界面更新队列的间隔（毫秒）和每次最多处理的条数
+UI_POLL_INTERVAL = 100
+UI_POLL_BATCH = 200
+
 
 class UpFrame(ttk.Frame):
     """UP主视频批量下载界面"""
@@ -26,7 +30,10 @@ class UpFrame(ttk.Frame):
         super().__init__(parent)
         self.config = Config()
         self.api = BilibiliAPI(self.config.get("cookie", ""))
+        # 后台线程的日志和进度更新先放入队列，由主线程定时取出更新界面（Tkinter 不是线程安全的）
+        self.ui_queue = queue.Queue()
         self.init_ui()
+        self.after(UI_POLL_INTERVAL, self.process_ui_queue)
 
     def init_ui(self):
         """初始化UI"""
@@ -126,6 +133,40 @@ class UpFrame(ttk.Frame):
             input_frame, text="生成评论地区分布地图", variable=self.mapping_var
         ).grid(row=5, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
 
+        # 并发视频数和优先顺序
+        ttk.Label(input_frame, text="并发视频数:").grid(
+            row=6, column=0, padx=5, pady=5, sticky=tk.W
+        )
+        schedule_frame = ttk.Frame(input_frame)
+        schedule_frame.grid(row=6, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        self.video_concurrency_var = tk.IntVar(
+            value=self.config.get("video_concurrency", 2)
+        )
+        concurrency_spinbox = ttk.Spinbox(
+            schedule_frame,
+            from_=1,
+            to=8,
+            textvariable=self.video_concurrency_var,
+            width=3,
+        )
+        concurrency_spinbox.pack(side=tk.LEFT, padx=2)
+        create_tooltip(
+            concurrency_spinbox,
+            "同时获取评论的视频数\n"
+            "所有视频共用同一个请求速率限制，并发不会提高请求频率\n"
+            "只是减少等待时间，视频越多越能体现效果",
+        )
+
+        ttk.Label(schedule_frame, text="优先:").pack(side=tk.LEFT, padx=(15, 2))
+        self.video_priority_var = tk.StringVar(
+            value=self.config.get("video_priority", "comments")
+        )
+        for value, text in PRIORITIES.items():
+            ttk.Radiobutton(
+                schedule_frame, text=text, variable=self.video_priority_var, value=value
+            ).pack(side=tk.LEFT, padx=5)
+
         # 操作按钮
         button_frame = ttk.Frame(self)
         button_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -180,6 +221,7 @@ class UpFrame(ttk.Frame):
         # 状态变量
         self.stop_flag = False
         self.download_thread = None
+        self.scheduler = None
 
     def validate_input(self):
         """验证输入"""
@@ -232,6 +274,8 @@ class UpFrame(ttk.Frame):
         self.config.set("corder", self.corder_var.get())
         self.config.set("vorder", self.vorder_var.get())
         self.config.set("mapping", self.mapping_var.get())
+        self.config.set("video_concurrency", self.video_concurrency_var.get())
+        self.config.set("video_priority", self.video_priority_var.get())
 
         # 更新API的cookie
         self.api = BilibiliAPI(self.config.get("cookie", ""))
@@ -245,6 +289,8 @@ class UpFrame(ttk.Frame):
         """停止下载"""
         if self.download_thread and self.download_thread.is_alive():
             self.stop_flag = True
+            if self.scheduler:
+                self.scheduler.stop()
             self.log("正在停止下载...")
         else:
             messagebox.showinfo("提示", "没有正在进行的下载任务")
@@ -253,7 +299,32 @@ class UpFrame(ttk.Frame):
         """清空日志"""
         self.log_text.delete(1.0, tk.END)
 
+    def process_ui_queue(self):
+        """在主线程中执行后台线程放入队列的界面更新"""
+        try:
+            for _ in range(UI_POLL_BATCH):
+                update, args = self.ui_queue.get_nowait()
+                update(*args)
+        except queue.Empty:
+            pass
+        self.after(UI_POLL_INTERVAL, self.process_ui_queue)
+
+    def run_in_ui(self, update, *args):
+        """在主线程中更新界面，其他线程调用时放入队列由主线程执行"""
+        if threading.current_thread() is threading.main_thread():
+            update(*args)
+        else:
+            self.ui_queue.put((update, args))
+
+    def set_progress(self, value):
+        """更新进度条，可以在任意线程调用"""
+        self.run_in_ui(self.progress_var.set, value)
+
     def log(self, message, level="info"):
+        """添加日志，可以在任意线程调用，日志框由主线程更新"""
+        self.run_in_ui(self._write_log, message, level)
+
+    def _write_log(self, message, level="info"):
         """添加日志，改进显示格式
 
         Args:
@@ -315,92 +386,15 @@ class UpFrame(ttk.Frame):
             self.log(f"开始获取UP主 {mid} 的视频列表")
             self.log(f"将下载第 {start_page} 页到第 {end_page} 页的视频")
 
-            video_collection = []
-            current_page = start_page - 1  # 调整起始值以匹配原来的逻辑
-            retry_count = 0
-            max_retries = 3
-
-            # 获取视频列表
-            while current_page < end_page and not self.stop_flag:
-                current_page += 1
-                self.log(f"正在获取第 {current_page} 页视频列表")
-
-                # 添加重试逻辑
-                retry_current = 0
-                success = False
-
-                while retry_current < max_retries and not success:
-                    try:
-                        # 获取视频列表
-                        video_info = self.api.fetch_video_list(
-                            mid, current_page, vorder
-                        )
-
-                        if video_info.get("code") != 0:
-                            error_msg = video_info.get("message", "未知错误")
-                            self.log(f"获取视频列表失败: {error_msg}", "error")
-
-                            # 如果接口提示稍后重试，则等待并重试
-                            if "请稍后再试" in error_msg:
-                                retry_current += 1
-                                if retry_current < max_retries:
-                                    retry_wait = 5 * retry_current
-                                    self.log(
-                                        f"将在 {retry_wait} 秒后重试 ({retry_current}/{max_retries})...",
-                                        "warning",
-                                    )
-                                    time.sleep(retry_wait)
-                                    continue
-                            break
-
-                        vlist = (
-                            video_info.get("data", {}).get("list", {}).get("vlist", [])
-                        )
-
-                        if not vlist:
-                            self.log(
-                                f"第 {current_page} 页未获取到视频，可能已到达最后一页",
-                                "warning",
-                            )
-                            break
-
-                        # 添加到视频集合
-                        for video_item in vlist:
-                            video = Video.from_api_response(video_item)
-                            video_collection.append(video)
-
-                        self.log(
-                            f"第 {current_page} 页获取到 {len(vlist)} 个视频", "success"
-                        )
-                        success = True
-
-                    except Exception as e:
-                        retry_current += 1
-                        if retry_current < max_retries:
-                            retry_wait = 5 * retry_current
-                            self.log(f"获取视频列表出错: {e}", "error")
-                            self.log(
-                                f"将在 {retry_wait} 秒后重试 ({retry_current}/{max_retries})...",
-                                "warning",
-                            )
-                            time.sleep(retry_wait)
-                        else:
-                            self.log(
-                                f"获取视频列表失败，已达最大重试次数: {e}", "error"
-                            )
-                            break
-
-                if self.stop_flag:
-                    self.log("用户停止了下载")
-                    break
-
-                # 如果该页获取失败且不是最后一页，询问是否继续
-                if not success and current_page < end_page:
-                    # 由于在线程中，不能直接使用messagebox，使用自定义状态标记
-                    self.log(
-                        f"第 {current_page} 页获取失败，跳过此页继续后续页面", "warning"
-                    )
-                    continue
+            video_collection = collect_up_videos(
+                self.api,
+                mid,
+                start_page,
+                end_page,
+                vorder,
+                log=self.log,
+                should_stop=lambda: self.stop_flag,
+            )
 
             if not video_collection:
                 self.log(f"未找到UP主 {mid} 的视频", "warning")
@@ -409,351 +403,40 @@ class UpFrame(ttk.Frame):
             total_videos = len(video_collection)
             self.log(f"共找到 {total_videos} 个视频", "header")
 
-            # 下载每个视频的评论
-            for i, video in enumerate(video_collection):
-                if self.stop_flag:
-                    break
-
-                self.log(
-                    f"开始获取视频 [{i+1}/{total_videos}] {video.bvid}: {video.title}",
-                    "header",
-                )
-                self.download_video_comments(video)
+            if self.stop_flag:
+                self.log("用户停止了下载")
+                return
 
-                # 更新总进度
-                self.progress_var.set(min(100, (i + 1) / total_videos * 100))
+            # 多个视频并发爬取，共用同一个限速器
+            options = CrawlOptions(
+                output=self.config.get("output", ""),
+                order=self.corder_var.get(),
+                mapping=self.mapping_var.get(),
+            )
+            self.scheduler = CrawlScheduler(
+                video_collection,
+                options,
+                api=self.api,
+                concurrency=self.video_concurrency_var.get(),
+                priority=self.video_priority_var.get(),
+            )
+            self.scheduler.subscribe(self.on_crawl_event)
+            self.scheduler.run()
 
             self.log("所有视频评论获取完成", "success")
+            self.log(f"当前有效请求速率: {self.api.effective_rate:.2f} 次/秒")
 
         except Exception as e:
             self.log(f"下载过程中出错: {e}", "error")
             logger.exception("下载UP主视频评论出错")
 
-    def download_video_comments(self, video):
-        """下载单个视频的评论"""
-        try:
-            bvid = video.bvid
-            avid = video.aid
-            oid = str(avid)
-
-            # 首先尝试使用video对象中的标题
-            video_title = (
-                video.title if hasattr(video, "title") and video.title else "未知视频"
-            )
-
-            # 检查是否已经存在包含标题的目录
-            base_output_dir = Path(self.config.get("output", ""))
-            existing_dir = None
-
-            # 查找以BV号开头的目录
-            for item in base_output_dir.glob(f"{bvid}_*"):
-                if item.is_dir():
-                    existing_dir = item
-                    extracted_title = extract_title_from_dirname(item.name)
-                    if extracted_title:
-                        video_title = extracted_title
-                        self.log(f"找到已有目录，使用现有标题: {video_title}")
-                        break
-
-            # 如果没有找到目录或无法提取标题，且video对象的标题不可用，则请求API
-            if (
-                not existing_dir or video_title == "未知视频"
-            ) and video_title == "未知视频":
-                self.log(f"正在获取视频 {bvid} 的信息...")
-                video_info = self.api.fetch_video_info(bvid)
-
-                if video_info.get("code") == 0:
-                    video_title = video_info.get("data", {}).get("title", "未知视频")
-                    self.log(f"从API获取到视频标题: {video_title}")
-                else:
-                    self.log(f"获取视频标题失败，使用默认标题")
-
-            # 创建输出目录 - 使用BV号+标题的格式
-            dir_name = get_dir_name(bvid, video_title)
-            output_dir = base_output_dir / dir_name
-            output_dir.mkdir(parents=True, exist_ok=True)
-
-            # 保存视频信息到JSON文件（如果是新获取的）
-            video_info_path = output_dir / "video_info.json"
-            if not video_info_path.exists():
-                try:
-                    # 如果是通过API获取的，使用完整信息
-                    if "video_info" in locals() and video_info.get("code") == 0:
-                        with open(video_info_path, "w", encoding="utf-8") as f:
-                            json.dump(video_info, f, ensure_ascii=False, indent=2)
-                    # 否则使用video对象的信息
-                    else:
-                        video_info_dict = {
-                            "bvid": bvid,
-                            "aid": avid,
-                            "title": video_title,
-                            "author": video.author if hasattr(video, "author") else "",
-                            "comment_count": (
-                                video.comment if hasattr(video, "comment") else 0
-                            ),
-                        }
-                        with open(video_info_path, "w", encoding="utf-8") as f:
-                            json.dump(video_info_dict, f, ensure_ascii=False, indent=2)
-                    self.log(f"已保存视频信息到: {video_info_path}")
-                except Exception as e:
-                    self.log(f"保存视频信息失败: {e}")
-
-            # 获取评论总数
-            total = self.api.fetch_comment_count(oid)
-            if total == 0:
-                self.log(f"视频 {bvid} ({video_title}) 未找到评论或获取评论数失败")
-                return
-
-            self.log(f"视频 {bvid} ({video_title}) 共有 {total} 条评论")
-
-            downloaded_count = 0
-            round_num = 0
-            recorded_map = {}
-            stat_map = {}
-            offset_str = ""
-
-            # 从配置获取重试相关参数
-            max_retries = self.config.get("max_retries", 3)
-            consecutive_empty_limit = self.config.get("consecutive_empty_limit", 2)
-
-            # 用于跟踪连续获取到的空页面数量
-            consecutive_empty_pages = 0
-
-            while not self.stop_flag:
-                reply_collection = []
-
-                self.log(f"正在获取视频 {bvid} 第 {round_num + 1} 页评论")
-
-                # 如果已下载的评论数大于等于总评论数，且连续空页面数达到限制，则停止获取
-                if (
-                    downloaded_count >= total
-                    and consecutive_empty_pages >= consecutive_empty_limit
-                ):
-                    self.log(f"视频 {bvid} 评论获取完成")
-                    break
-
-                round_num += 1
-                retry_count = 0
-                success = False
-
-                # 请求评论并处理重试
-                while retry_count < max_retries and not success and not self.stop_flag:
-                    cmt_info = self.api.fetch_comments(
-                        oid, round_num, self.corder_var.get(), offset_str
-                    )
-
-                    # 检查API请求是否成功
-                    if cmt_info.get("code") != 0:
-                        error_msg = cmt_info.get("message", "未知错误")
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            retry_delay = self.config.get("request_retry_delay", 5.0)
-                            self.log(
-                                f"请求评论失败: {error_msg}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
-                                "warning",
-                            )
-                            time.sleep(retry_delay)
-                            continue
-                        else:
-                            self.log(
-                                f"请求评论失败: {error_msg}，已达到最大重试次数 {max_retries}，跳过此页",
-                                "error",
-                            )
-                            break
-
-                    replies = cmt_info.get("data", {}).get("replies", [])
-
-                    # 处理空页面情况
-                    if not replies:
-                        consecutive_empty_pages += 1
-                        retry_count += 1
-
-                        if retry_count < max_retries:
-                            retry_delay = self.config.get("request_retry_delay", 5.0)
-                            self.log(
-                                f"第 {round_num} 页未获取到评论，连续空页面数: {consecutive_empty_pages}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
-                                "warning",
-                            )
-                            time.sleep(retry_delay)
-                            continue
-                        else:
-                            self.log(
-                                f"第 {round_num} 页连续 {consecutive_empty_pages} 次未获取到评论，已达到最大重试次数",
-                                "warning",
-                            )
-                            # 不设置success为True，让外层循环继续处理
-                            break
-                    else:
-                        # 获取到了评论，重置连续空页面计数
-                        consecutive_empty_pages = 0
-                        success = True
-
-                        offset_str = (
-                            cmt_info.get("data", {})
-                            .get("cursor", {})
-                            .get("pagination_reply", {})
-                            .get("next_offset", "")
-                        )
-                        reply_collection.extend(replies)
-
-                # 如果用户停止了下载或达到了连续空页面的限制，则跳出主循环
-                if self.stop_flag or (
-                    consecutive_empty_pages >= consecutive_empty_limit and not success
-                ):
-                    if self.stop_flag:
-                        self.log(f"用户停止了视频 {bvid} 的下载")
-                    else:
-                        self.log(
-                            f"连续 {consecutive_empty_pages} 页未获取到评论，停止获取"
-                        )
-                    break
-
-                # 如果请求失败且已重试达到上限，继续下一轮循环（尝试下一页）
-                if not success:
-                    continue
-
-                # 获取子评论
-                for reply in replies:
-                    rcount = reply.get("rcount", 0)
-                    if rcount == 0:
-                        continue
-
-                    reply_replies = reply.get("replies", [])
-                    if reply_replies and len(reply_replies) == rcount:
-                        reply_collection.extend(reply_replies)
-                    else:
-                        # 需要额外获取子评论
-                        sub_replies = self.fetch_sub_comments(
-                            oid, reply.get("rpid"), bvid
-                        )
-                        reply_collection.extend(sub_replies)
-
-                # 处理置顶评论
-                top_replies = cmt_info.get("data", {}).get("top_replies", [])
-                if top_replies:
-                    reply_collection.extend(top_replies)
-                    for reply in top_replies:
-                        reply_replies = reply.get("replies", [])
-                        if reply_replies:
-                            reply_collection.extend(reply_replies)
-
-                # 转换为Comment对象
-                comments = []
-                for reply in reply_collection:
-                    rpid = reply.get("rpid")
-                    if rpid not in recorded_map:
-                        comment = Comment.from_api_response(reply)
-                        comment.bvid = bvid
-
-                        recorded_map[rpid] = True
-                        comments.append(comment)
-
-                        # 统计地区信息
-                        if self.mapping_var.get():
-                            location = comment.location
-                            if not location or location == "":
-                                location = "未知"
-
-                            # 规范化地区名称，与CSV分析保持一致
-                            normalized_location = normalize_location(location)
-
-                            # 确保用户ID是字符串类型
-                            user_id = str(comment.mid)
-
-                            if normalized_location in stat_map:
-                                stat = stat_map[normalized_location]
-                                stat.location += 1  # 评论数增加
-                                stat.like += comment.like
-                                stat.level[comment.current_level] += 1
-                                stat.users.add(user_id)  # 添加用户ID到集合
-                                stat.update_user_sex(
-                                    user_id, comment.sex
-                                )  # 更新用户性别统计
-                            else:
-                                stat = Stat(
-                                    name=normalized_location,
-                                    location=1,
-                                    like=comment.like,
-                                )
-                                stat.level[comment.current_level] += 1
-                                stat.users.add(user_id)  # 添加用户ID到集合
-                                stat.update_user_sex(
-                                    user_id, comment.sex
-                                )  # 更新用户性别统计
-                                stat_map[normalized_location] = stat
-
-                # 保存到CSV
-                if comments:
-                    save_to_csv(bvid, comments, str(output_dir), video_title)
-
-                downloaded_count += len(comments)
-                self.log(f"视频 {bvid} 已获取 {downloaded_count}/{total} 条评论")
-
-                if self.stop_flag:
-                    self.log(f"用户停止了视频 {bvid} 的下载")
-                    break
-
-            # 生成地图
-            if self.mapping_var.get() and stat_map:
-                self.log(f"正在生成视频 {bvid} 的评论地区分布地图...")
-                unmatched_regions = write_geojson(
-                    stat_map, bvid, str(output_dir), video_title
-                )
-                self.log(f"视频 {bvid} 地图生成完成")
-
-                # 显示未匹配地区
-                if unmatched_regions:
-                    unmatched_names = ", ".join(unmatched_regions.keys())
-                    self.log(
-                        f"视频 {bvid} 有 {len(unmatched_regions)} 个地区未能匹配到地图: {unmatched_names}"
-                    )
-
-                    # 单独打印每个未匹配地区的信息
-                    for region, info in unmatched_regions.items():
-                        self.log(
-                            f"  未匹配地区: {region} - {info['comments']}条评论, {info['users']}位用户"
-                        )
-
-        except Exception as e:
-            self.log(f"下载视频 {video.bvid} 评论过程中出错: {e}", "error")
-            logger.exception(f"下载视频 {video.bvid} 评论出错")
-
-    def fetch_sub_comments(self, oid, rpid, bvid):
-        """获取子评论"""
-        page = 1
-        all_replies = []
-
-        while not self.stop_flag:
-            self.log(f"获取视频 {bvid} 评论 {rpid} 的子评论，第 {page} 页")
-
-            sub_cmt_info = self.api.fetch_sub_comments(oid, rpid, page)
-
-            if sub_cmt_info.get("code") != 0:
-                self.log(f"获取子评论失败: {sub_cmt_info.get('message', '未知错误')}")
-                break
-
-            replies = sub_cmt_info.get("data", {}).get("replies", [])
-
-            if not replies:
-                break
-
-            all_replies.extend(replies)
-
-            # 获取子评论的回复
-            for reply in replies:
-                reply_replies = reply.get("replies", [])
-                if reply_replies:
-                    all_replies.extend(reply_replies)
-
-            # 获取置顶评论
-            top_replies = sub_cmt_info.get("data", {}).get("top_replies", [])
-            if top_replies:
-                all_replies.extend(top_replies)
-                for reply in top_replies:
-                    reply_replies = reply.get("replies", [])
-                    if reply_replies:
-                        all_replies.extend(reply_replies)
-
-            page += 1
-
-        return all_replies
+    def on_crawl_event(self, event: CrawlEvent):
+        """处理爬取事件：日志写入日志框，总进度更新进度条"""
+        if event.kind == "log":
+            message = event.message
+            # 多个视频同时爬取时标明日志所属的视频
+            if event.identifier and event.identifier not in message:
+                message = f"[{event.identifier}] {message}"
+            self.log(message, event.level)
+        elif event.kind == "overall":
+            self.set_progress(event.progress)
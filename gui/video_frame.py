@@ -1,28 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
+import queue
 import threading
 import logging
 from pathlib import Path
 import re
-import json
-import time
 
 from config import Config
 from api.crypto import bvid_to_avid
-from models.comment import Comment, Stat
-from store.csv_analyzer import normalize_location, generate_map_from_csv
-from store.csv_exporter import save_to_csv
-from store.geo_exporter import write_geojson
+from crawler import CommentCrawler, CrawlEvent, CrawlOptions
+from store.csv_analyzer import generate_map_from_csv
+from store.job_store import get_job_store
 from api.bilibili_api import (
     BilibiliAPI,
-    extract_title_from_dirname,
-    get_dir_name,
     parse_bilibili_url,
 )
 from gui.tooltip import create_tooltip
 
 logger = logging.getLogger(__name__)
 
+# 主线程处理界面更新队列的间隔（毫秒）和每次最多处理的条数
+UI_POLL_INTERVAL = 100
+UI_POLL_BATCH = 200
+
 
 class VideoFrame(ttk.Frame):
     """视频评论下载界面"""
@@ -35,7 +35,10 @@ class VideoFrame(ttk.Frame):
         super().__init__(parent)
         self.config = Config()
         self.api = BilibiliAPI(self.config.get("cookie", ""))
+        # 后台线程的日志和进度更新先放入队列，由主线程定时取出更新界面（Tkinter 不是线程安全的）
+        self.ui_queue = queue.Queue()
         self.init_ui()
+        self.after(UI_POLL_INTERVAL, self.process_ui_queue)
 
     def get_content_type_name(self, content_type: str = None) -> str:
         """获取内容类型的显示名称"""
@@ -195,6 +198,7 @@ class VideoFrame(ttk.Frame):
         # 状态变量
         self.stop_flag = False
         self.download_thread = None
+        self.crawler = None
 
     def generate_map_from_csv(self):
         """从现有CSV文件生成地图"""
@@ -422,6 +426,22 @@ class VideoFrame(ttk.Frame):
                     data_exists = True
                     existing_files.append(str(csv_file))
 
+        # 存在未完成的任务时，询问是否从中断处继续
+        self.resume_mode = True
+        job = get_job_store().get(identifier)
+        if data_exists and job is not None and job.resumable:
+            answer = messagebox.askyesno(
+                "继续下载",
+                f"{identifier} 上次下载未完成（已获取 {job.downloaded}/{job.total} 条评论，第 {job.round_num} 页）。\n\n"
+                "是否从中断处继续？选择“否”将询问是否覆盖现有数据。",
+            )
+            if answer:
+                data_exists = False
+                self.log(f"将从第 {job.round_num + 1} 页继续下载")
+            else:
+                # 用户不继续时，之后的覆盖、追加或增量更新都不再恢复该检查点
+                self.resume_mode = False
+
         # 如果数据已存在，询问用户是否覆盖
         if data_exists:
             try:
@@ -433,6 +453,9 @@ class VideoFrame(ttk.Frame):
                     # 用户选择覆盖，设置覆盖标志
                     self.overwrite_mode = True
                     self.log("用户选择覆盖现有数据，将清空重新下载")
+                elif result == "incremental":
+                    self.incremental_mode = True
+                    self.log("用户选择增量更新，只获取上次之后的新评论")
                 else:
                     return
             except Exception as e:
@@ -441,6 +464,7 @@ class VideoFrame(ttk.Frame):
                 return
         else:
             self.overwrite_mode = False
+            self.incremental_mode = False
 
         self.stop_flag = False
         self.progress_var.set(0)
@@ -462,7 +486,7 @@ class VideoFrame(ttk.Frame):
 
         dialog = tk.Toplevel(self)
         dialog.title("数据已存在")
-        dialog.geometry("520x350")
+        dialog.geometry("520x380")
         dialog.resizable(False, False)
         dialog.transient(self)
         dialog.grab_set()
@@ -513,6 +537,7 @@ class VideoFrame(ttk.Frame):
         warning_frame.pack(fill=tk.X, pady=(0, 20))
 
         warning_text = (
+            "• 增量更新：按时间获取上次之后的新评论和新回复，追加到现有CSV\n"
             "• 覆盖数据：清空现有CSV文件中的所有评论数据，重新下载\n"
             "• 取消操作：保持现有数据不变，不进行下载\n\n"
             "⚠️ 覆盖操作不可恢复，请谨慎选择！"
@@ -536,6 +561,10 @@ class VideoFrame(ttk.Frame):
             result["value"] = "overwrite"
             dialog.destroy()
 
+        def on_incremental():
+            result["value"] = "incremental"
+            dialog.destroy()
+
         def on_cancel():
             result["value"] = "cancel"
             dialog.destroy()
@@ -571,6 +600,15 @@ class VideoFrame(ttk.Frame):
         )
         overwrite_btn.pack(side=tk.RIGHT)
 
+        incremental_btn = ttk.Button(
+            button_frame,
+            text="增量更新",
+            command=on_incremental,
+            width=12,
+            style="Cancel.TButton",
+        )
+        incremental_btn.pack(side=tk.RIGHT, padx=(0, 10))
+
         # 确保窗口完全创建后再居中显示
         def center_dialog():
             # 更新窗口以确保所有组件都已渲染
@@ -631,6 +669,8 @@ class VideoFrame(ttk.Frame):
         """停止下载"""
         if self.download_thread and self.download_thread.is_alive():
             self.stop_flag = True
+            if self.crawler:
+                self.crawler.stop()
             self.log("正在停止下载...")
         else:
             messagebox.showinfo("提示", "没有正在进行的下载任务")
@@ -639,7 +679,32 @@ class VideoFrame(ttk.Frame):
         """清空日志"""
         self.log_text.delete(1.0, tk.END)
 
+    def process_ui_queue(self):
+        """在主线程中执行后台线程放入队列的界面更新"""
+        try:
+            for _ in range(UI_POLL_BATCH):
+                update, args = self.ui_queue.get_nowait()
+                update(*args)
+        except queue.Empty:
+            pass
+        self.after(UI_POLL_INTERVAL, self.process_ui_queue)
+
+    def run_in_ui(self, update, *args):
+        """在主线程中更新界面，其他线程调用时放入队列由主线程执行"""
+        if threading.current_thread() is threading.main_thread():
+            update(*args)
+        else:
+            self.ui_queue.put((update, args))
+
+    def set_progress(self, value):
+        """更新进度条，可以在任意线程调用"""
+        self.run_in_ui(self.progress_var.set, value)
+
     def log(self, message, level="info"):
+        """添加日志，可以在任意线程调用，日志框由主线程更新"""
+        self.run_in_ui(self._write_log, message, level)
+
+    def _write_log(self, message, level="info"):
         """添加日志，改进显示格式
 
         Args:
@@ -691,392 +756,37 @@ class VideoFrame(ttk.Frame):
         logger.info(message)
 
     def download_comments(self):
-        """下载评论的线程函数 - 重写以支持不同内容类型"""
-        try:
-            identifier = self.identifier
-            content_type = self.content_type
-
-            self.log(
-                f"开始获取{('视频' if content_type == 'video' else '番剧')} {identifier} 的评论"
-            )
-
-            # 获取内容信息
-            content_info = self.api.fetch_content_info(identifier, content_type)
-
-            if content_info.get("code") != 0:
-                error_msg = content_info.get("message", "未知错误")
-                self.log(
-                    f"获取{self.get_content_type_name()}信息失败: {error_msg}",
-                    "error",
-                )
-                return
-
-            # 提取关键信息
-            data = content_info.get("data", {})
-            aid = data.get("aid")
-            content_title = data.get("title", "未知内容")
-
-            if not aid:
-                self.log("无法获取有效的AID", "error")
-                return
-
-            oid = str(aid)
-
-            self.log(
-                f"获取到{('视频' if content_type == 'video' else '番剧')}信息: {content_title}"
-            )
-            self.log(f"AID: {aid}")
-
-            # 检查是否已经存在包含标题的目录
-            base_output_dir = Path(self.config.get("output", ""))
-            video_title = content_title
-            existing_dir = None
-
-            # 查找以标识符开头的目录
-            for item in base_output_dir.glob(f"{identifier}_*"):
-                if item.is_dir():
-                    existing_dir = item
-                    extracted_title = extract_title_from_dirname(item.name)
-                    if extracted_title:
-                        video_title = extracted_title
-                        self.log(f"找到已有目录，使用现有标题: {video_title}")
-                        break
-
-            # 如果没有找到现有标题，使用从API获取的标题
-            if not existing_dir or video_title == content_title:
-                video_title = content_title
-                self.log(f"使用API获取的标题: {video_title}")
-
-            # 创建输出目录 - 使用标识符+标题的格式
-            dir_name = get_dir_name(identifier, video_title)
-            output_dir = base_output_dir / dir_name
-            output_dir.mkdir(parents=True, exist_ok=True)
-
-            # 保存内容信息到JSON文件
-            content_info_path = output_dir / "content_info.json"
-            if not content_info_path.exists() or self.overwrite_mode:
-                try:
-                    with open(content_info_path, "w", encoding="utf-8") as f:
-                        json.dump(content_info, f, ensure_ascii=False, indent=2)
-                    self.log(f"已保存内容信息到: {content_info_path}")
-                except Exception as e:
-                    self.log(f"保存内容信息失败: {e}")
-
-            self.log(
-                f"开始获取{('视频' if content_type == 'video' else '番剧')} {identifier} ({video_title}) 的评论"
-            )
-
-            # 获取评论总数
-            total = self.api.fetch_comment_count(oid)
-            if total == 0:
-                self.log("未找到评论或获取评论数失败")
-                return
-
-            self.log(
-                f"该{self.get_content_type_name()}共有 {total} 条评论"
-            )
-
-            downloaded_count = 0
-            round_num = 0
-            recorded_map = {}
-            stat_map = {}
-            offset_str = ""
-
-            # 从配置获取重试相关参数
-            max_retries = self.config.get("max_retries", 3)
-            consecutive_empty_limit = self.config.get("consecutive_empty_limit", 2)
-
-            # 用于跟踪连续获取到的空页面数量
-            consecutive_empty_pages = 0
-
-            while not self.stop_flag:
-                reply_collection = []
-
-                self.log(f"正在获取第 {round_num + 1} 页评论")
-
-                # 如果已下载的评论数大于等于总评论数，且连续空页面数达到限制，则停止获取
-                if (
-                    downloaded_count >= total
-                    and consecutive_empty_pages >= consecutive_empty_limit
-                ):
-                    self.log(
-                        f"{self.get_content_type_name()} {identifier} ({video_title}) 的评论获取完成"
-                    )
-                    break
-
-                round_num += 1
-                retry_count = 0
-                success = False
-
-                # 请求评论并处理重试
-                while retry_count < max_retries and not success and not self.stop_flag:
-                    cmt_info = self.api.fetch_comments(
-                        oid, round_num, self.corder_var.get(), offset_str
-                    )
-
-                    # 检查API请求是否成功
-                    if cmt_info.get("code") != 0:
-                        error_msg = cmt_info.get("message", "未知错误")
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            retry_delay = self.config.get("request_retry_delay", 5.0)
-                            self.log(
-                                f"请求评论失败: {error_msg}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
-                                "warning",
-                            )
-                            time.sleep(retry_delay)
-                            continue
-                        else:
-                            self.log(
-                                f"请求评论失败: {error_msg}，已达到最大重试次数 {max_retries}，跳过此页",
-                                "error",
-                            )
-                            break
-
-                    replies = cmt_info.get("data", {}).get("replies", [])
-
-                    # 处理空页面情况
-                    if not replies:
-                        consecutive_empty_pages += 1
-                        retry_count += 1
-
-                        if retry_count < max_retries:
-                            retry_delay = self.config.get("request_retry_delay", 5.0)
-                            self.log(
-                                f"第 {round_num} 页未获取到评论，连续空页面数: {consecutive_empty_pages}，将在 {retry_delay} 秒后重试 ({retry_count}/{max_retries})...",
-                                "warning",
-                            )
-                            time.sleep(retry_delay)
-                            continue
-                        else:
-                            self.log(
-                                f"第 {round_num} 页连续 {consecutive_empty_pages} 次未获取到评论，已达到最大重试次数",
-                                "warning",
-                            )
-                            # 不设置success为True，让外层循环继续处理
-                            break
-                    else:
-                        # 获取到了评论，重置连续空页面计数
-                        consecutive_empty_pages = 0
-                        success = True
-
-                        offset_str = (
-                            cmt_info.get("data", {})
-                            .get("cursor", {})
-                            .get("pagination_reply", {})
-                            .get("next_offset", "")
-                        )
-                        reply_collection.extend(replies)
-
-                # 如果用户停止了下载或达到了连续空页面的限制，则跳出主循环
-                if self.stop_flag or (
-                    consecutive_empty_pages >= consecutive_empty_limit and not success
-                ):
-                    if self.stop_flag:
-                        self.log("用户停止了下载")
-                    else:
-                        self.log(
-                            f"连续 {consecutive_empty_pages} 页未获取到评论，停止获取"
-                        )
-                    break
-
-                # 如果请求失败且已重试达到上限，继续下一轮循环（尝试下一页）
-                if not success:
-                    continue
-
-                # 获取子评论
-                for reply in replies:
-                    rcount = reply.get("rcount", 0)
-                    if rcount == 0:
-                        continue
-
-                    reply_replies = reply.get("replies", [])
-                    if reply_replies and len(reply_replies) == rcount:
-                        reply_collection.extend(reply_replies)
-                    else:
-                        # 需要额外获取子评论
-                        sub_replies = self.fetch_sub_comments(
-                            oid, reply.get("rpid"), identifier
-                        )
-                        reply_collection.extend(sub_replies)
-
-                # 处理置顶评论
-                top_replies = cmt_info.get("data", {}).get("top_replies", [])
-                if top_replies:
-                    reply_collection.extend(top_replies)
-                    for reply in top_replies:
-                        reply_replies = reply.get("replies", [])
-                        if reply_replies:
-                            reply_collection.extend(reply_replies)
-
-                # 转换为Comment对象
-                comments = []
-                for reply in reply_collection:
-                    rpid = reply.get("rpid")
-                    if rpid not in recorded_map:
-                        comment = Comment.from_api_response(reply)
-                        comment.bvid = identifier  # 使用统一的标识符
-
-                        recorded_map[rpid] = True
-                        comments.append(comment)
-
-                        # 统计地区信息
-                        if self.mapping_var.get():
-                            location = comment.location
-                            if not location or location == "":
-                                location = "未知"
-
-                            # 规范化地区名称，与CSV分析保持一致
-                            normalized_location = normalize_location(location)
-
-                            # 确保用户ID是字符串类型
-                            user_id = str(comment.mid)
-
-                            if normalized_location in stat_map:
-                                stat = stat_map[normalized_location]
-                                stat.location += 1  # 评论数增加
-                                stat.like += comment.like
-                                stat.level[comment.current_level] += 1
-                                stat.users.add(user_id)  # 添加用户ID到集合
-                                stat.update_user_sex(
-                                    user_id, comment.sex
-                                )  # 更新用户性别统计
-                            else:
-                                stat = Stat(
-                                    name=normalized_location,
-                                    location=1,
-                                    like=comment.like,
-                                )
-                                stat.level[comment.current_level] += 1
-                                stat.users.add(user_id)  # 添加用户ID到集合
-                                stat.update_user_sex(
-                                    user_id, comment.sex
-                                )  # 更新用户性别统计
-                                stat_map[normalized_location] = stat
-
-                # 保存到CSV
-                if comments:
-                    overwrite_mode = getattr(self, "overwrite_mode", False)
-                    save_to_csv(
-                        identifier,
-                        comments,
-                        str(output_dir),
-                        video_title,
-                        overwrite_mode,
-                    )
-                    # 如果是覆盖模式，只在第一次调用时覆盖，后续调用应该追加
-                    if overwrite_mode:
-                        self.overwrite_mode = False  # 重置覆盖标志，后续为追加模式
-
-                downloaded_count += len(comments)
-                self.log(f"已获取 {downloaded_count}/{total} 条评论")
-
-                # 更新进度条
-                self.progress_var.set(min(100, downloaded_count / total * 100))
-
-            # 生成地图
-            if self.mapping_var.get() and stat_map:
-                self.log(f"统计到 {len(stat_map)} 个地区的数据")
-                for location, stat in stat_map.items():
-                    self.log(f"  {location}: {stat.location} 条评论")
-
-                self.log("正在生成评论地区分布地图...")
-                unmatched_regions = write_geojson(
-                    stat_map, identifier, str(output_dir), video_title
-                )
-                self.log("地图生成完成")
-
-                # 显示未匹配地区
-                if unmatched_regions:
-                    unmatched_names = ", ".join(unmatched_regions.keys())
-                    self.log(
-                        f"有 {len(unmatched_regions)} 个地区未能匹配到地图: {unmatched_names}"
-                    )
+        """下载评论的线程函数，爬取流程由 CommentCrawler 完成，界面只订阅事件"""
+        options = CrawlOptions(
+            output=self.config.get("output", ""),
+            order=self.corder_var.get(),
+            mapping=self.mapping_var.get(),
+            overwrite=getattr(self, "overwrite_mode", False),
+            incremental=getattr(self, "incremental_mode", False),
+            resume=getattr(self, "resume_mode", True),
+        )
+        self.crawler = CommentCrawler(
+            self.identifier, options, api=self.api, content_type=self.content_type
+        )
+        self.crawler.subscribe(self.on_crawl_event)
 
-                    # 单独打印每个未匹配地区的信息
-                    for region, count in unmatched_regions.items():
-                        self.log(
-                            f"  未匹配地区: {region} - {count['comments']}条评论, {count['users']}位用户"
-                        )
+        result = self.crawler.run()
+        # 覆盖、增量更新和是否继续检查点只对本次下载有效
+        self.overwrite_mode = False
+        self.incremental_mode = False
+        self.resume_mode = True
 
+        if result.success:
+            self.log(f"当前有效请求速率: {self.api.effective_rate:.2f} 次/秒")
             self.log("任务完成")
-            self.progress_var.set(100)
-
-        except Exception as e:
-            self.log(f"下载过程中出错: {e}")
-            logger.exception("下载评论出错")
-
-    def fetch_sub_comments(self, oid, rpid, identifier):
-        """获取子评论 - 更新以使用统一标识符"""
-        page = 1
-        all_replies = []
-
-        try:
-            while not self.stop_flag:
-                self.log(f"获取评论 {rpid} 的子评论，第 {page} 页")
-
-                # 构建请求参数
-                params = {
-                    "oid": oid,
-                    "type": "1",
-                    "root": str(rpid),
-                    "ps": "20",
-                    "pn": str(page),
-                }
-
-                # 使用类似主评论的请求方式
-                try:
-                    # 尝试使用requests库
-                    import requests
-
-                    headers = {
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0",
-                        "Referer": f"https://www.bilibili.com/{'video' if self.content_type == 'video' else 'bangumi/play'}/{identifier}",
-                        "Origin": "https://www.bilibili.com",
-                        "Accept": "application/json, text/plain, */*",
-                    }
-
-                    if self.api.cookie:
-                        headers["Cookie"] = self.api.cookie
-
-                    # 请求前添加延迟
-                    self.api.sleep_between_requests()
-
-                    url = "https://api.bilibili.com/x/v2/reply/reply?" + "&".join(
-                        [f"{k}={v}" for k, v in params.items()]
-                    )
-                    response = requests.get(url, headers=headers)
-
-                    if response.status_code == 200:
-                        data = response.json()
-
-                        if data.get("code") != 0:
-                            self.log(
-                                f"获取子评论失败: {data.get('message', '未知错误')}"
-                            )
-                            break
-
-                        replies = data.get("data", {}).get("replies", [])
-
-                        if not replies:
-                            break
-
-                        all_replies.extend(replies)
-                        page += 1
-                    else:
-                        self.log(f"获取子评论请求失败，状态码: {response.status_code}")
-                        break
-
-                except Exception as e:
-                    self.log(f"获取子评论出错: {e}")
-                    # 请求失败添加重试延迟
-                    self.api.sleep_between_requests("retry")
-                    break
-
-        except Exception as e:
-            self.log(f"子评论处理过程中出错: {e}")
+            self.set_progress(100)
 
-        return all_replies
+    def on_crawl_event(self, event: CrawlEvent):
+        """处理爬取事件：日志写入日志框，进度更新进度条"""
+        if event.kind == "log":
+            self.log(event.message, event.level)
+        elif event.kind == "progress":
+            self.set_progress(event.progress)
 
     def generate_wordcloud_from_csv(self):
         """从现有CSV文件生成词云"""
@@ -1202,7 +912,7 @@ class VideoFrame(ttk.Frame):
             "确认下载",
             f"将从以下CSV文件中提取并下载图片：\n\n{csv_path.name}\n\n"
             "图片将保存到同目录下的 images 文件夹中。\n"
-            "已存在的图片会自动跳过。\n\n"
+            "已下载的图片会自动跳过，失败的图片再次下载时会重试。\n\n"
             "确定要开始下载吗？",
         ):
             return
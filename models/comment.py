@@ -1,128 +1,344 @@
-from dataclasses import dataclass, field
-from typing import List, Dict, Any
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Set as AbstractSet
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 
-@dataclass
+@dataclass(slots=True)
 class Picture:
     """图片数据"""
 
     img_src: str
 
 
-@dataclass
+# Comment 的字段，与构造函数的参数顺序一致
+COMMENT_FIELDS = (
+    "uname",  # 用户名
+    "sex",  # 性别
+    "content",  # 评论内容
+    "rpid",  # 评论ID
+    "oid",  # 评论区ID
+    "bvid",  # 视频BV号
+    "mid",  # 发送者ID
+    "parent",  # 父评论ID
+    "fansgrade",  # 是否粉丝
+    "ctime",  # 评论时间戳
+    "like",  # 点赞数
+    "following",  # 是否关注
+    "current_level",  # 当前等级
+    "location",  # 位置
+)
+
+
 class Comment:
-    """评论数据"""
-
-    uname: str = ""  # 用户名
-    sex: str = ""  # 性别
-    content: str = ""  # 评论内容
-    rpid: int = 0  # 评论ID
-    oid: int = 0  # 评论区ID
-    bvid: str = ""  # 视频BV号
-    mid: int = 0  # 发送者ID
-    parent: int = 0  # 父评论ID
-    fansgrade: int = 0  # 是否粉丝
-    ctime: int = 0  # 评论时间戳
-    like: int = 0  # 点赞数
-    following: bool = False  # 是否关注
-    current_level: int = 0  # 当前等级
-    location: str = ""  # 位置
-    pictures: List[Picture] = field(default_factory=list)  # 图片列表
+    """评论数据
+
+    使用 __slots__ 保存字段，没有实例字典；每条爬到的评论都会创建一个对象。
+    从API响应创建时图片保留原始数据，第一次访问 pictures 时才转换为 Picture 列表，
+    只需要链接时使用 picture_urls。
+    """
+
+    __slots__ = COMMENT_FIELDS + ("_pictures", "_raw_pictures")
+
+    def __init__(
+        self,
+        uname: str = "",
+        sex: str = "",
+        content: str = "",
+        rpid: int = 0,
+        oid: int = 0,
+        bvid: str = "",
+        mid: int = 0,
+        parent: int = 0,
+        fansgrade: int = 0,
+        ctime: int = 0,
+        like: int = 0,
+        following: bool = False,
+        current_level: int = 0,
+        location: str = "",
+        pictures: Optional[List[Picture]] = None,
+    ):
+        self.uname = uname
+        self.sex = sex
+        self.content = content
+        self.rpid = rpid
+        self.oid = oid
+        self.bvid = bvid
+        self.mid = mid
+        self.parent = parent
+        self.fansgrade = fansgrade
+        self.ctime = ctime
+        self.like = like
+        self.following = following
+        self.current_level = current_level
+        self.location = location
+        self._pictures = pictures if pictures is not None else []
+        self._raw_pictures = None
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in COMMENT_FIELDS)
+        return f"Comment({values}, pictures={self.pictures!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Comment):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in COMMENT_FIELDS
+        ) and self.pictures == other.pictures
+
+    @property
+    def pictures(self) -> List[Picture]:
+        """图片列表"""
+        if self._pictures is None:
+            self._pictures = [Picture(p["img_src"]) for p in self._raw_pictures]
+            self._raw_pictures = None
+        return self._pictures
+
+    @pictures.setter
+    def pictures(self, value: List[Picture]) -> None:
+        self._pictures = value
+        self._raw_pictures = None
+
+    @property
+    def picture_urls(self) -> List[str]:
+        """图片链接，不创建 Picture 对象"""
+        if self._pictures is None:
+            return [p["img_src"] for p in self._raw_pictures]
+        return [picture.img_src for picture in self._pictures]
 
     @classmethod
     def from_api_response(cls, item: Dict[str, Any]) -> "Comment":
         """从API响应创建Comment对象"""
-        pictures = []
-        if "content" in item and "pictures" in item["content"]:
-            pictures = [Picture(p["img_src"]) for p in item["content"]["pictures"]]
-
-        return cls(
-            uname=item.get("member", {}).get("uname", ""),
-            sex=item.get("member", {}).get("sex", ""),
-            content=item.get("content", {}).get("message", ""),
-            rpid=item.get("rpid", 0),
-            oid=item.get("oid", 0),
-            bvid="",  # 需要在外部设置
-            mid=item.get("mid", 0),
-            parent=item.get("parent", 0),
-            fansgrade=item.get("fansgrade", 0),
-            ctime=item.get("ctime", 0),
-            like=item.get("like", 0),
-            following=item.get("reply_control", {}).get("following", False),
-            current_level=item.get("member", {})
-            .get("level_info", {})
-            .get("current_level", 0),
-            location=item.get("reply_control", {})
-            .get("location", "")
-            .replace("IP属地：", ""),
-            pictures=pictures,
-        )
+        member = item.get("member") or {}
+        content = item.get("content") or {}
+        reply_control = item.get("reply_control") or {}
+
+        comment = cls.__new__(cls)
+        comment.uname = member.get("uname", "")
+        comment.sex = member.get("sex", "")
+        comment.content = content.get("message", "")
+        comment.rpid = item.get("rpid", 0)
+        comment.oid = item.get("oid", 0)
+        comment.bvid = ""  # 需要在外部设置
+        comment.mid = item.get("mid", 0)
+        comment.parent = item.get("parent", 0)
+        comment.fansgrade = item.get("fansgrade", 0)
+        comment.ctime = item.get("ctime", 0)
+        comment.like = item.get("like", 0)
+        comment.following = reply_control.get("following", False)
+        comment.current_level = (member.get("level_info") or {}).get("current_level", 0)
+        location = reply_control.get("location", "")
+        cleaned = _LOCATIONS.get(location)
+        if cleaned is None:
+            cleaned = _LOCATIONS[location] = location.replace("IP属地：", "")
+        comment.location = cleaned
+
+        # 图片在第一次访问时再转换
+        comment._pictures = None
+        comment._raw_pictures = content.get("pictures") or ()
+        return comment
+
+
+# IP属地 -> 去掉前缀的地区名称，地区只有几十个，所有评论共用同一个字符串
+_LOCATIONS: Dict[str, str] = {}
+
+
+# 性别名称，下标即性别编码
+SEX_NAMES = ("男", "女", "保密")
+SEX_CODES = {name: code for code, name in enumerate(SEX_NAMES)}
+UNKNOWN_SEX = SEX_CODES["保密"]
+
+# 新用户缓冲区的大小，超过后合并到有序数组
+USER_BUFFER_LIMIT = 4096
 
 
-@dataclass
 class Stat:
-    """统计信息"""
-
-    name: str
-    location: int = 0
-    sex: Dict[str, int] = field(default_factory=lambda: {"男": 0, "女": 0, "保密": 0})
-    level: List[int] = field(default_factory=lambda: [0, 0, 0, 0, 0, 0, 0])
-    like: int = 0
-    users: set = field(default_factory=set)  # 存储用户ID的集合
-    user_sex_map: Dict[str, str] = field(default_factory=dict)  # 存储用户ID到性别的映射
-
-    def __post_init__(self):
-        """初始化后确保数据类型正确"""
-        # 确保users是集合
-        if not isinstance(self.users, set):
-            self.users = set(self.users) if self.users else set()
-
-        # 确保user_sex_map是字典
-        if not isinstance(self.user_sex_map, dict):
-            self.user_sex_map = dict(self.user_sex_map) if self.user_sex_map else {}
+    """一个地区的统计信息
+
+    用户ID以整数保存在有序的 array('q') 中，性别编码保存在平行的 array('b') 中，
+    每个用户约 9 字节；新用户先放入小缓冲区，缓冲区满后合并。性别人数在读取 sex 时才计算。
+    users 和 user_sex_map 是只读视图，与原来的集合和字典用法兼容。
+    """
+
+    __slots__ = ("name", "location", "like", "level", "_ids", "_codes", "_pending", "_other", "_sex")
+
+    def __init__(
+        self,
+        name: str,
+        location: int = 0,
+        sex: Optional[Dict[str, int]] = None,
+        level: Optional[List[int]] = None,
+        like: int = 0,
+        users: Iterable = (),
+        user_sex_map: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.location = location  # 评论数
+        self.like = like
+        self.level = list(level) if level else [0, 0, 0, 0, 0, 0, 0]
+        self._ids = array("q")  # 已合并的用户ID，有序
+        self._codes = array("b")  # 与 _ids 对应的性别编码
+        self._pending: Dict[int, int] = {}  # 新用户缓冲区：用户ID -> 性别编码
+        self._other: Dict[str, int] = {}  # 不是整数的用户ID
+        self._sex: Optional[Dict[str, int]] = None  # 缓存的性别人数
+
+        for user_id in users:
+            self.add_user(user_id, "保密")
+        if user_sex_map:
+            self.user_sex_map = user_sex_map
+        if sex is not None:
+            self.sex = sex
+
+    def __repr__(self) -> str:
+        return (
+            f"Stat(name={self.name!r}, location={self.location}, like={self.like}, "
+            f"level={self.level}, users={self.user_count}, sex={self.sex})"
+        )
 
     @property
     def user_count(self) -> int:
         """获取不同用户的数量"""
-        return len(self.users)
+        return len(self._ids) + len(self._pending) + len(self._other)
 
-    def update_user_sex(self, user_id: str, sex: str) -> None:
-        """更新用户性别信息"""
-        # 确保性别值有效
-        if sex not in ["男", "女", "保密"]:
-            sex = "保密"
+    @property
+    def sex(self) -> Dict[str, int]:
+        """各性别的用户数"""
+        if self._sex is None:
+            counts = [self._codes.count(code) for code in range(len(SEX_NAMES))]
+            for code in self._pending.values():
+                counts[code] += 1
+            for code in self._other.values():
+                counts[code] += 1
+            self._sex = dict(zip(SEX_NAMES, counts))
+        return self._sex
+
+    @sex.setter
+    def sex(self, value: Dict[str, int]) -> None:
+        """直接设置性别人数，加入用户或重新计算后失效"""
+        self._sex = {name: value.get(name, 0) for name in SEX_NAMES}
 
-        # 如果用户已在性别映射中，则先减去之前统计的性别计数
-        if user_id in self.user_sex_map:
-            old_sex = self.user_sex_map[user_id]
-            if old_sex in self.sex:
-                self.sex[old_sex] -= 1
+    @property
+    def users(self) -> "StatUsers":
+        """用户ID的只读视图，用法与集合相同"""
+        return StatUsers(self)
 
-        # 更新用户性别映射和计数
-        self.user_sex_map[user_id] = sex
-        if sex in self.sex:
-            self.sex[sex] += 1
+    @users.setter
+    def users(self, value: Iterable) -> None:
+        """替换全部用户，性别为保密"""
+        self._clear_users()
+        for user_id in value:
+            self.add_user(user_id, "保密")
+
+    @property
+    def user_sex_map(self) -> "StatUserSexMap":
+        """用户ID到性别的只读视图，用法与字典相同"""
+        return StatUserSexMap(self)
+
+    @user_sex_map.setter
+    def user_sex_map(self, value: Dict[str, str]) -> None:
+        """替换全部用户及其性别"""
+        self._clear_users()
+        for user_id, sex in value.items():
+            self.add_user(user_id, sex)
+
+    def _clear_users(self) -> None:
+        self._ids = array("q")
+        self._codes = array("b")
+        self._pending = {}
+        self._other = {}
+        self._sex = None
+
+    def add_comment(self, like: int, level: int, user_id, sex: str) -> None:
+        """计入一条评论"""
+        self.location += 1
+        self.like += like
+        self.level[level if 0 <= level <= 6 else 0] += 1
+        self.add_user(user_id, sex)
+
+    def add_user(self, user_id, sex: str) -> None:
+        """加入用户，已有的用户以最后一次的性别为准"""
+        code = SEX_CODES.get(sex, UNKNOWN_SEX)
+        self._sex = None
+
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            self._other[str(user_id)] = code
+            return
+
+        pending = self._pending
+        if user_id in pending:
+            pending[user_id] = code
+            return
+
+        ids = self._ids
+        index = bisect_left(ids, user_id)
+        if index < len(ids) and ids[index] == user_id:
+            self._codes[index] = code
+            return
+
+        pending[user_id] = code
+        # 缓冲区上限随用户数增大，使合并的总开销保持线性
+        if len(pending) >= max(USER_BUFFER_LIMIT, len(ids) >> 6):
+            self._compact()
+
+    def update_user_sex(self, user_id: str, sex: str) -> None:
+        """更新用户性别信息"""
+        self.add_user(user_id, sex)
 
     def recalculate_sex_stats(self) -> None:
         """重新计算性别统计信息"""
-        # 重置性别统计
-        self.sex = {"男": 0, "女": 0, "保密": 0}
+        self._sex = None
+
+    def merge(self, other: "Stat") -> None:
+        """合并另一个地区的统计，同一用户以 other 中的性别为准"""
+        self.location += other.location
+        self.like += other.like
+        for index, count in enumerate(other.level[: len(self.level)]):
+            self.level[index] += count
+        for user_id, code in other._iter_codes():
+            self.add_user(user_id, SEX_NAMES[code])
+
+    def _compact(self) -> None:
+        """把缓冲区合并到有序数组"""
+        if not self._pending:
+            return
+        # 缓冲区远小于有序数组，按插入位置分段复制，避免整体重新排序
+        old_ids = self._ids
+        old_codes = self._codes
+        ids = array("q")
+        codes = array("b")
+        start = 0
+        for user_id in sorted(self._pending):
+            index = bisect_left(old_ids, user_id, start)
+            ids.extend(old_ids[start:index])
+            codes.extend(old_codes[start:index])
+            ids.append(user_id)
+            codes.append(self._pending[user_id])
+            start = index
+        ids.extend(old_ids[start:])
+        codes.extend(old_codes[start:])
+        self._ids = ids
+        self._codes = codes
+        self._pending = {}
 
-        # 根据用户性别映射重新计算
-        for user_id, sex in self.user_sex_map.items():
-            if sex in self.sex:
-                self.sex[sex] += 1
+    def _iter_codes(self) -> Iterator[Tuple[Any, int]]:
+        """遍历 (用户ID, 性别编码)，整数ID按从小到大的顺序"""
+        self._compact()
+        yield from zip(self._ids, self._codes)
+        yield from self._other.items()
 
     def to_dict(self) -> Dict[str, Any]:
         """将Stat对象转换为字典，便于序列化"""
         return {
             "name": self.name,
             "location": self.location,
-            "sex": self.sex,
-            "level": self.level,
+            "sex": dict(self.sex),
+            "level": list(self.level),
             "like": self.like,
-            "users": len(self.users),  # 只保存用户数量
-            "user_sex_map": self.user_sex_map,
+            "users": self.user_count,  # 只保存用户数量
+            "user_sex_map": dict(self.user_sex_map.items()),
         }
 
     @classmethod
@@ -137,26 +353,70 @@ class Stat:
         # 加载性别统计
         sex_data = data.get("sex", {})
         if isinstance(sex_data, dict):
-            stat.sex = {
-                "男": sex_data.get("男", 0),
-                "女": sex_data.get("女", 0),
-                "保密": sex_data.get("保密", 0),
-            }
+            stat.sex = sex_data
 
         # 加载等级统计
         level_data = data.get("level", [])
         if isinstance(level_data, list) and len(level_data) == 7:
-            stat.level = level_data
+            stat.level = list(level_data)
 
-        # 加载用户性别映射
+        # 加载用户性别映射，性别人数按用户重新计算
         user_sex_map = data.get("user_sex_map", {})
         if isinstance(user_sex_map, dict):
             stat.user_sex_map = user_sex_map
 
-            # 重建用户集合
-            stat.users = set(user_sex_map.keys())
+        return stat
 
-            # 重新计算性别统计
-            stat.recalculate_sex_stats()
 
-        return stat
+class StatUsers(AbstractSet):
+    """Stat 中用户ID的只读集合视图，元素为字符串形式的用户ID"""
+
+    __slots__ = ("_stat",)
+
+    def __init__(self, stat: Stat):
+        self._stat = stat
+
+    def __len__(self) -> int:
+        return self._stat.user_count
+
+    def __iter__(self) -> Iterator[str]:
+        for user_id, _ in self._stat._iter_codes():
+            yield str(user_id)
+
+    def __contains__(self, user_id) -> bool:
+        return StatUserSexMap(self._stat).get(user_id) is not None
+
+
+class StatUserSexMap(Mapping):
+    """Stat 中用户ID到性别的只读字典视图"""
+
+    __slots__ = ("_stat",)
+
+    def __init__(self, stat: Stat):
+        self._stat = stat
+
+    def __len__(self) -> int:
+        return self._stat.user_count
+
+    def __iter__(self) -> Iterator[str]:
+        for user_id, _ in self._stat._iter_codes():
+            yield str(user_id)
+
+    def __getitem__(self, user_id) -> str:
+        stat = self._stat
+        key = str(user_id)
+        if key in stat._other:
+            return SEX_NAMES[stat._other[key]]
+        try:
+            number = int(user_id)
+        except (TypeError, ValueError):
+            raise KeyError(user_id)
+        if number in stat._pending:
+            return SEX_NAMES[stat._pending[number]]
+        index = bisect_left(stat._ids, number)
+        if index < len(stat._ids) and stat._ids[index] == number:
+            return SEX_NAMES[stat._codes[index]]
+        raise KeyError(user_id)
+
+    def items(self):
+        return [(str(user_id), SEX_NAMES[code]) for user_id, code in self._stat._iter_codes()]
@@ -0,0 +1,185 @@
+"""
+Comment 模型的微基准测试
+
+对比原来的 dataclass 实现与当前的 __slots__ 实现：
+每条评论从API响应创建对象的耗时、生成CSV记录的耗时，以及保存大量评论时每条评论占用的内存。
+
+用法：
+    python scripts/bench_comment_model.py --count 100000
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.comment import Comment  # noqa: E402
+
+
+@dataclass
+class LegacyPicture:
+    """原来的图片数据"""
+
+    img_src: str
+
+
+@dataclass
+class LegacyComment:
+    """原来的评论数据（对比基准）"""
+
+    uname: str = ""
+    sex: str = ""
+    content: str = ""
+    rpid: int = 0
+    oid: int = 0
+    bvid: str = ""
+    mid: int = 0
+    parent: int = 0
+    fansgrade: int = 0
+    ctime: int = 0
+    like: int = 0
+    following: bool = False
+    current_level: int = 0
+    location: str = ""
+    pictures: List[LegacyPicture] = field(default_factory=list)
+
+    @classmethod
+    def from_api_response(cls, item: Dict[str, Any]) -> "LegacyComment":
+        pictures = []
+        if "content" in item and "pictures" in item["content"]:
+            pictures = [LegacyPicture(p["img_src"]) for p in item["content"]["pictures"]]
+
+        return cls(
+            uname=item.get("member", {}).get("uname", ""),
+            sex=item.get("member", {}).get("sex", ""),
+            content=item.get("content", {}).get("message", ""),
+            rpid=item.get("rpid", 0),
+            oid=item.get("oid", 0),
+            bvid="",
+            mid=item.get("mid", 0),
+            parent=item.get("parent", 0),
+            fansgrade=item.get("fansgrade", 0),
+            ctime=item.get("ctime", 0),
+            like=item.get("like", 0),
+            following=item.get("reply_control", {}).get("following", False),
+            current_level=item.get("member", {})
+            .get("level_info", {})
+            .get("current_level", 0),
+            location=item.get("reply_control", {})
+            .get("location", "")
+            .replace("IP属地：", ""),
+            pictures=pictures,
+        )
+
+    @property
+    def picture_urls(self) -> List[str]:
+        return [picture.img_src for picture in self.pictures]
+
+
+def make_replies(count: int, picture_ratio: float) -> List[Dict[str, Any]]:
+    """生成与B站评论接口结构相同的评论数据"""
+    replies = []
+    picture_every = int(1 / picture_ratio) if picture_ratio > 0 else 0
+    for i in range(count):
+        content = {"message": f"评论内容 {i} " * 3}
+        if picture_every and i % picture_every == 0:
+            content["pictures"] = [
+                {"img_src": f"https://i0.hdslb.com/bfs/new_dyn/{i:040x}{n}.jpg", "img_width": 800}
+                for n in range(2)
+            ]
+        replies.append(
+            {
+                "rpid": 10**11 + i,
+                "oid": 10**9,
+                "mid": 10**7 + i % 5000,
+                "parent": 0 if i % 3 else 10**11 + i - 1,
+                "fansgrade": i % 2,
+                "ctime": 1_700_000_000 + i,
+                "like": i % 97,
+                "member": {
+                    "uname": f"用户{i % 5000}",
+                    "sex": ("男", "女", "保密")[i % 3],
+                    "level_info": {"current_level": i % 7},
+                },
+                "content": content,
+                "reply_control": {"following": bool(i % 5 == 0), "location": "IP属地：广东"},
+            }
+        )
+    return replies
+
+
+def bench_construct(factory: Callable, replies: List[Dict[str, Any]], repeat: int) -> float:
+    """每条评论的创建耗时（微秒），取多次中最快的一次"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for reply in replies:
+            factory(reply)
+        best = min(best, time.perf_counter() - start)
+    return best / len(replies) * 1e6
+
+
+def bench_record(factory: Callable, replies: List[Dict[str, Any]], repeat: int) -> float:
+    """创建评论并取出图片链接（写CSV时的用法）的耗时（微秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for reply in replies:
+            ";".join(factory(reply).picture_urls)
+        best = min(best, time.perf_counter() - start)
+    return best / len(replies) * 1e6
+
+
+def bench_memory(factory: Callable, replies: List[Dict[str, Any]]) -> float:
+    """保存全部评论对象时每条评论占用的内存（字节），不含共享的字符串"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    comments = [factory(reply) for reply in replies]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del comments
+    return (after - before) / len(replies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Comment 模型微基准测试")
+    parser.add_argument("--count", type=int, default=100000, help="评论数量")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快的一次")
+    parser.add_argument("--picture-ratio", type=float, default=0.1, help="带图片的评论比例")
+    args = parser.parse_args()
+
+    replies = make_replies(args.count, args.picture_ratio)
+    implementations = [
+        ("dataclass（原实现）", LegacyComment.from_api_response),
+        ("__slots__（当前实现）", Comment.from_api_response),
+    ]
+
+    print(f"评论数 {args.count}，带图片比例 {args.picture_ratio:.0%}")
+    print(f"{'实现':<20}{'创建(µs/条)':>14}{'创建+图片链接(µs/条)':>22}{'内存(字节/条)':>16}")
+    results = []
+    for name, factory in implementations:
+        construct = bench_construct(factory, replies, args.repeat)
+        record = bench_record(factory, replies, args.repeat)
+        memory = bench_memory(factory, replies)
+        results.append((construct, record, memory))
+        print(f"{name:<20}{construct:>14.2f}{record:>22.2f}{memory:>16.0f}")
+
+    (old_construct, old_record, old_memory), (new_construct, new_record, new_memory) = results
+    print(
+        f"创建快 {old_construct / new_construct:.2f} 倍，"
+        f"创建+图片链接快 {old_record / new_record:.2f} 倍，"
+        f"内存减少 {1 - new_memory / old_memory:.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,42 @@
 """
 
 from .csv_analyzer import normalize_location, generate_map_from_csv
-from .csv_exporter import save_to_csv
+from .columnar_stats import PANDAS_AVAILABLE, map_stats_columnar
+from .csv_exporter import CsvSink, save_to_csv
 from .geo_exporter import write_geojson
-from .image_downloader import download_images, download_images_from_csv
+from .geo_matcher import GeoMatcher, get_geo_matcher
+from .job_store import JobStore, get_job_store
+from .rpid_set import RpidSet
+from .image_downloader import (
+    ImageDownloader,
+    download_images,
+    download_images_from_csv,
+    get_image_downloader,
+)
+from .image_queue import ImageQueue, get_image_queue
+from .image_store import ImageStore, get_image_store
 from .wordcloud_exporter import generate_wordcloud_from_csv
 
 __all__ = [
     'normalize_location',
     'generate_map_from_csv', 
+    'PANDAS_AVAILABLE',
+    'map_stats_columnar',
+    'CsvSink',
     'save_to_csv',
     'write_geojson',
+    'GeoMatcher',
+    'get_geo_matcher',
+    'ImageDownloader',
+    'get_image_downloader',
     'download_images',
     'download_images_from_csv',
+    'ImageQueue',
+    'get_image_queue',
+    'ImageStore',
+    'get_image_store',
+    'JobStore',
+    'get_job_store',
+    'RpidSet',
     'generate_wordcloud_from_csv'
 ]
\ No newline at end of file
@@ -0,0 +1,250 @@
+import csv
+import io
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from models.comment import Stat
+
+try:
+    import pandas as pd
+
+    PANDAS_AVAILABLE = True
+except ImportError:
+    pd = None
+    PANDAS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 每次读入的行数
+CHUNK_ROWS = 200_000
+
+# CSV小于该大小（字节）时逐行分析更快，不值得导入 pandas
+COLUMNAR_MIN_SIZE = 8 * 1024 * 1024
+
+# 地图统计需要的列
+MAP_COLUMNS = ["location", "mid", "sex", "like", "level"]
+
+# 检查末尾残缺行时读取的文件末尾字节数，需大于一行的长度
+TAIL_BLOCK = 1024 * 1024
+
+
+def use_columnar(csv_file_path: str) -> bool:
+    """是否使用列式分析：安装了 pandas 且CSV足够大"""
+    if not PANDAS_AVAILABLE:
+        return False
+    try:
+        return Path(csv_file_path).stat().st_size >= COLUMNAR_MIN_SIZE
+    except OSError:
+        return False
+
+
+def _scan_block(block: bytes, in_quotes: bool) -> Optional[Tuple[int, bool]]:
+    """从给定的引号状态开始扫描一段CSV
+
+    csv 模块写出的CSV中，开始引号只出现在字段开头（逗号或换行之后），结束引号之后只能是
+    逗号、换行或文件末尾，字段内的引号写成两个。不符合这些规则时说明起始状态猜错了。
+
+    Returns:
+        (引号外最后一个换行的位置，没有时为-1, 末尾是否在引号内)，不符合规则时返回None
+    """
+    last_newline = -1
+    pos = 0
+    size = len(block)
+    while True:
+        quote = block.find(b'"', pos)
+        if in_quotes:
+            if quote < 0:
+                return last_newline, True
+            following = block[quote + 1 : quote + 2]
+            if following == b'"':
+                pos = quote + 2
+                continue
+            if following and following not in b",\r\n":
+                return None
+            in_quotes = False
+        else:
+            newline = block.rfind(b"\n", pos, size if quote < 0 else quote)
+            if newline >= 0:
+                last_newline = newline
+            if quote < 0:
+                return last_newline, False
+            if quote > 0 and block[quote - 1 : quote] not in b",\n":
+                return None
+            in_quotes = True
+        pos = quote + 1
+
+
+def _short_last_row(csv_file_path: str, width: int) -> Optional[int]:
+    """最后一行列数不足 width 时返回它在文件中的起始位置（字节），否则返回None
+
+    CSV按整行写入，列数不足的残缺行只会是写入中断时的最后一行。pandas 会把缺少的列读成
+    空字符串，无法与空值区分，写到引号内时还会报错，所以单独用 csv 模块解析最后一行。
+    只读取文件末尾的 TAIL_BLOCK 字节：这一段开头是否在引号内（评论内容中可能有换行）未知，
+    两种情况各扫描一次，只有一种符合CSV格式时才能确定最后一行从哪个换行之后开始。
+    """
+    with open(csv_file_path, "rb") as f:
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+        start = max(0, size - TAIL_BLOCK)
+        f.seek(start)
+        block = f.read()
+
+    if start == 0:
+        scans = {_scan_block(block, False)} - {None}
+    else:
+        # 一行不会超过 TAIL_BLOCK，找不到行尾换行的猜测不成立（如整段都在引号内）
+        scans = {
+            scan
+            for scan in (_scan_block(block, False), _scan_block(block, True))
+            if scan is not None and scan[0] >= 0
+        }
+    if len(scans) != 1:
+        logger.debug(f"无法确定CSV最后一行的起始位置: {csv_file_path}")
+        return None
+    last_newline, in_quotes = scans.pop()
+
+    if last_newline < 0:
+        # 只有表头一行
+        return None
+    if not in_quotes and block.endswith(b"\n"):
+        return None
+
+    text = block[last_newline + 1 :].decode("utf-8", errors="replace")
+    row = next(csv.reader(io.StringIO(text, newline="")), [])
+    return start + last_newline + 1 if len(row) < width else None
+
+
+class _HeadReader:
+    """只能读到文件前 limit 字节的文件对象，用于让 pandas 跳过末尾的残缺行"""
+
+    def __init__(self, file, limit: int):
+        self._file = file
+        self._limit = limit
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = max(0, self._limit - self._file.tell())
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self._file.read(size)
+
+    def __iter__(self):
+        return iter(self.read().splitlines(keepends=True))
+
+
+def _clean_category(chunk, name: str, clean: Callable[[str], str]) -> "pd.Series":
+    """按取值清洗分类列，每个不同的取值只处理一次，缺少该列时按空字符串处理"""
+    if name not in chunk:
+        return pd.Series(clean(""), index=chunk.index)
+    column = chunk[name]
+    return column.map({value: clean(str(value)) for value in column.cat.categories})
+
+
+def map_stats_columnar(
+    csv_file_path: str, normalize: Callable[[str], str]
+) -> Tuple[Dict[str, Stat], Dict[str, str]]:
+    """用 pandas 分块读取CSV并按地区向量化汇总，结果与逐行分析相同
+
+    只读取统计需要的列，全部按分类类型读取，清洗、规范化和整数转换只对不同的取值做一次；
+    评论数、点赞数、等级分布用 groupby 计算；
+    每个地区的用户和性别先按 (地区, 用户) 去重保留最后一条，再写入 Stat，
+    Python 层的循环次数与不同用户数相关，与评论数无关。
+    与逐行分析一样跳过列数不足的残缺行，残缺行只在CSV末尾写入中断时出现。
+
+    Args:
+        csv_file_path: CSV文件路径
+        normalize: 地区名称规范化函数
+
+    Returns:
+        (地区 -> 统计, 原始地区名称 -> 规范化后的名称)
+    """
+    stat_map: Dict[str, Stat] = {}
+    location_names: Dict[str, str] = {}
+
+    def clean_location(value: str) -> str:
+        value = value.strip() or "未知"
+        name = location_names.get(value)
+        if name is None:
+            name = location_names[value] = normalize(value)
+        return name
+
+    def clean_mid(value: str) -> str:
+        return value.strip() or "0"
+
+    def clean_sex(value: str) -> str:
+        value = value.strip()
+        return value if value in ("男", "女", "保密") else "保密"
+
+    def clean_int(value: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+
+    def clean_level(value: str) -> int:
+        level = clean_int(value)
+        return level if 0 <= level <= 6 else 0
+
+    def add_chunk(chunk) -> None:
+        """汇总一块数据"""
+        frame = pd.DataFrame(
+            {
+                "location": _clean_category(chunk, "location", clean_location),
+                "mid": _clean_category(chunk, "mid", clean_mid),
+                "sex": _clean_category(chunk, "sex", clean_sex),
+                "like": _clean_category(chunk, "like", clean_int).astype("int64"),
+                "level": _clean_category(chunk, "level", clean_level).astype("int64"),
+            }
+        )
+
+        # 评论数和点赞数
+        totals = frame.groupby("location", sort=False, observed=True)["like"].agg(
+            ["size", "sum"]
+        )
+        for name, count, likes in totals.itertuples():
+            stat = stat_map.get(name)
+            if stat is None:
+                stat = stat_map[name] = Stat(name=name)
+            stat.location += int(count)
+            stat.like += int(likes)
+
+        # 等级分布
+        levels = frame.groupby(["location", "level"], sort=False, observed=True).size()
+        for (name, level_value), count in levels.items():
+            stat_map[name].level[int(level_value)] += int(count)
+
+        # 用户和性别，同一用户以最后一条评论的性别为准
+        users = frame.drop_duplicates(["location", "mid"], keep="last")
+        for name, group in users.groupby("location", sort=False, observed=True):
+            add_user = stat_map[name].add_user
+            for user_id, sex in zip(group["mid"].tolist(), group["sex"].tolist()):
+                add_user(user_id, sex)
+
+    header = pd.read_csv(csv_file_path, nrows=0, encoding="utf-8").columns
+    columns = [column for column in MAP_COLUMNS if column in header]
+
+    width = max(list(header).index(column) for column in columns) + 1 if columns else 0
+    short_row = _short_last_row(csv_file_path, width)
+    if short_row is not None:
+        logger.warning(f"跳过CSV末尾列数不足的残缺行: {csv_file_path}")
+
+    with open(csv_file_path, "rb") as f:
+        chunks = pd.read_csv(
+            f if short_row is None else _HeadReader(f, short_row),
+            usecols=columns,
+            dtype="category",
+            keep_default_na=False,
+            encoding="utf-8",
+            chunksize=CHUNK_ROWS,
+        )
+        for chunk in chunks:
+            add_chunk(chunk)
+
+    return stat_map, location_names
+
+
+def columnar_backend() -> Optional[str]:
+    """可用的列式分析后端名称，没有时返回None"""
+    if PANDAS_AVAILABLE:
+        return f"pandas {pd.__version__}"
+    return None
@@ -1,10 +1,14 @@
 import csv
 import logging
+from array import array
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Tuple
 from models.comment import Stat
 
+from store.columnar_stats import columnar_backend, map_stats_columnar, use_columnar
 from store.geo_exporter import write_geojson
+from store.rpid_set import RpidSet
 from api.bilibili_api import extract_title_from_dirname
 
 logger = logging.getLogger(__name__)
@@ -17,174 +21,179 @@ def normalize_location(location: str) -> str:
     return location
 
 
-def print_location_mapping_debug(csv_file_path: str):
-    """打印CSV中的地区名称与规范化后的映射关系，帮助调试"""
-    try:
-        locations = set()
-        with open(csv_file_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                location = row.get("location", "")
-                if location and location != "未知":
-                    locations.add(location)
-
-        logger.info("地区名称映射关系:")
-        for location in sorted(locations):
-            normalized = normalize_location(location)
-            logger.info(f"  {location} -> {normalized}")
-
-    except Exception as e:
-        logger.error(f"打印地区映射关系出错: {e}")
-
-
-def analyze_csv_for_map(csv_file_path: str) -> Dict[str, Stat]:
-    """分析CSV生成地图数据"""
-    logger.info(f"分析CSV文件: {csv_file_path}")
+def read_comment_index(csv_file_path: str) -> Tuple[RpidSet, int, Dict[int, int]]:
+    """读取CSV中已有评论的索引，用于去重和增量更新
 
-    csv_path = Path(csv_file_path)
-    if not csv_path.exists():
-        logger.error(f"CSV文件不存在: {csv_path}")
-        return {}
-
-    # 从assets获取GeoJSON数据，建立名称映射表
-    from utils.assets_helper import get_geojson_template_path
-    import json
-
-    geo_template_path = get_geojson_template_path()
-    province_map = {}
-
-    if geo_template_path.exists():
-        try:
-            with open(geo_template_path, "r", encoding="utf-8") as f:
-                geojson_data = json.load(f)
-
-            # 构建地区名称映射表
-            # 用于检查是否存在于GeoJSON中
-            for feature in geojson_data["features"]:
-                province = feature["properties"]["name"]
-                province_map[province] = province  # 原名
+    Returns:
+        (已记录的评论ID, 根评论的最新时间戳, 根评论ID -> CSV中的子评论数)
+    """
+    rpids = array("q")
+    parents = {}
+    max_root_ctime = 0
+
+    with open(csv_file_path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rpid = row.get("rpid", "")
+            if not rpid.isdigit():
+                continue
+            rpid = int(rpid)
+            rpids.append(rpid)
+
+            parent = row.get("parent", "0")
+            parent = int(parent) if parent.isdigit() else 0
+            if parent:
+                parents[rpid] = parent
+            else:
+                ctime = row.get("ctime", "0")
+                if ctime.isdigit():
+                    max_root_ctime = max(max_root_ctime, int(ctime))
+
+    # 回复子评论的评论的 parent 是子评论，沿 parent 找到根评论再计数
+    thread_counts = {}
+    for rpid, parent in parents.items():
+        root = parent
+        seen = 0
+        while root in parents and seen < len(parents):
+            root = parents[root]
+            seen += 1
+        thread_counts[root] = thread_counts.get(root, 0) + 1
+
+    return RpidSet(rpids), max_root_ctime, thread_counts
+
+
+def _map_stats_rows(csv_path: Path) -> Tuple[Dict[str, Stat], Dict[str, str]]:
+    """逐行分析CSV，返回 (地区 -> 统计, 原始地区名称 -> 规范化后的名称)"""
+    stat_map = {}
+    # 原始地区名称 -> 规范化后的名称，作为分析的副产物输出映射关系
+    location_names = {}
+
+    # 只读取一遍CSV，按表头中的位置取需要的列
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header_fields = [field.strip() for field in next(reader, [])]
+        logger.info(f"CSV文件包含以下列: {header_fields}")
+
+        # 检查是否包含必要的列
+        required_fields = ["location", "mid", "sex", "like", "level"]
+        missing_fields = [
+            field for field in required_fields if field not in header_fields
+        ]
+        if missing_fields:
+            logger.warning(f"CSV文件缺少以下列: {missing_fields}")
+
+        columns = [
+            header_fields.index(field) if field in header_fields else -1
+            for field in required_fields
+        ]
+        width = max(columns) + 1
+        if missing_fields:
+            # 缺少的列按空字符串处理
+            def get_fields(row):
+                return tuple(row[index] if index >= 0 else "" for index in columns)
+        else:
+            get_fields = itemgetter(*columns)
+
+        for row in reader:
+            try:
+                if len(row) < width:
+                    raise ValueError(f"列数不足 {len(row)}/{width}")
+                location, user_id, sex, like_str, level_str = get_fields(row)
+
+                # 处理位置信息
+                location = location.strip()
+                if not location:
+                    location = "未知"  # 确保未知地区也被统计
+
+                # 使用规范化函数处理地区名称，每个地区名称只处理一次
+                normalized_location = location_names.get(location)
+                if normalized_location is None:
+                    normalized_location = normalize_location(location)
+                    location_names[location] = normalized_location
 
-            logger.info(f"已建立地区映射表，包含 {len(province_map)} 个地区")
-        except Exception as e:
-            logger.error(f"读取GeoJSON模板失败: {e}")
-    else:
-        logger.warning(f"GeoJSON模板文件不存在: {geo_template_path}")
+                # 获取用户ID
+                user_id = user_id.strip() or "0"
 
-    stat_map = {}
-    user_maps = {}  # 存储每个地区的用户ID映射，用于调试
+                # 处理性别信息
+                sex = sex.strip()
+                if sex not in ("男", "女", "保密"):
+                    sex = "保密"  # 确保性别值有效
 
-    try:
-        # 首先检查CSV文件的列名
-        with open(csv_path, "r", encoding="utf-8") as f:
-            first_line = f.readline().strip()
-            header_fields = [field.strip() for field in first_line.split(",")]
-            logger.info(f"CSV文件包含以下列: {header_fields}")
-
-            # 检查是否包含必要的列
-            required_fields = ["location", "mid", "sex", "like", "level"]
-            missing_fields = [
-                field for field in required_fields if field not in header_fields
-            ]
-            if missing_fields:
-                logger.warning(f"CSV文件缺少以下列: {missing_fields}")
-
-        # 读取和处理CSV数据
-        with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # 从CSV行创建评论对象
+                # 处理点赞数
                 try:
-                    # 处理位置信息
-                    location = row.get("location", "").strip()
-                    if not location or location == "":
-                        location = "未知"  # 确保未知地区也被统计
-
-                    # 获取用户ID
-                    user_id = row.get("mid", "0").strip()
-                    if not user_id:
-                        user_id = "0"
-                    user_id = str(user_id)  # 确保ID是字符串
-
-                    # 使用规范化函数处理地区名称
-                    normalized_location = normalize_location(location)
+                    like = int(like_str)
+                except ValueError:
+                    like = 0
 
-                    # 提取有用的统计数据
-                    # 处理性别信息
-                    sex = row.get("sex", "").strip()
-                    if not sex or sex not in ["男", "女", "保密"]:
-                        sex = "保密"  # 确保性别值有效
-
-                    # 处理点赞数
-                    like_str = row.get("like", "0").strip()
-                    try:
-                        like = int(like_str)
-                    except ValueError:
-                        like = 0
-
-                    # 处理等级
-                    level_str = row.get("level", "0").strip()
-                    try:
-                        level = int(level_str)
-                        if level < 0 or level > 6:
-                            level = 0
-                    except ValueError:
+                # 处理等级
+                try:
+                    level = int(level_str)
+                    if level < 0 or level > 6:
                         level = 0
+                except ValueError:
+                    level = 0
 
-                    # 更新统计信息
-                    if normalized_location in stat_map:
-                        stat = stat_map[normalized_location]
-                        stat.location += 1  # 评论数增加
-                        stat.like += like
-                        if 0 <= level <= 6:
-                            stat.level[level] += 1
+                # 更新统计信息
+                stat = stat_map.get(normalized_location)
+                if stat is None:
+                    stat = Stat(name=normalized_location)
+                    stat_map[normalized_location] = stat
+                stat.add_comment(like, level, user_id, sex)
 
-                        # 添加用户ID到集合
-                        stat.users.add(user_id)
+            except Exception as e:
+                logger.warning(f"处理CSV行时出错: {e}, 行: {row}")
+                continue
 
-                        # 更新用户性别统计
-                        stat.update_user_sex(user_id, sex)
+    return stat_map, location_names
 
-                        # 记录用户ID映射，用于调试
-                        if normalized_location not in user_maps:
-                            user_maps[normalized_location] = set()
-                        user_maps[normalized_location].add(user_id)
-                    else:
-                        # 创建新的统计项
-                        stat = Stat(name=normalized_location, location=1, like=like)
-                        if 0 <= level <= 6:
-                            stat.level[level] += 1
 
-                        # 添加用户ID到集合
-                        stat.users.add(user_id)
+def analyze_csv_for_map(csv_file_path: str, log_mapping: bool = False) -> Dict[str, Stat]:
+    """分析CSV生成地图数据
 
-                        # 更新用户性别统计
-                        stat.update_user_sex(user_id, sex)
+    流式读取一遍CSV，只解析统计需要的列，内存占用与地区数和用户数有关，与评论数无关。
+    安装了 pandas 且CSV较大时使用列式分析（见 store.columnar_stats），结果相同。
 
-                        # 记录用户ID映射，用于调试
-                        user_maps[normalized_location] = {user_id}
+    Args:
+        csv_file_path: CSV文件路径
+        log_mapping: 是否输出地区名称与规范化后名称的映射关系，帮助调试
+    """
+    logger.info(f"分析CSV文件: {csv_file_path}")
 
-                        stat_map[normalized_location] = stat
+    csv_path = Path(csv_file_path)
+    if not csv_path.exists():
+        logger.error(f"CSV文件不存在: {csv_path}")
+        return {}
 
-                except Exception as e:
-                    logger.warning(f"处理CSV行时出错: {e}, 行: {row}")
-                    continue
-
-            # 打印用户统计信息，用于调试
-            for location, users in user_maps.items():
-                user_count = len(users)
-                if location in stat_map:
-                    stat = stat_map[location]
-                    # 重新计算性别统计，确保准确
-                    stat.recalculate_sex_stats()
-                    logger.info(
-                        f"地区 '{location}' 有 {user_count} 位用户, {stat.location} 条评论"
-                    )
-                    logger.info(
-                        f"性别统计: 男 {stat.sex.get('男', 0)}人, 女 {stat.sex.get('女', 0)}人, 保密 {stat.sex.get('保密', 0)}人"
-                    )
-
-            logger.info(f"已分析 {len(stat_map)} 个地区的统计信息")
-            return stat_map
+    try:
+        stat_map = None
+        if use_columnar(str(csv_path)):
+            try:
+                stat_map, location_names = map_stats_columnar(
+                    str(csv_path), normalize_location
+                )
+                logger.info(f"已使用列式分析（{columnar_backend()}）")
+            except Exception as e:
+                logger.warning(f"列式分析失败，改为逐行分析: {e}")
+                stat_map = None
+        if stat_map is None:
+            stat_map, location_names = _map_stats_rows(csv_path)
+
+        if log_mapping:
+            logger.info("地区名称映射关系:")
+            for location in sorted(location_names):
+                if location != "未知":
+                    logger.info(f"  {location} -> {location_names[location]}")
+
+        # 打印用户统计信息，用于调试
+        for location, stat in stat_map.items():
+            logger.info(
+                f"地区 '{location}' 有 {len(stat.users)} 位用户, {stat.location} 条评论"
+            )
+            logger.info(
+                f"性别统计: 男 {stat.sex.get('男', 0)}人, 女 {stat.sex.get('女', 0)}人, 保密 {stat.sex.get('保密', 0)}人"
+            )
+
+        logger.info(f"已分析 {len(stat_map)} 个地区的统计信息")
+        return stat_map
 
     except Exception as e:
         logger.error(f"分析CSV文件出错: {e}")
@@ -198,11 +207,8 @@ def generate_map_from_csv(csv_file_path: str, output_dir: str) -> bool:
     """从CSV文件生成地图"""
 
     try:
-        # 打印地区名称映射关系，帮助调试
-        print_location_mapping_debug(csv_file_path)
-
-        # 分析CSV得到统计数据
-        stat_map = analyze_csv_for_map(csv_file_path)
+        # 分析CSV得到统计数据，同时打印地区名称映射关系，帮助调试
+        stat_map = analyze_csv_for_map(csv_file_path, log_mapping=True)
 
         if not stat_map:
             logger.warning("没有找到足够的地区数据来生成地图")
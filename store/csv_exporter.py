@@ -1,17 +1,19 @@
 import csv
 import logging
+import os
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from models.comment import Comment
-from store.image_downloader import download_images
+from store.image_queue import ImageQueue, get_image_queue
 
 logger = logging.getLogger(__name__)
 
 
 def comment_to_record(comment: Comment) -> List[str]:
     """将评论对象转换为CSV记录"""
-    pic_urls = ";".join(pic.img_src for pic in comment.pictures)
+    pic_urls = ";".join(comment.picture_urls)
 
     return [
         comment.bvid,  # BV号
@@ -32,6 +34,152 @@ def comment_to_record(comment: Comment) -> List[str]:
     ]
 
 
+# CSV表头
+CSV_HEADERS = [
+    "bvid",
+    "upname",
+    "sex",
+    "content",
+    "pictures",
+    "rpid",
+    "oid",
+    "mid",
+    "parent",
+    "fans_grade",
+    "ctime",
+    "like",
+    "following",
+    "level",
+    "location",
+]
+
+# 写缓冲区大小（字节），写满后自动写入磁盘
+SINK_BUFFER_SIZE = 1024 * 1024
+
+# 距上次写入磁盘超过该时间（秒）后需要刷新
+SINK_FLUSH_INTERVAL = 5.0
+
+
+class CsvSink:
+    """整个爬取过程中保持打开的CSV写入器
+
+    评论先写入大缓冲区，缓冲区写满时自动写入磁盘，另外距上次刷新超过 flush_interval 秒时
+    flush_due 为真，由调用方在合适的时机调用 checkpoint() 刷新并同步到磁盘。
+    与 save_to_csv 每页重新打开文件相比，省去了每页的目录检查、打开关闭文件和创建 writer。
+    启用图片下载时，图片只加入后台下载队列，写入不等待下载完成。
+
+    用法：
+        with CsvSink("BV1xx411c7mD", output_dir, title) as sink:
+            sink.write(comments)
+            size = sink.checkpoint()
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        output_dir: str,
+        title: str = None,
+        overwrite: bool = False,
+        buffer_size: int = SINK_BUFFER_SIZE,
+        flush_interval: float = SINK_FLUSH_INTERVAL,
+        image_queue: Optional[ImageQueue] = None,
+    ):
+        """初始化写入器
+
+        Args:
+            filename: BV号
+            output_dir: 输出目录
+            title: 视频标题，如果提供则用于日志显示
+            overwrite: 是否覆盖现有文件，True时会清空现有数据重新写入
+            buffer_size: 写缓冲区大小（字节）
+            flush_interval: 刷新间隔（秒）
+            image_queue: 图片下载队列，默认使用进程内共享的队列
+        """
+        from config import Config
+
+        self.output_path = Path(output_dir)
+        self.csv_path = self.output_path / f"{filename}.csv"
+        self.display_name = f"{filename} ({title})" if title else filename
+        self.overwrite = overwrite
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.download_images = Config().get("download_images", False)
+        self.image_queue = image_queue
+
+        self.written = 0  # 写入的评论数
+        self.images = 0  # 加入下载队列的图片数
+        self._file = None
+        self._writer = None
+        self._last_flush = 0.0
+
+    def __enter__(self) -> "CsvSink":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """打开CSV文件，新文件或覆盖时写入表头"""
+        self.output_path.mkdir(parents=True, exist_ok=True)
+
+        mode = "w" if self.overwrite or not self.csv_path.exists() else "a"
+        self._file = open(
+            self.csv_path, mode, newline="", encoding="utf-8", buffering=self.buffer_size
+        )
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(CSV_HEADERS)
+        self._last_flush = time.monotonic()
+
+    @property
+    def flush_due(self) -> bool:
+        """距上次刷新是否已超过刷新间隔"""
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def write(self, comments: List[Comment]) -> int:
+        """写入评论，跳过没有用户名的评论，返回写入的条数"""
+        valid_comments = 0
+        for comment in comments:
+            if not comment.uname:
+                continue
+
+            # 根据配置决定是否下载图片，图片在后台下载
+            if self.download_images and comment.pictures:
+                if self.image_queue is None:
+                    self.image_queue = get_image_queue()
+                self.images += self.image_queue.submit(
+                    comment.uname, comment.pictures, str(self.output_path / "images")
+                )
+
+            self._writer.writerow(comment_to_record(comment))
+            valid_comments += 1
+
+        self.written += valid_comments
+        return valid_comments
+
+    def flush(self) -> None:
+        """把缓冲区写入文件"""
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self) -> int:
+        """刷新并同步到磁盘，返回文件大小（字节），可作为恢复时的截断位置"""
+        self.flush()
+        os.fsync(self._file.fileno())
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self) -> None:
+        """刷新并关闭文件"""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        finally:
+            self._file = None
+            self._writer = None
+
+
 def save_to_csv(
     filename: str, comments: List[Comment], output_dir: str, title: str = None, overwrite: bool = False
 ) -> None:
@@ -47,109 +195,25 @@ def save_to_csv(
     if not comments:
         return
 
-    # 获取配置以决定是否下载图片
-    from config import Config
-    config = Config()
-    should_download_images = config.get("download_images", False)
-
-    # 确保输出目录存在
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
+    sink = CsvSink(filename, output_dir, title, overwrite)
+    create_new_file = overwrite or not sink.csv_path.exists()
+    try:
+        with sink:
+            valid_comments = sink.write(comments)
 
-    # CSV文件路径
-    csv_path = output_path / f"{filename}.csv"
-
-    # 用于日志显示的名称
-    display_name = f"{filename} ({title})" if title else filename
+        if create_new_file:
+            action = "覆盖写入" if overwrite else "创建并写入"
+            logger.info(f"成功{action} {valid_comments} 条评论到 {sink.display_name}")
+        else:
+            logger.info(f"成功追加 {valid_comments} 条评论到 {sink.display_name}")
 
-    # 判断是否需要创建新文件或覆盖
-    create_new_file = not csv_path.exists() or overwrite
-    
-    if create_new_file:
-        # 创建新文件或覆盖现有文件
-        try:
-            with open(csv_path, "w", newline="", encoding="utf-8") as file:
-                writer = csv.writer(file)
-
-                # 写入表头
-                headers = [
-                    "bvid",
-                    "upname", 
-                    "sex",
-                    "content",
-                    "pictures",
-                    "rpid",
-                    "oid",
-                    "mid",
-                    "parent",
-                    "fans_grade",
-                    "ctime",
-                    "like",
-                    "following",
-                    "level",
-                    "location",
-                ]
-                writer.writerow(headers)
-
-                # 写入评论
-                valid_comments = 0
-                downloaded_images = 0
-                for comment in comments:
-                    if not comment.uname:
-                        continue
-
-                    # 根据配置决定是否下载图片
-                    if should_download_images and comment.pictures:
-                        download_images(
-                            comment.uname, comment.pictures, str(output_path / "images")
-                        )
-                        downloaded_images += len(comment.pictures)
-
-                    # 写入评论
-                    record = comment_to_record(comment)
-                    writer.writerow(record)
-                    valid_comments += 1
+        if sink.download_images and sink.images > 0:
+            logger.info(f"已将 {sink.images} 张图片加入后台下载队列")
+        elif not sink.download_images:
+            logger.info("已跳过图片下载（可在设置中启用或使用【获取图片】按钮）")
 
-            action = "覆盖写入" if overwrite else "创建并写入"
-            logger.info(f"成功{action} {valid_comments} 条评论到 {display_name}")
-            
-            if should_download_images and downloaded_images > 0:
-                logger.info(f"已下载 {downloaded_images} 张图片")
-            elif not should_download_images:
-                logger.info("已跳过图片下载（可在设置中启用或使用【获取图片】按钮）")
-
-        except Exception as e:
+    except Exception as e:
+        if create_new_file:
             logger.error(f"{'覆盖' if overwrite else '创建'}CSV文件失败: {e}")
-    else:
-        # 追加到现有文件
-        try:
-            with open(csv_path, "a", newline="", encoding="utf-8") as file:
-                writer = csv.writer(file)
-
-                valid_comments = 0
-                downloaded_images = 0
-                for comment in comments:
-                    if not comment.uname:
-                        continue
-
-                    # 根据配置决定是否下载图片
-                    if should_download_images and comment.pictures:
-                        download_images(
-                            comment.uname, comment.pictures, str(output_path / "images")
-                        )
-                        downloaded_images += len(comment.pictures)
-
-                    # 写入评论
-                    record = comment_to_record(comment)
-                    writer.writerow(record)
-                    valid_comments += 1
-
-            logger.info(f"成功追加 {valid_comments} 条评论到 {display_name}")
-            
-            if should_download_images and downloaded_images > 0:
-                logger.info(f"已下载 {downloaded_images} 张图片")
-            elif not should_download_images:
-                logger.info("已跳过图片下载（可在设置中启用或使用【获取图片】按钮）")
-
-        except Exception as e:
+        else:
             logger.error(f"追加CSV文件失败: {e}")
@@ -2,8 +2,10 @@ import json
 import logging
 from pathlib import Path
 from typing import Dict
-from utils.assets_helper import get_geojson_template_path, get_template_path
+from utils.assets_helper import get_template_path
+from utils.geo_template import copy_geo_template
 from models.comment import Stat
+from store.geo_matcher import get_geo_matcher
 
 logger = logging.getLogger(__name__)
 
@@ -27,15 +29,6 @@ def write_geojson(
             logger.error(f"创建输出目录失败: {e}")
             return unmatched_regions
 
-        # 读取模板GeoJSON文件
-        geo_template_path = get_geojson_template_path()
-        logger.info(f"GeoJSON模板路径: {geo_template_path}")
-        logger.info(f"GeoJSON模板是否存在: {geo_template_path.exists()}")
-
-        if not geo_template_path.exists():
-            logger.error(f"GeoJSON模板文件不存在: {geo_template_path}")
-            return unmatched_regions
-
         # 确保每个Stat对象都有必要的属性
         for location, stat in stat_map.items():
             if not hasattr(stat, "user_sex_map") or stat.user_sex_map is None:
@@ -56,66 +49,31 @@ def write_geojson(
             user_count = len(stat.users) if hasattr(stat, "users") and stat.users else 0
             logger.info(f"  {location}: {stat.location} 条评论, {user_count} 位用户")
 
-        # 加载GeoJSON模板
-        try:
-            with open(geo_template_path, "r", encoding="utf-8") as f:
-                geojson_data = json.load(f)
-            logger.info("成功加载GeoJSON模板")
-        except Exception as e:
-            logger.error(f"加载GeoJSON模板失败: {e}")
+        # 复制一份GeoJSON模板，模板在进程内只解析一次，geometry 与模板共用
+        geojson_data = copy_geo_template()
+        if geojson_data is None:
             return unmatched_regions
 
         # 创建地区名称映射
         location_to_feature = {}  # 记录每个location匹配到的feature name
         merged_stats = {}  # 记录合并后的统计数据
 
-        # 处理每个location进行匹配
+        # 处理每个location进行匹配，匹配表只创建一次，每个地区一次字典查找
+        matcher = get_geo_matcher()
+        if matcher is None:
+            return unmatched_regions
         for location, stat in list(stat_map.items()):
-            matched = False
+            feature_name = matcher.match(location)
+            matched = feature_name is not None
 
-            # 遍历所有feature寻找匹配
-            for feature in geojson_data["features"]:
-                feature_name = feature["properties"]["name"]
-                feature_fullname = feature["properties"].get("fullname", "")
+            if matched:
+                location_to_feature[location] = feature_name
 
-                # 简单匹配: location与name/fullname其中之一匹配
-                if (
-                    location == feature_name
-                    or location == feature_fullname
-                    or location in feature_name
-                    or location in feature_fullname
-                    or feature_name in location
-                    or (feature_fullname and feature_fullname in location)
-                ):
-
-                    matched = True
-                    location_to_feature[location] = feature_name
-
-                    # 如果已有统计数据，合并
-                    if feature_name in merged_stats:
-                        existing_stat = merged_stats[feature_name]
-                        existing_stat.location += stat.location
-                        existing_stat.like += stat.like
-
-                        # 合并用户集合
-                        if hasattr(stat, "users") and stat.users:
-                            existing_stat.users.update(stat.users)
-
-                        # 合并等级统计
-                        if hasattr(stat, "level") and hasattr(existing_stat, "level"):
-                            for i in range(
-                                min(len(stat.level), len(existing_stat.level))
-                            ):
-                                existing_stat.level[i] += stat.level[i]
-
-                        # 合并性别统计
-                        if hasattr(stat, "user_sex_map") and stat.user_sex_map:
-                            for user_id, sex in stat.user_sex_map.items():
-                                existing_stat.update_user_sex(user_id, sex)
-                    else:
-                        merged_stats[feature_name] = stat
-
-                    break  # 找到匹配后跳出循环
+                # 如果已有统计数据，合并评论数、点赞数、等级和用户
+                if feature_name in merged_stats:
+                    merged_stats[feature_name].merge(stat)
+                else:
+                    merged_stats[feature_name] = stat
 
             # 如果未匹配，记录
             if not matched:
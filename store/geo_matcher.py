@@ -0,0 +1,151 @@
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 省级行政区名称的后缀，按长度从长到短去除，得到“广东”“内蒙古”这样的简称
+REGION_SUFFIXES = (
+    "维吾尔自治区",
+    "壮族自治区",
+    "回族自治区",
+    "特别行政区",
+    "自治区",
+    "省",
+    "市",
+)
+
+# B站IP属地中常见的特殊地区和国外地区，建表时预先计算匹配结果
+LOCATION_ALIASES = (
+    "未知",
+    "中国",
+    "中国香港",
+    "中国澳门",
+    "中国台湾",
+    "美国",
+    "日本",
+    "韩国",
+    "英国",
+    "法国",
+    "德国",
+    "意大利",
+    "西班牙",
+    "荷兰",
+    "瑞士",
+    "瑞典",
+    "爱尔兰",
+    "俄罗斯",
+    "加拿大",
+    "澳大利亚",
+    "新西兰",
+    "新加坡",
+    "马来西亚",
+    "泰国",
+    "越南",
+    "菲律宾",
+    "印度尼西亚",
+    "印度",
+    "阿联酋",
+    "巴西",
+)
+
+# 未预先计算的地区名称最多缓存的数量
+MATCH_CACHE_LIMIT = 4096
+
+
+def _short_name(name: str) -> str:
+    """去掉行政区后缀的简称，没有后缀时原样返回"""
+    for suffix in REGION_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+class GeoMatcher:
+    """地区名称 -> GeoJSON 省级 feature 名称的匹配表
+
+    匹配规则与逐个 feature 比较时相同：按 feature 的顺序，取第一个满足
+    地区名称与 name/fullname 相等或互相包含的 feature。
+    建表时对所有 name、fullname、简称和常见的特殊地区、国外地区预先计算结果，
+    其余名称第一次出现时按规则计算一次并缓存，之后每次匹配都是一次字典查找。
+    """
+
+    def __init__(self, features: Iterable[Dict[str, Any]]):
+        """初始化匹配表
+
+        Args:
+            features: GeoJSON 的 features 列表
+        """
+        self._features: List[Tuple[str, str]] = []
+        for feature in features:
+            properties = feature["properties"]
+            self._features.append((properties["name"], properties.get("fullname", "")))
+
+        self._matches: Dict[str, Optional[str]] = {}
+        for name, fullname in self._features:
+            for alias in (name, fullname, _short_name(name)):
+                self._precompute(alias)
+        for alias in LOCATION_ALIASES:
+            self._precompute(alias)
+        self._precomputed = len(self._matches)
+
+    def _precompute(self, location: Optional[str]) -> None:
+        if location and location not in self._matches:
+            self._matches[location] = self._scan(location)
+
+    def _scan(self, location: str) -> Optional[str]:
+        """逐个 feature 比较，返回第一个匹配的 feature 名称"""
+        for feature_name, feature_fullname in self._features:
+            if (
+                location == feature_name
+                or location == feature_fullname
+                or location in feature_name
+                or location in feature_fullname
+                or feature_name in location
+                or (feature_fullname and feature_fullname in location)
+            ):
+                return feature_name
+        return None
+
+    def match(self, location: str) -> Optional[str]:
+        """返回地区匹配到的 feature 名称，未匹配时返回None"""
+        try:
+            return self._matches[location]
+        except KeyError:
+            pass
+
+        feature_name = self._scan(location)
+        if len(self._matches) - self._precomputed < MATCH_CACHE_LIMIT:
+            self._matches[location] = feature_name
+        return feature_name
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+
+_geo_matcher: Optional[GeoMatcher] = None
+_geo_matcher_lock = threading.Lock()
+
+
+def get_geo_matcher() -> Optional[GeoMatcher]:
+    """获取根据 china-provinces.geojson 创建的共享匹配表
+
+    模板读取失败时返回None且不缓存，下次调用会重试。
+    """
+    global _geo_matcher
+
+    if _geo_matcher is None:
+        with _geo_matcher_lock:
+            if _geo_matcher is None:
+                from utils.geo_template import load_geo_template
+
+                geo_template = load_geo_template()
+                if geo_template is None:
+                    logger.error("GeoJSON模板加载失败，无法创建地区匹配表")
+                    return None
+                _geo_matcher = GeoMatcher(geo_template["features"])
+                logger.info(
+                    f"地区匹配表已创建: {len(_geo_matcher)} 个地区，"
+                    f"{_geo_matcher._precomputed} 个预先计算的名称"
+                )
+    return _geo_matcher
@@ -1,50 +1,352 @@
+import importlib.util
 import logging
+import os
 import threading
+import time
 import csv
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
 import httpx
 
+from api.rate_limiter import TokenBucket
 from models.comment import Picture
 from config import Config
+from store.image_manifest import MANIFEST_NAME, ImageManifest
+from store.image_store import ImageStore, get_image_store
+
+# 安装了 h2 时启用 HTTP/2，同一服务器的多张图片复用一个连接
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
 config = Config()
 
 logger = logging.getLogger(__name__)
 
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# 流式下载时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+# 支持缩放和转码的B站图片服务器域名
+IMAGE_SERVER_SUFFIX = ".hdslb.com"
+
+# 图片下载格式：original 原图，webp/avif 由图片服务器转码
+IMAGE_PROFILES = ("original", "webp", "avif")
+
+
+def apply_image_profile(
+    image_url: str, profile: Optional[str] = None, width: Optional[int] = None
+) -> str:
+    """按下载格式改写图片URL，如 xxx.jpg -> xxx.jpg@300w.webp
+
+    只改写B站图片服务器的URL，其它URL和 original 格式原样返回。CSV中始终保存原始URL，
+    只有实际下载时使用改写后的URL。
+
+    Args:
+        image_url: 原始图片URL
+        profile: 下载格式，默认使用配置中的 image_profile
+        width: 缩放后的宽度（像素），0 表示保持原宽度，默认使用配置中的 image_width
+    """
+    if profile is None:
+        profile = config.get("image_profile", "original")
+    if profile not in IMAGE_PROFILES or profile == "original":
+        return image_url
+
+    host = urlsplit(image_url).hostname or ""
+    if not host.endswith(IMAGE_SERVER_SUFFIX):
+        return image_url
+
+    if width is None:
+        width = config.get("image_width", 0)
+    # 去掉URL中已有的处理参数
+    base = image_url.split("@", 1)[0]
+    size = f"{width}w" if width and width > 0 else ""
+    return f"{base}@{size}.{profile}"
+
+
+def image_output_file(image_url: str, output_dir: str, prefix: str) -> Path:
+    """图片保存路径：输出目录/用户名_图片文件名"""
+    img_name = image_url.split("/")[-1]
+    return Path(output_dir) / f"{prefix}_{img_name}"
+
+
+@dataclass
+class HostStats:
+    """单个图片服务器的下载统计"""
+
+    host: str
+    active: int = 0  # 正在下载的数量
+    peak: int = 0  # 最大同时下载数
+    requests: int = 0  # 完成的请求数
+    failed: int = 0  # 失败的请求数
+    bytes: int = 0  # 下载的字节数
+    cached: int = 0  # 命中图片缓存、无需下载的数量
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "host": self.host,
+            "active": self.active,
+            "peak": self.peak,
+            "requests": self.requests,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "cached": self.cached,
+        }
+
+
+class ImageDownloader:
+    """图片下载服务
+
+    所有图片共用一个带连接池的 httpx.Client（安装了 h2 时启用 HTTP/2），
+    避免每张图片都重新建立连接和 TLS 握手；批量下载使用固定大小的线程池，
+    并限制同时排队的任务数，上万张图片也不会一次性创建全部任务。
+    总带宽用令牌桶按字节限速，并按服务器统计同时下载数和流量。
+    启用图片缓存（配置项 image_cache）时图片先下载到 ImageStore，再链接到输出路径，
+    缓存中已有的图片不再下载。
+
+    用法：
+        downloader = get_image_downloader()
+        result = downloader.download_many(items)
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        bandwidth: Optional[float] = None,
+        store: Optional[ImageStore] = None,
+    ):
+        """初始化下载服务
+
+        Args:
+            workers: 同时下载的数量，默认使用配置中的 image_workers
+            bandwidth: 总带宽上限（KB/s），0 表示不限，默认使用配置中的 image_bandwidth
+            store: 图片缓存，默认在配置项 image_cache 开启时使用共享的缓存
+        """
+        if workers is None:
+            workers = config.get("image_workers", 3)
+        if bandwidth is None:
+            bandwidth = config.get("image_bandwidth", 0)
+        if store is None and config.get("image_cache", True):
+            store = get_image_store()
+
+        self.workers = max(1, workers)
+        self.bandwidth = bandwidth
+        self._bucket = (
+            TokenBucket(bandwidth * 1024, burst=bandwidth * 1024) if bandwidth > 0 else None
+        )
+        self.store = store
+
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._hosts: Dict[str, HostStats] = {}
+
+    @property
+    def client(self) -> httpx.Client:
+        """共享的HTTP客户端，首次使用时创建"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        headers={"User-Agent": USER_AGENT},
+                        timeout=10.0,
+                        follow_redirects=True,
+                        http2=HTTP2_AVAILABLE,
+                        limits=httpx.Limits(
+                            max_connections=self.workers * 2,
+                            max_keepalive_connections=self.workers,
+                        ),
+                    )
+        return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """批量下载使用的线程池，首次使用时创建"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="image-download"
+                    )
+        return self._executor
+
+    def host_stats(self) -> List[HostStats]:
+        """各服务器的下载统计，按请求数从多到少排列"""
+        with self._lock:
+            hosts = [HostStats(**vars(stats)) for stats in self._hosts.values()]
+        return sorted(hosts, key=lambda stats: stats.requests, reverse=True)
+
+    def describe_hosts(self) -> str:
+        """各服务器下载统计文本"""
+        return "；".join(
+            f"{stats.host}: {stats.requests} 张（失败 {stats.failed}，缓存 {stats.cached}），"
+            f"最多同时 {stats.peak} 个，{stats.bytes / 1024 / 1024:.1f}MB"
+            for stats in self.host_stats()
+        )
+
+    def _host(self, image_url: str) -> HostStats:
+        """图片服务器的统计（调用方需持有锁）"""
+        host = urlsplit(image_url).hostname or ""
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats(host)
+        return stats
+
+    def download(self, image_url: str, output_file: Path) -> int:
+        """下载一张图片到输出路径，返回下载的字节数，命中缓存时为0
+
+        下载失败时抛出异常，由调用方处理。
+        """
+        if self.store is None:
+            return self._fetch(image_url, output_file)
+
+        # 同一张图片同时只有一个线程下载，其它线程等待后直接链接
+        with self.store.lock_for(image_url):
+            if self.store.link(image_url, output_file):
+                with self._lock:
+                    self._host(image_url).cached += 1
+                return 0
+            size = self._fetch(image_url, self.store.object_path(image_url))
+            self.store.link(image_url, output_file)
+        return size
+
+    def _fetch(self, image_url: str, output_file: Path) -> int:
+        """流式下载一张图片，先写入临时文件，完成后再改名，返回字节数"""
+        with self._lock:
+            stats = self._host(image_url)
+            stats.active += 1
+            stats.peak = max(stats.peak, stats.active)
+
+        output_file = Path(output_file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = output_file.with_name(output_file.name + ".part")
+
+        size = 0
+        failed = True
+        try:
+            with self.client.stream("GET", image_url) as response:
+                response.raise_for_status()
+                with open(temp_file, "wb") as f:
+                    for chunk in response.iter_bytes(CHUNK_SIZE):
+                        if self._bucket is not None:
+                            self._bucket.acquire(len(chunk))
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(temp_file, output_file)
+            failed = False
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+            with self._lock:
+                stats.active -= 1
+                stats.requests += 1
+                stats.bytes += size
+                if failed:
+                    stats.failed += 1
+        return size
+
+    def download_many(
+        self,
+        items: Iterable[Tuple[str, Path]],
+        on_done: Optional[Callable[[str, Path, Optional[Exception]], None]] = None,
+    ) -> Dict[str, int]:
+        """用线程池批量下载图片，已存在的文件跳过
+
+        Args:
+            items: (图片URL, 保存路径) 列表，可以是生成器
+            on_done: 每张图片完成后的回调 (图片URL, 保存路径, 异常)，成功时异常为None
+
+        Returns:
+            统计：downloaded、skipped、failed、bytes
+        """
+        result = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
+        result_lock = threading.Lock()
+        # 限制已提交未完成的任务数，生成器按需读取
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def run(image_url: str, output_file: Path) -> None:
+            error = None
+            try:
+                size = self.download(image_url, output_file)
+                with result_lock:
+                    result["downloaded"] += 1
+                    result["bytes"] += size
+                logger.debug(f"图片下载成功: {output_file}")
+            except Exception as e:
+                error = e
+                with result_lock:
+                    result["failed"] += 1
+                logger.error(f"下载图片失败 ({image_url}): {e}")
+            finally:
+                slots.release()
+            if on_done is not None:
+                # 回调出错不能中断或掩盖整批下载
+                try:
+                    on_done(image_url, output_file, error)
+                except Exception as e:
+                    logger.error(f"图片下载回调出错 ({image_url}): {e}")
+
+        futures = []
+        submitted = set()  # 同一批中重复的图片只下载一次
+        for image_url, output_file in items:
+            output_file = Path(output_file)
+            if output_file in submitted or output_file.exists():
+                result["skipped"] += 1
+                continue
+            submitted.add(output_file)
+            slots.acquire()
+            futures.append(self.executor.submit(run, image_url, output_file))
+            # 只保留未完成的任务，避免上万张图片时列表过长
+            if len(futures) > self.workers * 4:
+                futures = [future for future in futures if not future.done()]
+
+        for future in futures:
+            future.result()
+        return result
+
+    def close(self) -> None:
+        """关闭线程池和HTTP客户端"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            client, self._client = self._client, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if client is not None:
+            client.close()
+
+
+_image_downloader: Optional[ImageDownloader] = None
+_image_downloader_lock = threading.Lock()
+
+
+def get_image_downloader() -> ImageDownloader:
+    """获取进程内共享的图片下载服务"""
+    global _image_downloader
+
+    if _image_downloader is None:
+        with _image_downloader_lock:
+            if _image_downloader is None:
+                _image_downloader = ImageDownloader()
+    return _image_downloader
+
 
 def download_image(image_url: str, output_dir: str, prefix: str) -> None:
     """下载单张图片"""
     try:
-        # 确保输出目录存在
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        # 获取图片文件名
-        img_name = image_url.split("/")[-1]
-        output_file = output_path / f"{prefix}_{img_name}"
+        image_url = apply_image_profile(image_url)
+        output_file = image_output_file(image_url, output_dir, prefix)
 
         # 如果文件已存在，跳过下载
         if output_file.exists():
             logger.info(f"图片已存在，跳过下载: {output_file}")
             return
 
-        # 发送HTTP请求
-        with httpx.Client() as client:
-            response = client.get(
-                image_url,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                },
-                timeout=10.0,
-            )
-            response.raise_for_status()
-
-            # 保存图片
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-
-            logger.info(f"图片下载成功: {output_file}")
+        get_image_downloader().download(image_url, output_file)
+        logger.info(f"图片下载成功: {output_file}")
 
     except Exception as e:
         logger.error(f"下载图片失败 ({image_url}): {e}")
@@ -55,48 +357,41 @@ def download_images(username: str, pictures: List[Picture], output_dir: str) ->
     if not pictures:
         return
 
-    # 创建线程池
-    threads = []
-    max_threads = config.get("workers", 3)
+    urls = [apply_image_profile(picture.img_src) for picture in pictures]
+    get_image_downloader().download_many(
+        (url, image_output_file(url, output_dir, username)) for url in urls
+    )
 
-    for picture in pictures:
-        # 如果线程池已满，等待一个线程完成
-        while len(threads) >= max_threads:
-            for t in threads[:]:
-                if not t.is_alive():
-                    threads.remove(t)
+def download_images_from_csv(csv_file_path: str) -> Dict[str, float]:
+    """从CSV文件中提取图片链接并下载图片
 
-        # 创建并启动新线程
-        thread = threading.Thread(
-            target=download_image, args=(picture.img_src, output_dir, username)
-        )
-        thread.daemon = True
-        thread.start()
-        threads.append(thread)
+    逐行读取CSV，把图片交给共享的下载服务并发下载。下载结果记录在 images/manifest.json，
+    重新运行时清单中已完成的图片直接跳过，只重试失败的和新增的图片。
 
-    # 等待所有线程完成
-    for thread in threads:
-        thread.join()
+    Returns:
+        统计：downloaded、skipped、failed、bytes、elapsed、images_per_sec、mb_per_sec
+    """
+    result: Dict[str, float] = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
 
-def download_images_from_csv(csv_file_path: str) -> None:
-    """从CSV文件中提取图片链接并下载图片"""
     csv_path = Path(csv_file_path)
     if not csv_path.exists():
         logger.error(f"CSV文件不存在: {csv_path}")
-        return
+        return result
 
     # 图片输出目录
     images_dir = csv_path.parent / "images"
     images_dir.mkdir(parents=True, exist_ok=True)
 
-    downloaded_count = 0
-    skipped_count = 0
-    error_count = 0
+    manifest = ImageManifest.load(images_dir / MANIFEST_NAME)
+    row_errors = 0
+    known_skipped = 0
 
-    try:
+    def iter_images():
+        """逐行读取CSV，生成清单中未完成的 (图片URL, 保存路径)"""
+        nonlocal row_errors, known_skipped
         with open(csv_path, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f)
-            
+
             # 检查必要的列是否存在
             if "pictures" not in reader.fieldnames or "upname" not in reader.fieldnames:
                 logger.error("CSV文件缺少必要的列：pictures 或 upname")
@@ -106,45 +401,63 @@ def download_images_from_csv(csv_file_path: str) -> None:
                 try:
                     pictures_str = row.get("pictures", "").strip()
                     username = row.get("upname", "unknown").strip()
-                    
+
                     if not pictures_str:
                         continue
-                    
+
                     # 解析图片URL（以分号分隔）
-                    picture_urls = [url.strip() for url in pictures_str.split(";") if url.strip()]
-                    
-                    if not picture_urls:
-                        continue
-                        
-                    # 为每个图片URL创建Picture对象
-                    pictures = [Picture(url) for url in picture_urls]
-                    
-                    # 下载图片
-                    for picture in pictures:
-                        try:
-                            # 检查图片是否已存在
-                            img_name = picture.img_src.split("/")[-1]
-                            output_file = images_dir / f"{username}_{img_name}"
-                            
-                            if output_file.exists():
-                                logger.debug(f"图片已存在，跳过: {output_file.name}")
-                                skipped_count += 1
-                                continue
-                            
-                            # 下载图片
-                            download_image(picture.img_src, str(images_dir), username)
-                            downloaded_count += 1
-                            
-                        except Exception as e:
-                            logger.error(f"下载图片失败 ({picture.img_src}): {e}")
-                            error_count += 1
-                            
+                    for url in pictures_str.split(";"):
+                        url = url.strip()
+                        if not url:
+                            continue
+                        url = apply_image_profile(url)
+                        output_file = image_output_file(url, str(images_dir), username)
+                        if manifest.is_done(url, output_file.name):
+                            known_skipped += 1
+                            continue
+                        # 没有清单时下载的图片，补记到清单
+                        if output_file.exists():
+                            manifest.record(url, output_file.name, output_file.stat().st_size)
+                            known_skipped += 1
+                            continue
+                        yield url, output_file
+
                 except Exception as e:
                     logger.warning(f"处理第{row_num}行时出错: {e}")
-                    error_count += 1
+                    row_errors += 1
                     continue
 
-        logger.info(f"图片下载完成: 新下载 {downloaded_count} 张，跳过 {skipped_count} 张，失败 {error_count} 张")
-        
+    def on_done(image_url: str, output_file: Path, error: Optional[Exception]) -> None:
+        if error is None:
+            manifest.record(image_url, output_file.name, output_file.stat().st_size)
+        else:
+            manifest.record(image_url, output_file.name, error=str(error))
+
+    downloader = get_image_downloader()
+    start = time.monotonic()
+    try:
+        result.update(downloader.download_many(iter_images(), on_done=on_done))
     except Exception as e:
-        logger.error(f"从CSV文件下载图片时出错: {e}")
\ No newline at end of file
+        logger.error(f"从CSV文件下载图片时出错: {e}")
+    finally:
+        manifest.save()
+
+    elapsed = time.monotonic() - start
+    result["skipped"] += known_skipped
+    result["failed"] += row_errors
+    result["elapsed"] = round(elapsed, 3)
+    result["images_per_sec"] = round(result["downloaded"] / elapsed, 2) if elapsed > 0 else 0.0
+    result["mb_per_sec"] = (
+        round(result["bytes"] / 1024 / 1024 / elapsed, 3) if elapsed > 0 else 0.0
+    )
+
+    logger.info(
+        f"图片下载完成: 新下载 {result['downloaded']} 张，跳过 {result['skipped']} 张，"
+        f"失败 {result['failed']} 张，耗时 {elapsed:.1f} 秒，"
+        f"{result['images_per_sec']} 张/秒，{result['mb_per_sec']} MB/秒"
+    )
+    if result["downloaded"] or result["failed"]:
+        logger.info(f"图片服务器: {downloader.describe_hosts()}")
+    if result["failed"]:
+        logger.info("失败的图片已记录在 images/manifest.json，重新运行时只会重试这些图片")
+    return result
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# images 目录中清单文件的名称
+MANIFEST_NAME = "manifest.json"
+
+# 下载过程中保存清单的间隔（秒）
+MANIFEST_SAVE_INTERVAL = 5.0
+
+
+class ImageManifest:
+    """图片下载清单
+
+    记录 图片URL -> 状态、大小、保存的文件名，保存在 images/manifest.json。
+    重新下载时清单中已完成的图片直接跳过，不再逐个检查文件，只处理失败和新增的图片。
+    多个下载线程可以同时调用 record()。
+    """
+
+    def __init__(self, path: Union[str, Path], entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        """初始化清单
+
+        Args:
+            path: 清单文件路径
+            entries: 已有的记录
+        """
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = entries or {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ImageManifest":
+        """读取清单，文件不存在或损坏时返回空清单"""
+        path = Path(path)
+        entries = {}
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get("images", {})
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"图片清单读取失败，将重新记录: {e}")
+                entries = {}
+        return cls(path, entries)
+
+    def is_done(self, image_url: str, file_name: str) -> bool:
+        """图片是否已下载到该文件"""
+        entry = self.entries.get(image_url)
+        return bool(entry) and entry["status"] == "done" and file_name in entry["paths"]
+
+    def record(self, image_url: str, file_name: str, size: int = 0, error: Optional[str] = None) -> None:
+        """记录一张图片的下载结果，距上次保存超过间隔时写入文件"""
+        with self._lock:
+            entry = self.entries.setdefault(
+                image_url, {"status": "pending", "size": 0, "paths": []}
+            )
+            if error is None:
+                entry["status"] = "done"
+                entry["size"] = size
+                entry.pop("error", None)
+                if file_name not in entry["paths"]:
+                    entry["paths"].append(file_name)
+            elif entry["status"] != "done":
+                entry["status"] = "failed"
+                entry["error"] = error
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= MANIFEST_SAVE_INTERVAL
+
+        if due:
+            self.save()
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的图片数"""
+        counts: Dict[str, int] = {}
+        for entry in self.entries.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+    def save(self) -> None:
+        """写入清单文件，先写临时文件再替换，中断时不会留下残缺的清单"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(
+                    {"version": 1, "images": self.entries}, ensure_ascii=False
+                )
+                self._dirty = False
+                self._last_save = time.monotonic()
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
@@ -0,0 +1,188 @@
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from models.comment import Picture
+from store.image_downloader import (
+    ImageDownloader,
+    apply_image_profile,
+    get_image_downloader,
+    image_output_file,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImageQueue:
+    """后台图片下载队列
+
+    爬取时只把图片放入队列，评论的获取和写入不再等待图片下载。一个分发线程从队列中取出图片，
+    交给 ImageDownloader 的线程池下载，与其它批量下载共用线程池、连接池和带宽限制，
+    同时下载的图片数不超过配置项 image_workers。
+    队列在进程内共享（见 get_image_queue），爬取结束后可以调用 join() 等待下载完成，
+    也可以让下载在后台继续。
+    """
+
+    def __init__(self, downloader: Optional[ImageDownloader] = None):
+        """初始化下载队列
+
+        Args:
+            downloader: 图片下载服务，默认使用进程内共享的服务
+        """
+        self.downloader = downloader or get_image_downloader()
+        self.workers = self.downloader.workers
+        # 已交给线程池但未完成的下载数上限，队列中的其余图片留在队列里
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._pending = set()  # 已排队或正在下载的文件，避免重复下载
+
+        self.stats: Dict[str, int] = {
+            "queued": 0,
+            "downloaded": 0,
+            "skipped": 0,
+            "failed": 0,
+            "bytes": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """尚未完成的图片数"""
+        return self._queue.unfinished_tasks
+
+    def _start(self) -> None:
+        """按需启动分发线程（调用方需持有锁）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._dispatch, name="image-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, username: str, pictures: List[Picture], output_dir: str) -> int:
+        """把一条评论的图片加入队列，返回新加入的数量"""
+        added = 0
+        with self._lock:
+            if self._closed:
+                return 0
+            for picture in pictures:
+                # 入队时按下载格式改写URL，CSV中仍是原始URL
+                image_url = apply_image_profile(picture.img_src)
+                output_file = image_output_file(image_url, output_dir, username)
+                if output_file in self._pending:
+                    continue
+                if output_file.exists():
+                    self.stats["skipped"] += 1
+                    continue
+                self._pending.add(output_file)
+                self._queue.put((image_url, output_file))
+                self.stats["queued"] += 1
+                added += 1
+            if added:
+                self._start()
+        return added
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的图片全部下载完成
+
+        Returns:
+            是否已全部完成，超时返回False
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+        return True
+
+    def close(self, wait: bool = True) -> None:
+        """关闭队列
+
+        Args:
+            wait: 是否等待已排队的图片下载完成，False 时丢弃未开始的下载
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+
+        if not wait:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        # 等待已交给线程池的下载完成
+        self.join()
+
+    def describe(self) -> str:
+        """下载统计文本"""
+        stats = self.stats
+        return (
+            f"图片已下载 {stats['downloaded']} 张（{stats['bytes'] / 1024 / 1024:.1f}MB），"
+            f"跳过 {stats['skipped']} 张，失败 {stats['failed']} 张，剩余 {self.pending} 张"
+        )
+
+    def _dispatch(self) -> None:
+        """分发线程：把队列中的图片交给下载服务的线程池"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            self._slots.acquire()
+            try:
+                self.downloader.executor.submit(self._download, *item)
+            except Exception as e:
+                # 线程池已关闭，放弃这张图片
+                logger.error(f"提交图片下载失败 ({item[0]}): {e}")
+                self._finish(item[1], failed=True)
+
+    def _download(self, image_url: str, output_file: Path) -> None:
+        """在下载服务的线程池中下载一张图片"""
+        failed = True
+        size = 0
+        try:
+            size = self.downloader.download(image_url, output_file)
+            failed = False
+            logger.debug(f"图片下载成功: {output_file}")
+        except Exception as e:
+            logger.error(f"下载图片失败 ({image_url}): {e}")
+        finally:
+            self._finish(output_file, failed, size)
+
+    def _finish(self, output_file: Path, failed: bool, size: int = 0) -> None:
+        """记录一张图片的结果，释放线程池名额"""
+        with self._lock:
+            if failed:
+                self.stats["failed"] += 1
+            else:
+                self.stats["downloaded"] += 1
+                self.stats["bytes"] += size
+            self._pending.discard(output_file)
+        self._slots.release()
+        self._queue.task_done()
+
+
+_image_queue: Optional[ImageQueue] = None
+_image_queue_lock = threading.Lock()
+
+
+def get_image_queue() -> ImageQueue:
+    """获取进程内共享的图片下载队列"""
+    global _image_queue
+
+    if _image_queue is None:
+        with _image_queue_lock:
+            if _image_queue is None:
+                _image_queue = ImageQueue()
+    return _image_queue
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 按键加锁的分段数，同一张图片同时只下载一次
+LOCK_STRIPES = 64
+
+# B站图片服务器的镜像域名 i0/i1/i2.hdslb.com，同一路径是同一张图片
+HDSLB_MIRROR = re.compile(r"i\d+\.hdslb\.com")
+
+
+def image_key(image_url: str) -> str:
+    """图片的缓存键：域名和路径的SHA-1
+
+    去掉协议和查询参数，http/https 和 //i0.hdslb.com 这样的写法得到相同的键；
+    i0/i1/i2.hdslb.com 等镜像域名统一按 i0.hdslb.com 计算。B站图片的文件名本身就是内容哈希，
+    所以按URL去重即可覆盖同一张表情、梗图被不同用户转发的情况。
+    """
+    parts = urlsplit(image_url)
+    host = (parts.hostname or "").lower()
+    if HDSLB_MIRROR.fullmatch(host):
+        host = "i0.hdslb.com"
+    normalized = f"{host}{parts.path}"
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class ImageStore:
+    """按内容寻址的图片缓存
+
+    每张图片只下载一次，保存在 BASE_DIR/image_store/ab/abcdef....jpg，
+    各视频 images 目录中的 用户名_图片名 文件是指向缓存对象的硬链接，
+    不支持硬链接时（如跨磁盘、FAT文件系统）改为复制。同一张图片被多个用户、
+    多个视频使用时不再重复下载，也只占一份磁盘空间。
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        """初始化图片缓存
+
+        Args:
+            root: 缓存目录，默认为 BASE_DIR/image_store
+        """
+        if root is None:
+            from config import BASE_DIR
+
+            root = BASE_DIR / "image_store"
+
+        self.root = Path(root)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def object_path(self, image_url: str) -> Path:
+        """图片在缓存中的路径"""
+        key = image_key(image_url)
+        suffix = Path(urlsplit(image_url).path).suffix.lower()
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def lock_for(self, image_url: str) -> threading.Lock:
+        """图片对应的锁，持有期间其它线程不会下载同一张图片"""
+        return self._locks[int(image_key(image_url)[:8], 16) % LOCK_STRIPES]
+
+    def contains(self, image_url: str) -> bool:
+        """缓存中是否已有该图片"""
+        return self.object_path(image_url).exists()
+
+    def link(self, image_url: str, output_file: Path) -> bool:
+        """把缓存中的图片链接到输出路径，缓存中没有时返回False"""
+        source = self.object_path(image_url)
+        if not source.exists():
+            return False
+
+        output_file = Path(output_file)
+        if output_file.exists():
+            return True
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source, output_file)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(source, output_file)
+        return True
+
+    def usage(self) -> Tuple[int, int]:
+        """缓存的图片数和总大小（字节）"""
+        count = 0
+        size = 0
+        if self.root.exists():
+            for path in self.root.glob("*/*"):
+                if path.suffix == ".part":
+                    continue
+                count += 1
+                size += path.stat().st_size
+        return count, size
+
+
+_image_store: Optional[ImageStore] = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """获取进程内共享的图片缓存"""
+    global _image_store
+
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore()
+    return _image_store
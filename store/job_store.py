@@ -0,0 +1,222 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    identifier TEXT PRIMARY KEY,
+    output_dir TEXT NOT NULL,
+    sort_order INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    round_num INTEGER NOT NULL DEFAULT 0,
+    offset_str TEXT NOT NULL DEFAULT '',
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    csv_size INTEGER NOT NULL DEFAULT 0,
+    incremental INTEGER NOT NULL DEFAULT 0,
+    since_ctime INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sub_threads (
+    identifier TEXT NOT NULL,
+    rpid INTEGER NOT NULL,
+    rcount INTEGER NOT NULL,
+    PRIMARY KEY (identifier, rpid)
+);
+"""
+
+# 后续版本新增的列：(列名, 定义)
+MIGRATIONS = [
+    ("incremental", "INTEGER NOT NULL DEFAULT 0"),
+    ("since_ctime", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+@dataclass
+class CrawlJob:
+    """一个视频的爬取进度检查点"""
+
+    identifier: str  # 内容标识符
+    output_dir: str  # 输出目录
+    sort_order: int  # 评论排序方式
+    status: str = "running"  # running：未完成，done：已完成
+    round_num: int = 0  # 已完成的页码
+    offset_str: str = ""  # WBI接口的翻页游标
+    downloaded: int = 0  # 已写入的评论数
+    total: int = 0  # 评论总数
+    csv_size: int = 0  # 检查点时CSV文件的大小（字节）
+    incremental: bool = False  # 是否为增量更新
+    since_ctime: int = 0  # 增量更新开始时已有根评论的最新时间戳
+    updated_at: float = 0.0  # 最后更新时间戳
+
+    @property
+    def resumable(self) -> bool:
+        """是否可以从检查点继续"""
+        return self.status == "running" and self.round_num > 0 and self.csv_size > 0
+
+
+class JobStore:
+    """基于SQLite的爬取任务存储
+
+    每写入一页评论后保存一次检查点：页码、翻页游标、已下载数量、CSV文件大小以及已获取完的子评论串。
+    CSV文件本身就是去重状态，恢复时把CSV截断到检查点大小即可去掉未确认的数据，
+    再从CSV重建已记录的评论ID和地区统计。多个爬取线程可以共用同一个实例。
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        """初始化任务存储
+
+        Args:
+            path: 数据库文件路径，默认为 BASE_DIR/jobs.db
+        """
+        if path is None:
+            from config import BASE_DIR
+
+            path = BASE_DIR / "jobs.db"
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        """为旧版本创建的数据库补充新增的列（调用方需持有锁）"""
+        columns = {
+            row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")
+        }
+        for name, definition in MIGRATIONS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def get(self, identifier: str) -> Optional[CrawlJob]:
+        """获取任务检查点，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE identifier = ?", (identifier,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = CrawlJob(**{f.name: row[f.name] for f in fields(CrawlJob)})
+        job.incremental = bool(job.incremental)
+        return job
+
+    def start(
+        self,
+        identifier: str,
+        output_dir: str,
+        sort_order: int,
+        incremental: bool = False,
+        since_ctime: int = 0,
+        keep_threads: bool = False,
+    ) -> CrawlJob:
+        """开始一个新任务，替换该视频之前的检查点
+
+        Args:
+            keep_threads: 是否保留之前记录的子评论串，增量更新时沿用上次的子评论数
+        """
+        job = CrawlJob(
+            identifier=identifier,
+            output_dir=output_dir,
+            sort_order=sort_order,
+            incremental=incremental,
+            since_ctime=since_ctime,
+            updated_at=time.time(),
+        )
+        row = asdict(job)
+        with self._lock, self._conn:
+            if not keep_threads:
+                self._conn.execute(
+                    "DELETE FROM sub_threads WHERE identifier = ?", (identifier,)
+                )
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(row)})"
+                f" VALUES ({', '.join('?' * len(row))})",
+                tuple(row.values()),
+            )
+        return job
+
+    def checkpoint(
+        self, job: CrawlJob, sub_threads: Iterable[Tuple[int, int]] = ()
+    ) -> None:
+        """保存检查点，同时记录本页已获取完的子评论串
+
+        Args:
+            job: 任务进度
+            sub_threads: (根评论ID, 子评论数) 列表
+        """
+        job.updated_at = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, round_num = ?, offset_str = ?, downloaded = ?,"
+                " total = ?, csv_size = ?, updated_at = ? WHERE identifier = ?",
+                (
+                    job.status,
+                    job.round_num,
+                    job.offset_str,
+                    job.downloaded,
+                    job.total,
+                    job.csv_size,
+                    job.updated_at,
+                    job.identifier,
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sub_threads VALUES (?, ?, ?)",
+                ((job.identifier, rpid, rcount) for rpid, rcount in sub_threads),
+            )
+
+    def finish(self, job: CrawlJob) -> None:
+        """标记任务已完成"""
+        job.status = "done"
+        self.checkpoint(job)
+
+    def sub_threads(self, identifier: str) -> Dict[int, int]:
+        """获取已获取完的子评论串，返回 根评论ID -> 子评论数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rpid, rcount FROM sub_threads WHERE identifier = ?",
+                (identifier,),
+            ).fetchall()
+        return {row["rpid"]: row["rcount"] for row in rows}
+
+    def delete(self, identifier: str) -> None:
+        """删除任务及其子评论记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE identifier = ?", (identifier,))
+            self._conn.execute(
+                "DELETE FROM sub_threads WHERE identifier = ?", (identifier,)
+            )
+
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """获取进程内共享的任务存储"""
+    global _job_store
+
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                _job_store = JobStore()
+    return _job_store
@@ -0,0 +1,161 @@
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 文件头，之后是小端序的 int64 评论ID，新增的ID直接追加到文件末尾
+MAGIC = b"BCDRPID1"
+
+# 插入缓冲区的大小，超过后合并到有序数组
+BUFFER_LIMIT = 4096
+
+
+def rpid_path(csv_path: Union[str, Path]) -> Path:
+    """CSV文件对应的评论ID文件路径"""
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.name + ".rpids")
+
+
+class RpidSet:
+    """紧凑的评论ID集合，用于评论去重
+
+    已有的ID保存在有序的 array('q') 中（每个ID 8 字节），新加入的ID先放入小缓冲区，
+    缓冲区满后合并到有序数组，成员检查使用二分查找。百万条评论约占 8MB 内存。
+    可以保存到CSV旁边的 .rpids 文件，之后新增的ID由调用方在写入CSV后用 append_rpids() 追加，
+    集合本身不再保存一份未写入文件的ID，每个ID只占一份内存。
+    流水线的抓取阶段与解析阶段在不同线程中同时读写集合，所有操作都在锁内进行。
+    """
+
+    def __init__(self, rpids: Iterable[int] = ()):
+        """初始化集合
+
+        Args:
+            rpids: 初始的评论ID
+        """
+        self._sorted = array("q", sorted(set(rpids)))
+        self._buffer = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, rpid) -> bool:
+        with self._lock:
+            return self._contains(rpid)
+
+    def _contains(self, rpid) -> bool:
+        """成员检查，调用方持有锁"""
+        if rpid in self._buffer:
+            return True
+        sorted_ids = self._sorted
+        index = bisect_left(sorted_ids, rpid)
+        return index < len(sorted_ids) and sorted_ids[index] == rpid
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sorted) + len(self._buffer)
+
+    def __iter__(self) -> Iterator[int]:
+        # 合并时创建新数组而不修改旧数组，迭代的是当前有序数组的快照
+        with self._lock:
+            self._compact()
+            return iter(self._sorted)
+
+    def add(self, rpid: int) -> bool:
+        """加入一个评论ID，返回是否为新ID"""
+        with self._lock:
+            if self._contains(rpid):
+                return False
+            self._buffer.add(rpid)
+            # 缓冲区上限随集合增大，使合并的总开销保持线性
+            if len(self._buffer) >= max(BUFFER_LIMIT, len(self._sorted) >> 6):
+                self._compact()
+            return True
+
+    def update(self, rpids: Iterable[int]) -> None:
+        """加入多个评论ID"""
+        for rpid in rpids:
+            self.add(rpid)
+
+    def _compact(self) -> None:
+        """把缓冲区合并到有序数组，调用方持有锁"""
+        if not self._buffer:
+            return
+        # 缓冲区远小于有序数组，按插入位置分段复制，避免整体重新排序
+        old = self._sorted
+        merged = array("q")
+        start = 0
+        for rpid in sorted(self._buffer):
+            index = bisect_left(old, rpid, start)
+            merged.extend(old[start:index])
+            merged.append(rpid)
+            start = index
+        merged.extend(old[start:])
+        self._sorted = merged
+        self._buffer.clear()
+
+    def save(self, path: Union[str, Path]) -> None:
+        """把全部ID写入文件，替换已有内容"""
+        path = Path(path)
+        with self._lock:
+            self._compact()
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+                f.write(_to_le_bytes(self._sorted))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["RpidSet"]:
+        """从文件读取，文件不存在或格式不正确时返回None"""
+        path = Path(path)
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    logger.warning(f"评论ID文件格式不正确: {path}")
+                    return None
+                data = f.read()
+        except OSError:
+            return None
+
+        # 只保留完整的记录，写入中断时末尾可能有残缺的字节
+        data = data[: len(data) - len(data) % 8]
+        rpids = array("q")
+        rpids.frombytes(data)
+        if sys.byteorder == "big":
+            rpids.byteswap()
+
+        return cls(rpids)
+
+    @classmethod
+    def load_for_csv(cls, csv_path: Union[str, Path]) -> Optional["RpidSet"]:
+        """读取CSV旁边的评论ID文件
+
+        评论ID文件在CSV写入之后才更新，所以只有修改时间不早于CSV时才与CSV一致，
+        否则（如中断或CSV被截断、编辑过）返回None，由调用方从CSV重建。
+        """
+        csv_path = Path(csv_path)
+        path = rpid_path(csv_path)
+        try:
+            if path.stat().st_mtime_ns < csv_path.stat().st_mtime_ns:
+                return None
+        except OSError:
+            return None
+        return cls.load(path)
+
+
+def append_rpids(path: Union[str, Path], rpids: Iterable[int]) -> None:
+    """把评论ID追加到已有的评论ID文件"""
+    rpids = array("q", rpids)
+    if not rpids:
+        return
+    with open(path, "ab") as f:
+        f.write(_to_le_bytes(rpids))
+
+
+def _to_le_bytes(rpids: array) -> bytes:
+    """转换为小端序字节"""
+    if sys.byteorder == "big":
+        rpids = array("q", rpids)
+        rpids.byteswap()
+    return rpids.tobytes()
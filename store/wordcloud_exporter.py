@@ -496,28 +496,6 @@ def analyze_csv_for_wordcloud(csv_file_path: str) -> Dict[str, Any]:
         logger.error(f"CSV文件不存在: {csv_path}")
         return {}
 
-    # 从assets获取GeoJSON数据，建立名称映射表
-    from utils.assets_helper import get_geojson_template_path
-
-    geo_template_path = get_geojson_template_path()
-    province_map = {}
-
-    if geo_template_path.exists():
-        try:
-            with open(geo_template_path, "r", encoding="utf-8") as f:
-                geojson_data = json.load(f)
-
-            # 构建地区名称映射表
-            for feature in geojson_data["features"]:
-                province = feature["properties"]["name"]
-                province_map[province] = province
-
-            logger.info(f"已建立地区映射表，包含 {len(province_map)} 个地区")
-        except Exception as e:
-            logger.error(f"读取GeoJSON模板失败: {e}")
-    else:
-        logger.warning(f"GeoJSON模板文件不存在: {geo_template_path}")
-
     # 加载停用词
     stopwords = load_stopwords()
     logger.info(f"已加载 {len(stopwords)} 个停用词")
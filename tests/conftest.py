@@ -0,0 +1,61 @@
+import pytest
+
+from config import DEFAULT_CONFIG, Config
+from tests.helpers import FakeSession
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    """使用内存中的默认配置，不读写 ~/.BiCoDown/config.json，重试不等待"""
+    monkeypatch.setattr(Config, "_save_config", lambda self: None)
+    instance = object.__new__(Config)
+    instance._config = DEFAULT_CONFIG.copy()
+    instance._config["request_retry_delay"] = 0.0
+    monkeypatch.setattr(Config, "_instance", instance)
+    return instance
+
+
+@pytest.fixture
+def bilibili_api(monkeypatch):
+    """不联网的 BilibiliAPI：跳过WBI签名，不限速，由测试设置 session.handler"""
+    import api.bilibili_api as bilibili_api_module
+    from api.bilibili_api import BilibiliAPI
+    from api.rate_limiter import RateLimiter
+
+    monkeypatch.setattr(
+        bilibili_api_module, "sign_and_generate_url", lambda url, cookie="": url
+    )
+    api = BilibiliAPI(limiter=RateLimiter(rate=1000.0, burst=1000))
+    api.session = FakeSession(lambda query: (200, {"code": 0, "data": {}}))
+    return api
+
+
+@pytest.fixture
+def crawl_env(tmp_path, monkeypatch):
+    """在临时目录中爬取：临时的任务存储，每页都保存检查点，不生成地图"""
+    from crawler import CommentCrawler, CrawlOptions
+    from store.csv_exporter import CsvSink
+    from store.job_store import JobStore
+
+    monkeypatch.setattr(CsvSink, "flush_due", property(lambda self: True))
+    job_store = JobStore(tmp_path / "jobs.db")
+    output = tmp_path / "output"
+
+    def create(api, identifier="BV1test", **options):
+        options.setdefault("mapping", False)
+        options.setdefault("order", 0)
+        options.setdefault("workers", 2)
+        options.setdefault("max_retries", 1)
+        options.setdefault("consecutive_empty_limit", 1)
+        return CommentCrawler(
+            identifier,
+            CrawlOptions(output=str(output), **options),
+            api=api,
+            job_store=job_store,
+        )
+
+    create.job_store = job_store
+    create.output = output
+    create.csv_path = lambda identifier="BV1test": output / f"{identifier}_测试视频" / f"{identifier}.csv"
+    yield create
+    job_store.close()
@@ -0,0 +1,201 @@
+"""测试用的假响应和假数据"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from store.image_downloader import ImageDownloader
+
+
+def make_response(status_code: int, payload: Dict[str, Any], url: str = "") -> requests.Response:
+    """构造一个 requests 响应"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.reason = "OK" if status_code < 400 else "Error"
+    response._content = json.dumps(payload).encode("utf-8")
+    return response
+
+
+class FakeSession:
+    """代替 requests.Session，按请求参数调用 handler 生成响应，并记录每次请求的参数"""
+
+    def __init__(self, handler: Callable[[Dict[str, str]], Tuple[int, Dict[str, Any]]]):
+        self.handler = handler
+        self.headers: Dict[str, str] = {}
+        self.calls: List[Dict[str, str]] = []
+
+    def get(self, url: str, params=None, headers=None, timeout=None) -> requests.Response:
+        query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+        query.update(params or {})
+        self.calls.append(query)
+        status_code, payload = self.handler(query)
+        return make_response(status_code, payload, url)
+
+
+def sub_comment_page(root: int, page: int, page_size: int, count: int) -> Dict[str, Any]:
+    """生成一页 reply/reply 接口的返回数据，共 count 条子评论"""
+    start = (page - 1) * page_size
+    replies = [
+        {"rpid": root * 1000 + i, "root": root, "parent": root}
+        for i in range(start, min(start + page_size, count))
+    ]
+    return {
+        "code": 0,
+        "data": {"replies": replies, "page": {"num": page, "size": page_size, "count": count}},
+    }
+
+
+def make_reply(
+    rpid: int,
+    ctime: int = 1_700_000_000,
+    root: int = 0,
+    rcount: int = 0,
+    uname: str = None,
+    location: str = "广东",
+    sex: str = "男",
+) -> Dict[str, Any]:
+    """生成一条与B站评论接口结构相同的评论"""
+    return {
+        "rpid": rpid,
+        "oid": 1,
+        "mid": 10_000 + rpid % 97,
+        "root": root,
+        "parent": root,
+        "ctime": ctime,
+        "like": rpid % 7,
+        "rcount": rcount,
+        "member": {
+            "uname": f"用户{rpid}" if uname is None else uname,
+            "sex": sex,
+            "level_info": {"current_level": rpid % 7},
+        },
+        "content": {"message": f"评论 {rpid}"},
+        "reply_control": {"location": f"IP属地：{location}"},
+    }
+
+
+class FakeCommentAPI:
+    """不联网的评论接口，按时间从新到旧分页返回根评论，子评论单独分页
+
+    threads 为 根评论ID -> 子评论列表。根评论内联前 inline 条子评论，
+    子评论数超过 inline 的评论串需要通过 iter_sub_comments 获取。
+    """
+
+    def __init__(
+        self,
+        roots: List[Dict[str, Any]],
+        threads: Dict[int, List[Dict[str, Any]]] = None,
+        page_size: int = 20,
+        inline: int = 3,
+    ):
+        self.roots = roots
+        self.threads = threads or {}
+        self.page_size = page_size
+        self.inline = inline
+        self.comment_pages: List[int] = []  # 请求过的主评论页码
+        self.sub_threads: List[int] = []  # 请求过子评论的根评论
+        self.fail_on_page: int = 0  # 请求该页时抛出异常，模拟程序崩溃
+        self.before_fail: Callable[[], Any] = lambda: None  # 抛出异常前调用
+        self.effective_rate = 1.0
+
+    def fetch_content_info(self, identifier: str, content_type: str) -> Dict[str, Any]:
+        return {"code": 0, "data": {"aid": 1, "title": "测试视频"}}
+
+    def fetch_comment_count(self, oid: str) -> int:
+        return len(self.roots) + sum(len(replies) for replies in self.threads.values())
+
+    def get_retry_delay(self) -> float:
+        return 0.0
+
+    def fetch_comments(self, oid: str, next_page: int, order: int, offset_str: str = ""):
+        if next_page == self.fail_on_page:
+            self.before_fail()
+            raise RuntimeError(f"第 {next_page} 页请求失败")
+        self.comment_pages.append(next_page)
+        start = (next_page - 1) * self.page_size
+        replies = []
+        for root in self.roots[start : start + self.page_size]:
+            reply = dict(root)
+            sub_replies = self.threads.get(root["rpid"], [])
+            reply["rcount"] = len(sub_replies)
+            reply["replies"] = sub_replies[: self.inline]
+            replies.append(reply)
+        return {"code": 0, "data": {"replies": replies}}
+
+    def iter_sub_comments(self, oid, rpid, referer=None, max_retries=3, stats=None):
+        self.sub_threads.append(rpid)
+        if stats is None:
+            stats = {}
+        stats.update(requests=0, pages=0)
+        replies = self.threads.get(rpid, [])
+        for start in range(0, len(replies), 10):
+            stats["requests"] += 1
+            stats["pages"] += 1
+            yield replies[start : start + 10]
+
+
+def make_video(root_count: int, thread_sizes: Dict[int, int] = None, newest: int = 1_700_000_000):
+    """生成一个视频的根评论和子评论，根评论按时间从新到旧排列
+
+    Args:
+        root_count: 根评论数
+        thread_sizes: 第几条根评论（从0开始）-> 子评论数
+        newest: 最新根评论的时间戳
+    """
+    roots = [make_reply(1_000 + i, ctime=newest - i) for i in range(root_count)]
+    threads = {}
+    for index, size in (thread_sizes or {}).items():
+        root = roots[index]["rpid"]
+        threads[root] = [
+            make_reply(root * 1_000 + n, ctime=newest + n, root=root) for n in range(size)
+        ]
+    return roots, threads
+
+
+def read_csv_rpids(csv_path) -> List[int]:
+    """读取CSV中的全部评论ID"""
+    import csv
+
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        return [int(row["rpid"]) for row in csv.DictReader(f)]
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    """等待条件成立，超时时抛出 AssertionError"""
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.01)
+
+
+class SlowDownloader(ImageDownloader):
+    """不联网的下载服务，记录同时下载的最大数量"""
+
+    def __init__(self, workers):
+        super().__init__(workers=workers, bandwidth=0)
+        # 不使用 ~/.BiCoDown 中的图片缓存
+        self.store = None
+        self.active = 0
+        self.peak = 0
+        self.count_lock = threading.Lock()
+
+    def _fetch(self, image_url, output_file):
+        with self.count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.01)
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            output_file.write_bytes(b"image")
+            return 5
+        finally:
+            with self.count_lock:
+                self.active -= 1
@@ -0,0 +1,90 @@
+import csv
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from store.columnar_stats import map_stats_columnar
+from store.csv_analyzer import _map_stats_rows, normalize_location
+from store.csv_exporter import CSV_HEADERS
+
+LOCATIONS = ["广东", "北京", "", "美国", "上海"]
+
+
+def write_csv(path, count, tail=""):
+    """写入 count 行评论，tail 原样追加在末尾，模拟写入中断"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        for i in range(count):
+            writer.writerow(
+                [
+                    "BV1test",
+                    f"用户{i % 13}",
+                    "男女保"[i % 3] if i % 3 < 2 else "保密",
+                    f'第 {i} 条\n"评论"' if i % 4 == 0 else f"评论 {i}",
+                    "",
+                    i,
+                    1,
+                    i % 13,
+                    0,
+                    0,
+                    1_700_000_000,
+                    i % 5,
+                    0,
+                    i % 8,
+                    LOCATIONS[i % len(LOCATIONS)],
+                ]
+            )
+        f.write(tail)
+    return path
+
+
+def map_stats(path):
+    stats, names = map_stats_columnar(str(path), normalize_location)
+    return {name: stat.to_dict() for name, stat in stats.items()}, names
+
+
+def row_stats(path):
+    stats, names = _map_stats_rows(path)
+    return {name: stat.to_dict() for name, stat in stats.items()}, names
+
+
+TRUNCATED_TAILS = [
+    "",
+    # 最后一行只写了一半
+    'BV1test,用户x,男,"残缺的\n评论",,999,1',
+    # 最后一行缺少地区列
+    "BV1test,用户x,男,评论,,999,1,5,0,0,1700000000,3,0,2",
+    # 最后一行完整，只是缺少换行
+    "BV1test,用户x,男,评论,,999,1,5,0,0,1700000000,3,0,2,广",
+    # 最后一行的评论内容中有引号和换行，写到一半
+    'BV1test,用户x,男,"有""引号""\n和换行',
+]
+
+
+@pytest.mark.parametrize("tail", TRUNCATED_TAILS)
+def test_columnar_matches_row_by_row(tmp_path, tail):
+    path = write_csv(tmp_path / "BV1test.csv", 200, tail)
+
+    assert map_stats(path) == row_stats(path)
+
+
+def test_columnar_reads_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr("store.columnar_stats.CHUNK_ROWS", 7)
+    path = write_csv(tmp_path / "BV1test.csv", 50, "BV1test,用户x,男,评论")
+
+    stats, _ = map_stats(path)
+
+    assert stats == row_stats(path)[0]
+    assert sum(stat["location"] for stat in stats.values()) == 50
+
+
+@pytest.mark.parametrize("tail", TRUNCATED_TAILS)
+def test_tail_block_may_start_inside_quoted_content(tmp_path, monkeypatch, tail):
+    # 只读取文件末尾，末尾这一段可能从评论内容的引号中间开始
+    path = write_csv(tmp_path / "BV1test.csv", 30, tail)
+    expected = row_stats(path)
+    for size in range(120, 400, 7):
+        monkeypatch.setattr("store.columnar_stats.TAIL_BLOCK", size)
+        assert map_stats(path) == expected, size
@@ -0,0 +1,70 @@
+import csv
+
+from models.comment import Comment
+from store.csv_exporter import CSV_HEADERS, CsvSink
+from tests.helpers import FakeCommentAPI, make_video, read_csv_rpids
+
+
+def make_comments(rpids, uname="用户"):
+    return [Comment(uname=uname, rpid=rpid, bvid="BV1test", location="广东") for rpid in rpids]
+
+
+def read_rows(csv_path):
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_write_skips_comments_without_uname(tmp_path):
+    comments = make_comments([1, 2]) + make_comments([3], uname="") + make_comments([4])
+
+    with CsvSink("BV1test", tmp_path) as sink:
+        assert sink.write(comments) == 3
+        assert sink.write(make_comments([5], uname="")) == 0
+
+    assert sink.written == 3
+    assert read_csv_rpids(sink.csv_path) == [1, 2, 4]
+
+
+def test_appends_without_repeating_header_and_overwrite_truncates(tmp_path):
+    with CsvSink("BV1test", tmp_path) as sink:
+        sink.write(make_comments([1, 2]))
+    with CsvSink("BV1test", tmp_path) as sink:
+        sink.write(make_comments([3]))
+
+    rows = read_rows(sink.csv_path)
+    assert rows[0] == CSV_HEADERS
+    assert CSV_HEADERS not in rows[1:]
+    assert read_csv_rpids(sink.csv_path) == [1, 2, 3]
+
+    with CsvSink("BV1test", tmp_path, overwrite=True) as sink:
+        sink.write(make_comments([4]))
+    assert read_csv_rpids(sink.csv_path) == [4]
+
+
+def test_checkpoint_returns_synced_file_size(tmp_path):
+    with CsvSink("BV1test", tmp_path) as sink:
+        sink.write(make_comments([1, 2]))
+        size = sink.checkpoint()
+        assert size == sink.csv_path.stat().st_size
+        assert not sink.flush_due
+
+        # 检查点之后写入的内容仍在缓冲区中，截断到检查点位置即可去掉
+        sink.write(make_comments([3]))
+
+    with open(sink.csv_path, "r+b") as f:
+        f.truncate(size)
+    assert read_csv_rpids(sink.csv_path) == [1, 2]
+
+
+def test_downloaded_counts_only_written_comments(crawl_env):
+    roots, threads = make_video(30, {3: 5})
+    roots[7]["member"]["uname"] = ""
+    threads[roots[3]["rpid"]][4]["member"]["uname"] = ""
+    api = FakeCommentAPI(roots, threads)
+
+    result = crawl_env(api).run()
+
+    assert result.success
+    rpids = read_csv_rpids(crawl_env.csv_path())
+    assert result.downloaded == len(rpids) == api.fetch_comment_count("1") - 2
+    assert crawl_env.job_store.get("BV1test").downloaded == result.downloaded
@@ -0,0 +1,34 @@
+import store.geo_matcher
+import utils.geo_template
+from store.geo_matcher import GeoMatcher, get_geo_matcher
+
+FEATURES = [
+    {"properties": {"name": "广东", "fullname": "广东省"}},
+    {"properties": {"name": "内蒙古", "fullname": "内蒙古自治区"}},
+    {"properties": {"name": "香港", "fullname": "香港特别行政区"}},
+]
+
+
+def test_match_names_aliases_and_unknown():
+    matcher = GeoMatcher(FEATURES)
+
+    assert matcher.match("广东省") == "广东"
+    assert matcher.match("内蒙古") == "内蒙古"
+    assert matcher.match("中国香港") == "香港"
+    assert matcher.match("美国") is None
+    # 未预先计算的名称第一次匹配后缓存
+    assert matcher.match("广东深圳") == "广东"
+    assert matcher.match("广东深圳") == "广东"
+
+
+def test_failed_template_load_is_not_cached(monkeypatch):
+    monkeypatch.setattr(store.geo_matcher, "_geo_matcher", None)
+    monkeypatch.setattr(utils.geo_template, "load_geo_template", lambda: None)
+
+    assert get_geo_matcher() is None
+    assert store.geo_matcher._geo_matcher is None
+
+    monkeypatch.setattr(utils.geo_template, "load_geo_template", lambda: {"features": FEATURES})
+    matcher = get_geo_matcher()
+    assert len(matcher) == 3
+    assert get_geo_matcher() is matcher
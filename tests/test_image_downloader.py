@@ -0,0 +1,25 @@
+from tests.helpers import SlowDownloader
+
+
+def test_failing_callbacks_do_not_abort_batch(tmp_path):
+    downloader = SlowDownloader(workers=2)
+    done = []
+
+    def on_done(image_url, output_file, error):
+        done.append(image_url)
+        raise RuntimeError("回调出错")
+
+    try:
+        result = downloader.download_many(
+            (
+                (f"https://i0.hdslb.com/bfs/test/{n}.jpg", tmp_path / f"{n}.jpg")
+                for n in range(20)
+            ),
+            on_done=on_done,
+        )
+    finally:
+        downloader.close()
+
+    assert result["downloaded"] == 20 and result["failed"] == 0
+    assert len(done) == 20
+    assert len(list(tmp_path.iterdir())) == 20
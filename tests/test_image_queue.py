@@ -0,0 +1,44 @@
+from models.comment import Picture
+from store.image_queue import ImageQueue
+from tests.helpers import SlowDownloader
+
+
+def pictures(prefix, count):
+    return [Picture(f"https://i0.hdslb.com/bfs/{prefix}/{n}.jpg") for n in range(count)]
+
+
+def test_queue_and_batch_downloads_share_the_worker_limit(tmp_path):
+    downloader = SlowDownloader(workers=2)
+    image_queue = ImageQueue(downloader)
+    try:
+        assert image_queue.submit("用户", pictures("queue", 20), str(tmp_path / "a")) == 20
+        # 重复提交的图片不会再次排队
+        assert image_queue.submit("用户", pictures("queue", 5), str(tmp_path / "a")) == 0
+
+        batch = downloader.download_many(
+            (picture.img_src, tmp_path / "b" / f"{n}.jpg")
+            for n, picture in enumerate(pictures("batch", 10))
+        )
+        assert image_queue.join(timeout=5.0)
+    finally:
+        image_queue.close()
+        downloader.close()
+
+    assert batch["downloaded"] == 10
+    assert image_queue.stats["downloaded"] == 20
+    assert image_queue.stats["bytes"] == 100
+    assert image_queue.pending == 0
+    assert downloader.peak <= 2
+    assert len(list((tmp_path / "a").iterdir())) == 20
+
+
+def test_close_without_wait_drops_queued_images(tmp_path):
+    downloader = SlowDownloader(workers=1)
+    image_queue = ImageQueue(downloader)
+    image_queue.submit("用户", pictures("queue", 50), str(tmp_path))
+    image_queue.close(wait=False)
+    downloader.close()
+
+    assert image_queue.pending == 0
+    assert image_queue.stats["downloaded"] < 50
+    assert image_queue.submit("用户", pictures("later", 1), str(tmp_path)) == 0
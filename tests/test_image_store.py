@@ -0,0 +1,31 @@
+from store.image_store import ImageStore, image_key
+
+IMAGE_PATH = "/bfs/new_dyn/0123456789abcdef.jpg"
+
+
+def test_mirrored_hdslb_urls_share_one_key():
+    urls = [
+        f"https://i0.hdslb.com{IMAGE_PATH}",
+        f"http://i1.hdslb.com{IMAGE_PATH}",
+        f"//i2.hdslb.com{IMAGE_PATH}",
+        f"https://I3.HDSLB.COM{IMAGE_PATH}?x=1",
+    ]
+    assert len({image_key(url) for url in urls}) == 1
+
+
+def test_different_images_and_hosts_keep_separate_keys():
+    key = image_key(f"https://i0.hdslb.com{IMAGE_PATH}")
+    assert image_key(f"https://i0.hdslb.com{IMAGE_PATH}@300w.webp") != key
+    assert image_key(f"https://example.com{IMAGE_PATH}") != key
+    assert image_key(f"https://s1.hdslb.com{IMAGE_PATH}") != key
+
+
+def test_mirrored_url_links_cached_object(tmp_path):
+    store = ImageStore(tmp_path / "store")
+    source = store.object_path(f"https://i0.hdslb.com{IMAGE_PATH}")
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"image")
+
+    output_file = tmp_path / "images" / "用户_0123456789abcdef.jpg"
+    assert store.link(f"https://i2.hdslb.com{IMAGE_PATH}", output_file)
+    assert output_file.read_bytes() == b"image"
@@ -0,0 +1,79 @@
+from tests.helpers import FakeCommentAPI, make_reply, make_video, read_csv_rpids
+
+NEWEST = 1_700_000_000
+
+
+def crawl_initial(crawl_env, root_count=50, thread_sizes=None):
+    roots, threads = make_video(root_count, thread_sizes, newest=NEWEST)
+    api = FakeCommentAPI(roots, threads)
+    assert crawl_env(api).run().success
+    api.comment_pages.clear()
+    api.sub_threads.clear()
+    return api
+
+
+def add_new_roots(api, count):
+    new_roots = [make_reply(9_000 + i, ctime=NEWEST + 100 - i) for i in range(count)]
+    api.roots[:0] = new_roots
+    return new_roots
+
+
+def grow_thread(api, root_index, count):
+    root = api.roots[root_index]["rpid"]
+    replies = api.threads.setdefault(root, [])
+    start = len(replies)
+    replies.extend(
+        make_reply(root * 1_000 + n, ctime=NEWEST + 200 + n, root=root)
+        for n in range(start, start + count)
+    )
+    return root
+
+
+def test_incremental_stops_after_known_roots_when_nothing_else_changed(crawl_env):
+    api = crawl_initial(crawl_env, thread_sizes={40: 6})
+    add_new_roots(api, 3)
+
+    result = crawl_env(api, incremental=True).run()
+
+    assert result.success
+    assert api.comment_pages == [1, 2]
+    assert api.sub_threads == []
+    rpids = read_csv_rpids(crawl_env.csv_path())
+    assert len(rpids) == len(set(rpids)) == api.fetch_comment_count("1")
+
+
+def test_incremental_refreshes_grown_threads_under_older_roots(crawl_env):
+    api = crawl_initial(crawl_env, thread_sizes={5: 6, 40: 6})
+    add_new_roots(api, 3)
+    # 第 43 条根评论（增量更新停止的页面之后）下有新回复
+    old_root = grow_thread(api, 43, 4)
+
+    result = crawl_env(api, incremental=True).run()
+
+    assert result.success
+    assert api.sub_threads == [old_root]
+    rpids = read_csv_rpids(crawl_env.csv_path())
+    assert len(rpids) == len(set(rpids)) == api.fetch_comment_count("1")
+    assert {old_root * 1_000 + n for n in range(6, 10)} <= set(rpids)
+
+
+def test_incremental_ignores_stale_full_crawl_checkpoint(crawl_env):
+    api = crawl_initial(crawl_env, root_count=45)
+    csv_path = crawl_env.csv_path()
+    rows_before = read_csv_rpids(csv_path)
+
+    # 上次完整获取在第 1 页之后中断，检查点记录的CSV大小小于现在的文件
+    store = crawl_env.job_store
+    job = store.start("BV1test", str(csv_path.parent), 0)
+    job.round_num = 1
+    job.csv_size = 200
+    store.checkpoint(job)
+
+    new_roots = add_new_roots(api, 2)
+    result = crawl_env(api, incremental=True).run()
+
+    assert result.success
+    rpids = read_csv_rpids(csv_path)
+    assert rpids[: len(rows_before)] == rows_before
+    assert set(rpids) == set(rows_before) | {root["rpid"] for root in new_roots}
+    assert store.get("BV1test").incremental
@@ -0,0 +1,118 @@
+import sqlite3
+
+from store.job_store import CrawlJob, JobStore
+from tests.helpers import FakeCommentAPI, make_video, read_csv_rpids, wait_until
+
+
+def test_checkpoint_round_trip(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    job = store.start("BV1test", "/out", 0)
+    job.round_num = 3
+    job.offset_str = "cursor"
+    job.downloaded = 60
+    job.csv_size = 1234
+    store.checkpoint(job, [(11, 5), (12, 30)])
+
+    loaded = store.get("BV1test")
+    assert loaded.resumable
+    assert (loaded.round_num, loaded.offset_str, loaded.downloaded, loaded.csv_size) == (
+        3,
+        "cursor",
+        60,
+        1234,
+    )
+    assert store.sub_threads("BV1test") == {11: 5, 12: 30}
+
+    store.finish(loaded)
+    assert not store.get("BV1test").resumable
+    store.close()
+
+
+def test_start_replaces_job_and_keeps_threads_only_when_asked(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    job = store.start("BV1test", "/out", 0)
+    store.checkpoint(job, [(11, 5)])
+
+    store.start("BV1test", "/out", 0, incremental=True, since_ctime=99, keep_threads=True)
+    assert store.sub_threads("BV1test") == {11: 5}
+    assert store.get("BV1test").incremental is True
+
+    store.start("BV1test", "/out", 1)
+    assert store.sub_threads("BV1test") == {}
+    assert store.get("BV1test").round_num == 0
+
+    store.delete("BV1test")
+    assert store.get("BV1test") is None
+    store.close()
+
+
+def test_migrates_databases_without_incremental_columns(tmp_path):
+    path = tmp_path / "jobs.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (identifier TEXT PRIMARY KEY, output_dir TEXT NOT NULL,"
+        " sort_order INTEGER NOT NULL, status TEXT NOT NULL, round_num INTEGER NOT NULL DEFAULT 0,"
+        " offset_str TEXT NOT NULL DEFAULT '', downloaded INTEGER NOT NULL DEFAULT 0,"
+        " total INTEGER NOT NULL DEFAULT 0, csv_size INTEGER NOT NULL DEFAULT 0,"
+        " updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO jobs VALUES ('BV1old', '/out', 1, 'running', 2, '', 40, 100, 999, 0)"
+    )
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    job = store.get("BV1old")
+    assert isinstance(job, CrawlJob)
+    assert (job.round_num, job.incremental, job.since_ctime) == (2, False, 0)
+    store.close()
+
+
+def test_resume_truncates_unconfirmed_rows_and_continues(crawl_env):
+    roots, threads = make_video(70, {0: 12, 45: 25})
+    api = FakeCommentAPI(roots, threads)
+
+    # 第一次运行在请求第 3 页时崩溃，前两页已保存检查点
+    store = crawl_env.job_store
+    api.fail_on_page = 3
+    api.before_fail = lambda: wait_until(lambda: store.get("BV1test").round_num == 2)
+    first = crawl_env(api).run()
+    assert not first.success
+    job = crawl_env.job_store.get("BV1test")
+    assert job.resumable and job.round_num == 2
+
+    # 崩溃前写入但没有记录检查点的残缺数据
+    csv_path = crawl_env.csv_path()
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("BV1test,残缺的行,男,半条评论")
+
+    api.fail_on_page = 0
+    api.comment_pages.clear()
+    result = crawl_env(api).run()
+
+    assert result.success
+    assert api.comment_pages[0] == 3
+    rpids = read_csv_rpids(csv_path)
+    assert len(rpids) == len(set(rpids)) == api.fetch_comment_count("1")
+    assert result.downloaded == len(rpids)
+    assert crawl_env.job_store.get("BV1test").status == "done"
+
+
+def test_resume_disabled_starts_over(crawl_env):
+    roots, threads = make_video(50)
+    api = FakeCommentAPI(roots, threads)
+    store = crawl_env.job_store
+    api.fail_on_page = 2
+    api.before_fail = lambda: wait_until(lambda: store.get("BV1test").round_num == 1)
+    crawl_env(api).run()
+    assert store.get("BV1test").resumable
+
+    api.fail_on_page = 0
+    api.comment_pages.clear()
+    result = crawl_env(api, resume=False).run()
+
+    assert result.success
+    assert api.comment_pages[0] == 1
+    rpids = read_csv_rpids(crawl_env.csv_path())
+    assert len(rpids) == len(set(rpids)) == 50
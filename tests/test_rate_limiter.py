@@ -0,0 +1,121 @@
+import argparse
+
+import httpx
+import requests
+
+from api.rate_limiter import (
+    RateLimiter,
+    classify_response,
+    error_code,
+    is_throttle_code,
+    rate_from_config,
+)
+from tests.helpers import make_response, sub_comment_page
+
+
+def http_error(status_code: int) -> requests.HTTPError:
+    response = make_response(status_code, {}, "https://api.bilibili.com/x/v2/reply/reply")
+    return requests.HTTPError(response=response)
+
+
+def test_error_code_keeps_http_throttle_classification():
+    assert error_code(http_error(412)) == -412
+    assert error_code(http_error(429)) == -509
+    assert is_throttle_code(error_code(http_error(412)))
+    assert is_throttle_code(error_code(http_error(429)))
+
+
+def test_error_code_for_other_errors():
+    assert error_code(http_error(500)) == -1
+    assert error_code(requests.ConnectionError("reset")) == -1
+    assert error_code(ValueError("bad json")) == -1
+
+
+def test_error_code_for_httpx_status_error():
+    request = httpx.Request("GET", "https://api.bilibili.com/x/v2/reply/reply")
+    response = httpx.Response(412, request=request)
+    error = httpx.HTTPStatusError("412", request=request, response=response)
+    assert error_code(error) == -412
+
+
+def test_classify_response():
+    assert classify_response(412) == "throttled"
+    assert classify_response(200, -352) == "throttled"
+    assert classify_response(200, 0) == "ok"
+    assert classify_response(500) == "error"
+    assert classify_response(200, -404) == "error"
+
+
+def test_default_adaptive_rate_never_exceeds_configured_delay(config):
+    rate, burst, adaptive, max_rate = rate_from_config()
+    limiter = RateLimiter(rate, burst, adaptive, max_rate)
+    configured = 1.0 / ((config.get("request_delay_min") + config.get("request_delay_max")) / 2)
+
+    for _ in range(1000):
+        limiter.report(200, 0)
+    assert limiter.effective_rate <= configured + 1e-9
+    assert all(bucket.rate <= configured + 1e-9 for bucket in limiter.buckets.values())
+
+
+def test_adaptive_rate_backs_off_and_recovers_to_configured_rate():
+    limiter = RateLimiter(1.0, adaptive=True)
+    limiter.report(412)
+    assert limiter.effective_rate == 0.5
+
+    for _ in range(1000):
+        limiter.report(200, 0)
+    assert limiter.effective_rate == 1.0
+
+
+def test_explicit_rate_max_allows_probing_above_configured_rate(config):
+    config.set("request_rate_max", 3.0)
+    rate, burst, adaptive, max_rate = rate_from_config()
+    limiter = RateLimiter(rate, burst, adaptive, max_rate)
+
+    for _ in range(10000):
+        limiter.report(200, 0)
+    assert limiter.effective_rate == 3.0
+
+
+def test_sub_comment_thread_retries_after_http_throttle(bilibili_api):
+    responses = iter([412])
+
+    def handler(query):
+        status = next(responses, 200)
+        if status != 200:
+            return status, {}
+        return 200, sub_comment_page(int(query["root"]), int(query["pn"]), int(query["ps"]), 30)
+
+    bilibili_api.session.handler = handler
+    stats = {}
+    pages = list(bilibili_api.iter_sub_comments("1", 7, stats=stats))
+
+    assert sum(len(page) for page in pages) == 30
+    assert stats["requests"] == 2
+
+
+def test_cli_rate_is_the_adaptive_ceiling(monkeypatch):
+    import api.rate_limiter
+    from cli import apply_common_options
+
+    limiter = RateLimiter(*rate_from_config())
+    monkeypatch.setattr(api.rate_limiter, "_limiter", limiter)
+
+    apply_common_options(argparse.Namespace(rate=0.2))
+    assert limiter.controller.max_rate == 0.2
+
+    for _ in range(200):
+        limiter.report(200, 0)
+    assert limiter.effective_rate <= 0.2
+
+
+def test_cli_rate_keeps_explicit_rate_max(config, monkeypatch):
+    import api.rate_limiter
+    from cli import apply_common_options
+
+    config.set("request_rate_max", 1.0)
+    limiter = RateLimiter(*rate_from_config())
+    monkeypatch.setattr(api.rate_limiter, "_limiter", limiter)
+
+    apply_common_options(argparse.Namespace(rate=0.2))
+    assert limiter.controller.max_rate == 1.0
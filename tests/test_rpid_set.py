@@ -0,0 +1,118 @@
+import os
+import random
+import threading
+import time
+from array import array
+
+from store.rpid_set import MAGIC, RpidSet, append_rpids, rpid_path
+from tests.helpers import FakeCommentAPI, make_video, read_csv_rpids
+
+
+def test_membership_and_add():
+    rpids = RpidSet([5, 3, 3, 9])
+    assert len(rpids) == 3
+    assert 3 in rpids and 9 in rpids and 4 not in rpids
+
+    assert rpids.add(4) is True
+    assert rpids.add(4) is False
+    assert rpids.add(9) is False
+    assert 4 in rpids
+    assert list(rpids) == [3, 4, 5, 9]
+
+
+def test_matches_builtin_set_across_compactions():
+    random.seed(0)
+    rpids = RpidSet(random.sample(range(10**12), 5000))
+    expected = set(rpids)
+    known = list(expected)[:100]
+
+    for _ in range(50_000):
+        rpid = random.randrange(10**12) if random.random() < 0.7 else random.choice(known)
+        assert rpids.add(rpid) is (rpid not in expected)
+        expected.add(rpid)
+
+    assert len(rpids) == len(expected)
+    assert list(rpids) == sorted(expected)
+    assert all(rpid in rpids for rpid in random.sample(sorted(expected), 1000))
+
+
+def test_save_load_and_append(tmp_path):
+    path = tmp_path / "BV1test.csv.rpids"
+    rpids = RpidSet([10, 20, 30])
+    rpids.save(path)
+
+    append_rpids(path, [25, 5])
+    assert path.stat().st_size == len(MAGIC) + 5 * 8
+    assert list(RpidSet.load(path)) == [5, 10, 20, 25, 30]
+
+
+def test_each_rpid_is_stored_once(tmp_path):
+    rpids = RpidSet(range(100))
+    rpids.save(tmp_path / "ids.rpids")
+    for rpid in range(100, 10_000):
+        rpids.add(rpid)
+
+    arrays = [value for value in vars(rpids).values() if isinstance(value, (array, set))]
+    assert sum(len(value) for value in arrays) == len(rpids) == 10_000
+
+
+def test_crawl_appends_written_rpids_at_checkpoints(crawl_env):
+    roots, threads = make_video(45, {2: 15})
+    api = FakeCommentAPI(roots, threads)
+
+    assert crawl_env(api).run().success
+
+    csv_path = crawl_env.csv_path()
+    saved = RpidSet.load_for_csv(csv_path)
+    assert saved is not None
+    assert list(saved) == sorted(read_csv_rpids(csv_path))
+
+
+def test_load_ignores_truncated_tail_and_bad_files(tmp_path):
+    path = tmp_path / "ids.rpids"
+    RpidSet([1, 2, 3]).save(path)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert list(RpidSet.load(path)) == [1, 2, 3]
+
+    path.write_bytes(b"not an rpid file")
+    assert RpidSet.load(path) is None
+    assert RpidSet.load(tmp_path / "missing.rpids") is None
+
+
+def test_load_for_csv_rejects_stale_file(tmp_path):
+    csv_path = tmp_path / "BV1test.csv"
+    csv_path.write_text("rpid\n1\n", encoding="utf-8")
+    RpidSet([1]).save(rpid_path(csv_path))
+    assert list(RpidSet.load_for_csv(csv_path)) == [1]
+
+    # CSV在评论ID文件之后被修改，评论ID文件已过期
+    later = time.time() + 10
+    os.utime(csv_path, (later, later))
+    assert RpidSet.load_for_csv(csv_path) is None
+
+
+def test_concurrent_add_and_contains():
+    # 解析阶段加入ID的同时，抓取阶段检查已有的ID
+    rpids = RpidSet(range(0, 200_000, 2))
+    errors = []
+    done = threading.Event()
+
+    def check():
+        while not done.is_set():
+            for rpid in range(0, 200_000, 2000):
+                if rpid not in rpids:
+                    errors.append(rpid)
+
+    checker = threading.Thread(target=check)
+    checker.start()
+    try:
+        for rpid in range(1, 200_000, 2):
+            rpids.add(rpid)
+    finally:
+        done.set()
+        checker.join()
+
+    assert errors == []
+    assert len(rpids) == 200_000
+    assert list(rpids) == list(range(200_000))
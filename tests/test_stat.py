@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from models.comment import SEX_NAMES, Stat
+
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    """缩小新用户缓冲区，少量用户也会多次合并"""
+    monkeypatch.setattr("models.comment.USER_BUFFER_LIMIT", 8)
+
+
+def expected_sex(user_sex):
+    counts = dict.fromkeys(SEX_NAMES, 0)
+    for sex in user_sex.values():
+        counts[sex] += 1
+    return counts
+
+
+def test_users_match_dict_model_across_compactions(small_buffer):
+    random.seed(0)
+    stat = Stat(name="广东")
+    user_sex = {}
+    for user_id in ("1", "2"):
+        stat.add_user(user_id, "男")
+        user_sex[user_id] = "男"
+    for _ in range(3000):
+        user_id = str(random.randrange(500))
+        sex = random.choice(SEX_NAMES + ("未知",))
+        stat.add_user(user_id, sex)
+        user_sex[user_id] = sex if sex in SEX_NAMES else "保密"
+
+    # 不是整数的用户ID单独保存
+    stat.add_user("guest", "女")
+    user_sex["guest"] = "女"
+
+    assert stat.user_count == len(user_sex)
+    assert dict(stat.user_sex_map) == user_sex
+    assert set(stat.users) == set(user_sex)
+    assert "guest" in stat.users and "1000" not in stat.users
+    # 视图同时接受整数和字符串形式的用户ID
+    assert all(stat.user_sex_map[int(user_id)] == user_sex[user_id] for user_id in ("1", "2"))
+    with pytest.raises(KeyError):
+        stat.user_sex_map["1000"]
+    assert stat.sex == expected_sex(user_sex)
+
+
+def test_add_comment_counts_comments_likes_and_levels():
+    stat = Stat(name="北京")
+    stat.add_comment(3, 5, "1", "男")
+    stat.add_comment(2, 9, "1", "女")
+    stat.add_comment(0, 0, "2", "保密")
+
+    assert (stat.location, stat.like) == (3, 5)
+    assert stat.level == [2, 0, 0, 0, 0, 1, 0]
+    assert stat.user_count == 2
+    # 同一用户以最后一次的性别为准
+    assert stat.sex == {"男": 0, "女": 1, "保密": 1}
+
+
+def test_merge_prefers_other_sex(small_buffer):
+    first = Stat(name="上海")
+    second = Stat(name="上海")
+    for user_id in range(30):
+        first.add_comment(1, 1, user_id, "男")
+    for user_id in range(20, 50):
+        second.add_comment(2, 2, user_id, "女")
+
+    first.merge(second)
+
+    assert (first.location, first.like) == (60, 90)
+    assert first.level[1:3] == [30, 30]
+    assert first.user_count == 50
+    assert first.sex == {"男": 20, "女": 30, "保密": 0}
+
+
+def test_sex_override_and_recalculate():
+    stat = Stat(name="四川", user_sex_map={"1": "男", "2": "女"})
+    stat.sex = {"男": 10}
+    assert stat.sex == {"男": 10, "女": 0, "保密": 0}
+
+    stat.recalculate_sex_stats()
+    assert stat.sex == {"男": 1, "女": 1, "保密": 0}
+
+
+def test_dict_round_trip(small_buffer):
+    stat = Stat(name="浙江")
+    for user_id in range(40):
+        stat.add_comment(user_id % 4, user_id % 7, user_id, SEX_NAMES[user_id % 3])
+    stat.add_user("guest", "男")
+
+    data = stat.to_dict()
+    loaded = Stat.from_dict(data)
+
+    assert data["users"] == 41
+    assert loaded.to_dict() == data
+    assert Stat.from_dict({"name": "空"}).to_dict() == Stat(name="空").to_dict()
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from api.async_bilibili_api import AsyncBilibiliAPI
+from api.rate_limiter import RateLimiter
+from tests.helpers import sub_comment_page
+
+
+def ok_page(query, count=250, max_size=100):
+    page_size = min(int(query["ps"]), max_size)
+    return 200, sub_comment_page(int(query["root"]), int(query["pn"]), page_size, count)
+
+
+def test_probe_uses_largest_page_size_and_caches_it(bilibili_api):
+    bilibili_api.session.handler = ok_page
+    stats = {}
+    comments = [c for page in bilibili_api.iter_sub_comments("1", 7, stats=stats) for c in page]
+
+    assert len(comments) == 250
+    assert bilibili_api.sub_comment_page_size == 100
+    assert stats == {"requests": 3, "pages": 3}
+    assert [call["ps"] for call in bilibili_api.session.calls] == ["100"] * 3
+
+
+def test_probe_falls_back_on_invalid_page_size(bilibili_api):
+    def handler(query):
+        if int(query["ps"]) > 50:
+            return 200, {"code": -400, "message": "请求错误"}
+        return ok_page(query)
+
+    bilibili_api.session.handler = handler
+    sub_cmt_info, page_size, requests_made = bilibili_api._probe_sub_comments("1", 7)
+
+    assert sub_cmt_info["code"] == 0
+    assert (page_size, requests_made) == (50, 2)
+    assert bilibili_api.sub_comment_page_size == 50
+
+
+def test_probe_adopts_server_truncated_page_size(bilibili_api):
+    bilibili_api.session.handler = lambda query: ok_page(query, max_size=20)
+    bilibili_api._probe_sub_comments("1", 7)
+    assert bilibili_api.sub_comment_page_size == 20
+
+
+def test_transient_error_is_not_cached_as_smaller_page_size(bilibili_api):
+    failures = iter([500])
+
+    def handler(query):
+        status = next(failures, None)
+        return (status, {}) if status else ok_page(query)
+
+    bilibili_api.session.handler = handler
+    sub_cmt_info, page_size, requests_made = bilibili_api._probe_sub_comments("1", 7)
+    assert sub_cmt_info["code"] == -1
+    assert requests_made == 1
+    assert bilibili_api.sub_comment_page_size is None
+
+    # 下一个评论串重新探测，仍然使用最大的分页
+    bilibili_api._probe_sub_comments("1", 8)
+    assert bilibili_api.sub_comment_page_size == 100
+
+
+def test_cached_page_size_fetches_first_pages_concurrently(bilibili_api):
+    bilibili_api.sub_comment_page_size = 100
+    barrier = threading.Barrier(2, timeout=5)
+
+    def handler(query):
+        # 两个线程的请求必须同时在途才能通过屏障，串行请求会超时
+        barrier.wait()
+        return ok_page(query)
+
+    bilibili_api.session.handler = handler
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda rpid=rpid: results.append(bilibili_api._probe_sub_comments("1", rpid))
+        )
+        for rpid in (7, 8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [result[0]["code"] for result in results] == [0, 0]
+
+
+@pytest.fixture
+def async_api(monkeypatch):
+    async def sign(self, url):
+        return url
+
+    monkeypatch.setattr(AsyncBilibiliAPI, "_sign", sign)
+
+    def create(handler):
+        api = AsyncBilibiliAPI(limiter=RateLimiter(rate=1000.0, burst=1000), max_in_flight=4)
+        api.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return api
+
+    return create
+
+
+def async_handler(on_request=None):
+    async def handler(request):
+        query = dict(request.url.params)
+        if on_request:
+            status = await on_request(query)
+            if status:
+                return httpx.Response(status, request=request)
+        status, payload = ok_page(query)
+        return httpx.Response(status, json=payload, request=request)
+
+    return handler
+
+
+def test_async_cached_page_size_fetches_first_pages_concurrently(async_api):
+    in_flight = 0
+    peak = 0
+
+    async def on_request(query):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+
+    async def run():
+        api = async_api(async_handler(on_request))
+        api.sub_comment_page_size = 100
+        async with api:
+            return await asyncio.gather(
+                *(api._probe_sub_comments("1", rpid) for rpid in range(4))
+            )
+
+    results = asyncio.run(run())
+    assert [result[0]["code"] for result in results] == [0] * 4
+    assert peak == 4
+
+
+def test_async_probe_does_not_cache_after_transient_error(async_api):
+    failures = iter([503])
+
+    async def on_request(query):
+        return next(failures, None)
+
+    async def run():
+        api = async_api(async_handler(on_request))
+        async with api:
+            first = await api._probe_sub_comments("1", 7)
+            cached_after_error = api.sub_comment_page_size
+            await api._probe_sub_comments("1", 8)
+            return first, cached_after_error, api.sub_comment_page_size
+
+    (sub_cmt_info, _, requests_made), cached_after_error, cached = asyncio.run(run())
+    assert sub_cmt_info["code"] == -1
+    assert requests_made == 1
+    assert cached_after_error is None
+    assert cached == 100
+
+
+def test_async_http_throttle_is_retried(async_api):
+    failures = iter([412])
+
+    async def on_request(query):
+        return next(failures, None)
+
+    async def run():
+        api = async_api(async_handler(on_request))
+        async with api:
+            return [c async for page in api.iter_sub_comments("1", 7) for c in page]
+
+    assert len(asyncio.run(run())) == 250
+
@@ -11,6 +11,7 @@ from .assets_helper import (
     get_weixin_image_path,
     get_pkuseg_model_path
 )
+from .geo_template import load_geo_template, copy_geo_template
 
 __all__ = [
     'get_template_path',
@@ -18,5 +19,7 @@ __all__ = [
     'get_wordcloud_template_path', 
     'get_stopwords_path',
     'get_weixin_image_path',
-    'get_pkuseg_model_path'
+    'get_pkuseg_model_path',
+    'load_geo_template',
+    'copy_geo_template'
 ]
\ No newline at end of file
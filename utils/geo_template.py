@@ -0,0 +1,57 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from .assets_helper import get_geojson_template_path
+
+logger = logging.getLogger(__name__)
+
+_geo_template: Optional[Dict[str, Any]] = None
+_geo_template_lock = threading.Lock()
+
+
+def load_geo_template() -> Optional[Dict[str, Any]]:
+    """读取省级地图的GeoJSON模板，进程内只解析一次
+
+    返回的数据在各次调用之间共享，不要修改；需要写入统计数据时使用 copy_geo_template()。
+    模板不存在或读取失败时返回None，下次调用会重试。
+    """
+    global _geo_template
+
+    if _geo_template is None:
+        with _geo_template_lock:
+            if _geo_template is None:
+                geo_template_path = get_geojson_template_path()
+                if not geo_template_path.exists():
+                    logger.error(f"GeoJSON模板文件不存在: {geo_template_path}")
+                    return None
+                try:
+                    with open(geo_template_path, "r", encoding="utf-8") as f:
+                        _geo_template = json.load(f)
+                    logger.info(
+                        f"成功加载GeoJSON模板: {geo_template_path}，"
+                        f"包含 {len(_geo_template['features'])} 个地区"
+                    )
+                except Exception as e:
+                    logger.error(f"加载GeoJSON模板失败: {e}")
+                    return None
+    return _geo_template
+
+
+def copy_geo_template() -> Optional[Dict[str, Any]]:
+    """复制一份可以写入属性的GeoJSON模板
+
+    只复制每个 feature 和它的 properties，geometry（模板中绝大部分的数据）与共享的模板共用，
+    比 copy.deepcopy 或重新解析文件都快得多。修改返回值的 properties 不会影响模板。
+    """
+    geo_template = load_geo_template()
+    if geo_template is None:
+        return None
+
+    geojson_data = dict(geo_template)
+    geojson_data["features"] = [
+        {**feature, "properties": dict(feature["properties"])}
+        for feature in geo_template["features"]
+    ]
+    return geojson_data